@@ -0,0 +1,117 @@
+"""セッションアーカイブの閲覧・取り出し。
+
+使い方::
+
+    uv run python src/archive.py info capture/20250830-123408-000.advarc
+    uv run python src/archive.py list capture/20250830-123408-000.advarc --kind decision
+    uv run python src/archive.py extract capture/20250830-123408-000.advarc out/ --seq 10-20
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+from session_archive import KIND_DECISION, KIND_FRAME, KIND_NAMES, KIND_OCR, ArchiveEntry, ArchiveReader, image_suffix
+
+_KIND_BY_NAME = {name: kind for kind, name in KIND_NAMES.items()}
+
+
+def _parse_range(text: str | None) -> tuple[int, int] | None:
+    """``10-20`` / ``10`` 形式の seq 範囲を (開始, 終了) にする。"""
+    if not text:
+        return None
+    lo, _, hi = text.partition("-")
+    try:
+        return int(lo), int(hi) if hi else int(lo)
+    except ValueError as e:
+        raise click.BadParameter(f"10-20 のような範囲で指定してください: {text}") from e
+
+
+def _describe(reader: ArchiveReader, entry: ArchiveEntry) -> str:
+    """1レコードの1行表示。"""
+    ts = datetime.fromtimestamp(entry.time).strftime("%H:%M:%S.%f")[:-3]
+    head = f"{entry.index:6d}  {ts}  seq={entry.seq:<6d} {entry.kind_name:<8s} {entry.length:8d} B"
+    if entry.kind == KIND_FRAME:
+        return head + ("  (重複)" if entry.duplicate else "")
+    if entry.kind == KIND_OCR:
+        return head
+    return f"{head}  {reader.payload(entry).decode('utf-8', errors='replace')}"
+
+
+@click.group()
+def cli() -> None:
+    """セッションアーカイブ（.advarc）の閲覧・取り出し。"""
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def info(path: Path) -> None:
+    """レコード数・サイズ・重複排除の効果を表示する。"""
+    with ArchiveReader(path) as reader:
+        kinds = Counter(e.kind_name for e in reader)
+        frames = [e for e in reader if e.kind == KIND_FRAME]
+        dup_bytes = sum(e.length for e in frames if e.duplicate)
+        click.echo(f"{path}: {len(reader)} レコード, {path.stat().st_size:,} bytes")
+        for name, n in sorted(kinds.items()):
+            click.echo(f"  {name:<8s} {n}")
+        if frames:
+            dups = sum(e.duplicate for e in frames)
+            click.echo(f"  重複フレーム {dups} 件（{dup_bytes:,} bytes を省略）")
+        if len(reader):
+            first, last = reader.entry(0), reader.entry(-1)
+            click.echo(f"  期間 {datetime.fromtimestamp(first.time):%Y-%m-%d %H:%M:%S} 〜 {datetime.fromtimestamp(last.time):%H:%M:%S}")
+
+
+@cli.command(name="list")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--kind", type=click.Choice(sorted(_KIND_BY_NAME)), default=None, help="表示するレコードの種類")
+@click.option("--seq", "seq_range", default=None, help="表示する seq の範囲（例: 10-20）")
+def list_(path: Path, kind: str | None, seq_range: str | None) -> None:
+    """レコードを一覧表示する。"""
+    rng = _parse_range(seq_range)
+    with ArchiveReader(path) as reader:
+        for entry in reader:
+            if kind is not None and entry.kind != _KIND_BY_NAME[kind]:
+                continue
+            if rng is not None and not rng[0] <= entry.seq <= rng[1]:
+                continue
+            click.echo(_describe(reader, entry))
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("out_dir", type=click.Path(file_okay=False, path_type=Path))
+@click.option("--seq", "seq_range", default=None, help="取り出す seq の範囲（例: 10-20）")
+@click.option("--ocr/--no-ocr", default=False, show_default=True, help="OCR 応答も JSON で取り出す")
+@click.option("--duplicates/--no-duplicates", default=False, show_default=True, help="重複フレームも個別のファイルとして取り出す")
+def extract(path: Path, out_dir: Path, seq_range: str | None, ocr: bool, duplicates: bool) -> None:
+    """フレーム画像（と OCR 応答・判定）をファイルに取り出す。"""
+    rng = _parse_range(seq_range)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = 0
+    decisions: list[dict] = []
+    with ArchiveReader(path) as reader:
+        for entry in reader:
+            if rng is not None and not rng[0] <= entry.seq <= rng[1]:
+                continue
+            if entry.kind == KIND_FRAME and (duplicates or not entry.duplicate):
+                data = reader.payload(entry)
+                (out_dir / f"{entry.seq:06d}-{entry.index:06d}{image_suffix(data)}").write_bytes(data)
+                written += 1
+            elif entry.kind == KIND_OCR and ocr:
+                (out_dir / f"{entry.seq:06d}-{entry.index:06d}.json").write_bytes(reader.payload(entry))
+                written += 1
+            elif entry.kind == KIND_DECISION:
+                decisions.append({"seq": entry.seq, "time": entry.time, **reader.json(entry)})  # type: ignore[dict-item]
+    if decisions:
+        (out_dir / "decisions.json").write_text(json.dumps(decisions, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    click.echo(f"{written} ファイルを {out_dir} に取り出しました（判定 {len(decisions)} 件）")
+
+
+if __name__ == "__main__":
+    cli()
@@ -3,129 +3,1254 @@
 from __future__ import annotations
 
 import logging
+import random
+import threading
 import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
-from capture import capture_window_region
+from capture import CaptureArchiver, CapturedFrame, CaptureEngine, crop_frame, grab_window_region
+from change_detect import FrameChangeDetector
+from checkpoint import Checkpoint, CheckpointStore, checkpoint_path
 from config import AppConfig
-from ocr import OcrParagraph, call_ocr_api, extract_paragraphs, find_matching_paragraph
+from delta import DeltaPlan, DeltaTracker
+from encode import EncodedImage, EncodeOptions, encode_frame, scale_paragraphs
+from fast_forward import AdvanceAction, ChoiceClassifier, parse_action
+from matcher import StepMatcher
+from metrics import REGISTRY, BoundMetrics
+from mosaic import MosaicBatcher, MosaicLayout, analyze_mosaic
+from ocr import CacheStats, OcrClient, OcrParagraph, OcrResultCache, OcrService, OcrUnavailableError, find_matching_paragraph
+from ocr_result import parse_ocr_result
+from ocr_router import OcrRouter
+from pipeline import FramePipeline
+from roi import Box, RoiTracker, offset_paragraphs
+from scheduler import RateLimiter, TickScheduler
+from screen_playbook import Playbook, PlaybookHit, patch_box, playbook_path
+from session_archive import SessionArchive
+from step_graph import StepCursor, StepGraph
+from template_match import TemplateMatcher, template_store_path
+from window_backend import WindowBackend, WindowInfo, WindowResolver, default_backend
 
 
 @dataclass
-class WindowInfo:
-    """ウィンドウ情報（Windows専用）。"""
+class RunStats:
+    """1回の実行における集計値。"""
 
-    hwnd: int
-    left: int
-    top: int
-    right: int
-    bottom: int
+    frames_captured: int = 0
+    frames_ocr: int = 0
+    frames_dropped: int = 0
+    cache: CacheStats | None = None
+    steps_done: int = 0
+    advances: int = 0
+    fast_forward_checks: int = 0
+    elapsed: float = 0.0
+    first_ocr: float | None = None
 
     @property
-    def width(self) -> int:
-        return max(0, self.right - self.left)
+    def frames_skipped(self) -> int:
+        """画面変化なし・キャッシュヒット等で OCR 送信を省略したフレーム数。"""
+        return self.frames_captured - self.frames_ocr
 
     @property
-    def height(self) -> int:
-        return max(0, self.bottom - self.top)
+    def steps_per_minute(self) -> float:
+        """1分あたりに進めた step 数（早送りの有無による比較用）。"""
+        return self.steps_done * 60.0 / self.elapsed if self.elapsed > 0 else 0.0
 
 
-def _resolve_window(title_part: str, logger: logging.Logger) -> WindowInfo:
-    """タイトル部分一致でウィンドウを探し、前面化して情報取得。"""
-    # 遅延インポート（macOS 開発環境でも import 可能にするため）
-    import windows  # type: ignore
+# 前面化・キャプチャ・クリックはプロセス内の全セッションで直列化する
+# （複数セッション実行時に、別ウィンドウの前面化とクリックが入り混じらないようにする）
+_INPUT_LOCK = threading.Lock()
 
-    hwnd = windows.find_window_by_partial_title(title_part)
-    if not hwnd:
-        raise RuntimeError(f"ウィンドウが見つかりません: '{title_part}'")
 
-    windows.bring_to_foreground(hwnd)
-    rect = windows.get_window_rect(hwnd)
-    logger.debug("ターゲットウィンドウ rect=%s", rect)
-
-    return WindowInfo(hwnd=hwnd, left=rect.left, top=rect.top, right=rect.right, bottom=rect.bottom)
-
-
-def _click_in_window_center_of_box(win: WindowInfo, box: tuple[int, int, int, int], logger: logging.Logger) -> None:
+def _click_in_window_center_of_box(backend: WindowBackend, win: WindowInfo, box: tuple[int, int, int, int], logger: logging.Logger) -> None:
     """ウィンドウ画像内座標 ``box`` の中心をスクリーン座標に変換してクリック。"""
-    import windows  # type: ignore
-
     x1, y1, x2, y2 = box
     cx = win.left + int((x1 + x2) / 2)
     cy = win.top + int((y1 + y2) / 2)
     logger.info("クリック: (%d, %d) (box=%s)", cx, cy, box)
-    windows.bring_to_foreground(win.hwnd)
-    windows.click_screen(cx, cy)
+    with _INPUT_LOCK:
+        if backend.foreground_window() != win.hwnd:
+            backend.bring_to_foreground(win.hwnd)
+        backend.click(cx, cy)
 
 
-def run_automation(base_dir: Path, config: AppConfig, logger: logging.Logger) -> None:
-    """自動操作のメインループ。
+def create_ocr_client(config: AppConfig, logger: logging.Logger) -> OcrService:
+    """設定値から OCR 送信口を生成する。
 
-    1. 対象ウィンドウを探して前面化
-    2. interval 毎にキャプチャ→OCR→ログへ候補出力
-    3. steps の現在ターゲットに部分一致したらクリック
-    4. すべての steps が終わったら終了
+    エンドポイントが1つなら :class:`OcrClient`、複数なら :class:`OcrRouter` を返す。
     """
-    win = _resolve_window(config.title, logger)
+    clients = [
+        OcrClient(
+            endpoint,
+            connect_timeout=config.ocr_connect_timeout,
+            read_timeout=config.ocr_read_timeout,
+            max_retries=config.ocr_max_retries,
+            logger=logger,
+        )
+        for endpoint in config.endpoints
+    ]
+    if len(clients) == 1:
+        return clients[0]
+    return OcrRouter(clients, health_interval=config.ocr_health_interval, hedge=config.ocr_hedge, logger=logger)
 
-    pending_steps: list[str] = list(config.steps)
-    logger.info(
-        "開始: title='%s', interval=%s, steps=%s, ocr_api_endpoint='%s', keep_height=%s",
-        config.title,
+
+def create_ocr_cache(base_dir: Path, config: AppConfig, logger: logging.Logger) -> OcrResultCache | None:
+    """設定値から :class:`OcrResultCache` を生成する。両層とも無効なら None。"""
+    cache_dir = base_dir / "cache" / "ocr" if config.ocr_cache_persist else None
+    if config.ocr_cache_size <= 0 and cache_dir is None:
+        return None
+    return OcrResultCache(config.ocr_cache_size, cache_dir, logger)
+
+
+def create_scheduler(config: AppConfig, logger: logging.Logger, shared_limiter: RateLimiter | None = None) -> TickScheduler:
+    """設定値から :class:`TickScheduler` を生成する（``interval`` が待ち時間の上限）。"""
+    return TickScheduler(
         config.interval,
-        pending_steps,
-        config.ocr_api_endpoint,
-        config.capture_keep_height,
+        min_interval=config.min_interval,
+        backoff=config.backoff_factor,
+        settle_frames=config.settle_frames,
+        max_ocr_rate=config.max_ocr_rate,
+        shared_limiter=shared_limiter,
+        logger=logger,
     )
 
-    while pending_steps:
-        # 念のため毎回前面化＆位置更新
-        try:
-            win = _resolve_window(config.title, logger)
-        except Exception as e:
-            logger.error("ウィンドウ取得に失敗: %s", e)
-            raise
-
-        img_path = capture_window_region(
-            base_dir,
-            win.left,
-            win.top,
-            win.width,
-            win.height,
-            keep_height=config.capture_keep_height,
+
+def create_roi_tracker(config: AppConfig) -> RoiTracker:
+    """設定値から :class:`RoiTracker` を生成する。"""
+    return RoiTracker(
+        config.capture_regions,
+        learn=config.roi_learn,
+        warmup=config.roi_warmup,
+        margin=config.roi_margin,
+        full_every=config.roi_full_every,
+    )
+
+
+def create_encode_options(config: AppConfig) -> EncodeOptions:
+    """設定値から OCR 送信画像のエンコード設定を生成する。"""
+    return EncodeOptions(
+        format=config.ocr_image_format,
+        grayscale=config.ocr_grayscale,
+        scale=config.ocr_scale,
+        binarize=config.ocr_binarize,
+        contrast_stretch=config.ocr_contrast_stretch,
+        png_level=config.ocr_png_level,
+        quality=config.ocr_quality,
+    )
+
+
+def create_archiver(base_dir: Path, config: AppConfig, logger: logging.Logger, session_name: str | None = None) -> CaptureArchiver | SessionArchive | None:
+    """設定値からキャプチャの保存先を生成する。保存しない設定なら None。"""
+    if not config.capture_archive:
+        return None
+    if config.capture_format == "files":
+        return CaptureArchiver(base_dir, config.capture_retention, logger, subdir=session_name)
+    cap_dir = base_dir / "capture" / session_name if session_name else base_dir / "capture"
+    return SessionArchive(
+        cap_dir,
+        logger,
+        max_bytes=int(config.capture_rotate_mb * 1024 * 1024),
+        keep=config.capture_archive_keep,
+        meta={"title": config.title, "session": session_name, "steps": config.steps, "ocr_image_format": config.ocr_image_format},
+    )
+
+
+def create_template_matcher(base_dir: Path, config: AppConfig, logger: logging.Logger) -> TemplateMatcher | None:
+    """設定値から :class:`TemplateMatcher` を生成する。無効なら None。"""
+    if not config.template_match:
+        return None
+    store_path = template_store_path(base_dir, config.title) if config.template_persist else None
+    return TemplateMatcher(config.template_threshold, config.template_radius, store_path=store_path, logger=logger)
+
+
+def create_playbook(base_dir: Path, config: AppConfig, logger: logging.Logger) -> Playbook | None:
+    """設定値から :class:`Playbook` を生成する。無効なら None。"""
+    if not config.playbook:
+        return None
+    return Playbook(playbook_path(base_dir, config.title), threshold=config.playbook_threshold, logger=logger)
+
+
+def create_advance_action(config: AppConfig) -> AdvanceAction:
+    """設定値から早送りの送り操作を生成する。"""
+    action = parse_action(config.fast_forward_action)
+    return AdvanceAction(key=action.key, point=config.fast_forward_click)
+
+
+def create_checkpoint_store(base_dir: Path, config: AppConfig, logger: logging.Logger, session_name: str | None = None) -> CheckpointStore | None:
+    """設定値から :class:`CheckpointStore` を生成する。無効なら None。"""
+    if not config.checkpoint:
+        return None
+    return CheckpointStore(checkpoint_path(base_dir, config.title, session_name), logger)
+
+
+def create_delta_tracker(config: AppConfig) -> DeltaTracker | None:
+    """設定値から差分 OCR の :class:`DeltaTracker` を生成する。無効なら None。"""
+    if not config.ocr_delta:
+        return None
+    return DeltaTracker(config.ocr_delta_tile, max_ratio=config.ocr_delta_max_ratio, full_every=config.ocr_delta_full_every)
+
+
+def create_mosaic_batcher(config: AppConfig, client: OcrService, logger: logging.Logger) -> MosaicBatcher:
+    """設定値から :class:`MosaicBatcher` を生成する。"""
+    return MosaicBatcher(
+        client,
+        create_encode_options(config),
+        max_delay=config.ocr_mosaic_delay,
+        max_size=config.ocr_mosaic_size,
+        padding=config.ocr_mosaic_padding,
+        logger=logger,
+    )
+
+
+def log_mosaic_stats(batcher: MosaicBatcher, logger: logging.Logger) -> None:
+    """モザイク OCR の集計をログに出す。"""
+    st = batcher.stats
+    logger.info("モザイク OCR: 画像 %d 枚を %d 回の要求で送信（省いた要求 %d 回, 余白上の語 %d 件）", st.images, st.requests, st.saved, st.orphans)
+
+
+def create_step_cursor(config: AppConfig) -> StepCursor:
+    """設定値から step グラフの開始位置を生成する。"""
+    graph = config.step_graph if config.step_graph is not None else StepGraph.linear(config.steps)
+    return StepCursor(graph, config.step_lookahead)
+
+
+def create_matcher(config: AppConfig) -> StepMatcher:
+    """設定値から steps をコンパイル済みの :class:`StepMatcher` を生成する。"""
+    return StepMatcher(
+        config.steps,
+        min_score=config.match_min_score,
+        min_rec_score=config.match_min_rec_score,
+        ignore_top=config.match_ignore_top,
+    )
+
+
+@dataclass
+class PreparedFrame:
+    """キャプチャ・前処理済みで OCR 待ちのフレーム。
+
+    Attributes:
+        seq: キャプチャ連番。
+        win: キャプチャ時点のウィンドウ情報（クリック座標の基準）。
+        frame: キャプチャ画像。
+        next_delay: スケジューラが決めた次のキャプチャまでの待ち秒。
+        deferred: 画面が落ち着くのを待っている途中のため OCR しないフレームか。
+        reuse_seq: 画面変化なしの場合、結果を再利用できる基準フレームの連番。
+        cache_key: OCR 結果キャッシュのキー（キャッシュ無効時は None）。
+        cache_checked: キャッシュ参照済みか。
+        roi: OCR のために切り出した範囲（キャプチャ画像内座標。全体なら None）。
+        ocr_frame: OCR に送るフレーム（``roi`` で切り出したもの）。
+        regions: モザイク OCR で別々に切り出して送る離れた領域（キャプチャ画像内座標）。
+        paragraphs: キャッシュヒット時の OCR 結果（``ocr_frame`` 内座標）。
+        encoded: OCR 送信用にエンコード済みの画像。
+        template_hit: テンプレートマッチで見つけた選択肢（キャプチャ画像内座標）。
+        replay: プレイブックで一致した記録（OCR せずにその位置をクリックする）。
+        verify: プレイブックで一致したが、確認のため OCR する記録。
+        choice_likely: 早送りの判定で選択肢画面の可能性ありとしたか（判定しなかった場合は None）。
+        fast_forward: 選択肢なしと判定し、OCR せずに送り操作をしたフレームか。
+        delta: 差分 OCR の計画（変化した部分だけを OCR した場合）。
+        source: 認識結果の出どころ（``ocr`` / ``delta`` / ``cache`` / ``template`` / ``reuse``。未認識なら None）。
+    """
+
+    seq: int
+    win: WindowInfo
+    frame: CapturedFrame
+    next_delay: float = 0.0
+    deferred: bool = False
+    reuse_seq: int | None = None
+    cache_key: str | None = None
+    cache_checked: bool = False
+    roi: Box | None = None
+    ocr_frame: CapturedFrame | None = None
+    regions: list[Box] | None = None
+    paragraphs: Sequence[OcrParagraph] | None = None
+    encoded: EncodedImage | None = None
+    template_hit: OcrParagraph | None = None
+    replay: PlaybookHit | None = None
+    verify: PlaybookHit | None = None
+    choice_likely: bool | None = None
+    fast_forward: bool = False
+    delta: DeltaPlan | None = None
+    source: str | None = None
+
+
+class _FrameProcessor:
+    """キャプチャ段（:meth:`capture`）と OCR 段（:meth:`recognize`）の処理本体。
+
+    直列ループではすべてのメソッドを同じスレッドから順に呼ぶ。パイプラインモードでは
+    次の3つのスレッドから並行に呼ぶ（同じメソッドを複数のスレッドから呼ぶことはない）。
+
+    - キャプチャ段: :meth:`capture`（早送りの :meth:`advance` を含む）。早送りのカウンタ
+      （``_ff_streak`` / ``_ff_static`` / ``_ff_check``）と変化判定はこのスレッドだけが触る。
+    - OCR 段: :meth:`recognize`（差分 OCR の基準の更新を含む）。
+    - 判定段: :meth:`record_click` / :meth:`on_unmatched` / :meth:`advance` /
+      :meth:`save_checkpoint` / :meth:`log_frame` / :meth:`request_full_ocr` / :meth:`follow`。
+
+    キャプチャ段と判定段が共有する ``roi`` / ``classifier`` / ``templates`` / ``playbook`` は
+    それぞれ内部のロックで守られている。送り操作の入力と ``stats.advances`` は ``_INPUT_LOCK`` で守る。
+    フレームの画素はキャプチャ段が次々に上書きするリングバッファを指すため、キャプチャ段以外で
+    画素を使うときは :meth:`capture.CaptureEngine.copy_if_live` でコピーしてから使う。
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        config: AppConfig,
+        logger: logging.Logger,
+        client: OcrService,
+        stats: RunStats,
+        scheduler: TickScheduler,
+        window: WindowResolver,
+        session_name: str | None = None,
+        checkpoints: CheckpointStore | None = None,
+        engine: CaptureEngine | None = None,
+        batcher: MosaicBatcher | None = None,
+    ) -> None:
+        self.config = config
+        self.logger = logger
+        self.window = window
+        self.client = client
+        self.stats = stats
+        self.scheduler = scheduler
+        # フレームはこのエンジンのリングバッファを指す（変化判定・切り出し・エンコードでコピーしない）
+        self._owns_engine = engine is None
+        self.engine = engine if engine is not None else CaptureEngine()
+        self.detector = FrameChangeDetector(config.change_threshold)
+        self.archiver = create_archiver(base_dir, config, logger, session_name)
+        self.cache = create_ocr_cache(base_dir, config, logger)
+        self.roi = create_roi_tracker(config)
+        self.encode_options = create_encode_options(config)
+        self.templates = create_template_matcher(base_dir, config, logger)
+        self.playbook = create_playbook(base_dir, config, logger)
+        self._rng = random.Random()
+        self.classifier = ChoiceClassifier(config.fast_forward_region) if config.fast_forward else None
+        self.advance_action = create_advance_action(config)
+        # 早送りで続けて送った回数と、そのうち送っても画面が変わらなかった回数（キャプチャ段が更新する）
+        self._ff_streak = 0
+        self._ff_static = 0
+        # 確認のため早送りをやめ、OCR するフレームを待っているか（静止待ちで見送られても続ける）
+        self._ff_check = False
+        self.checkpoints = checkpoints
+        # 指定があれば、エンコードと送信は他の画像とまとめて OCR 段で行う
+        self.batcher = batcher
+        # 全体を OCR するフレームは、前回の基準フレームから変化したタイルだけを OCR し直す
+        self.delta = create_delta_tracker(config)
+        # チェックポイントから再開した場合に、再開前までに進めていた step の数
+        self.resumed_steps = 0
+        # 最初の OCR 応答までの時間の基準（起動処理を含めて測る場合は呼び出し側が上書きする）
+        self.started_at = time.monotonic()
+        # 判定段が現在待っている step（プレイブックの照合対象）と、先読みを含めて段ごとにまとめた step
+        # （テンプレートマッチの照合対象）。判定段が :meth:`follow` で更新する
+        self.current_steps: tuple[str, ...] = ()
+        self.step_levels: tuple[tuple[str, ...], ...] = ()
+        self.metrics = REGISTRY.bind(session=session_name or "main")
+        self._seq = 0
+        self._reference_seq: int | None = None
+        self._full_ocr_requested = False
+        self._last_seq: int | None = None
+        self._last_paragraphs: Sequence[OcrParagraph] = []
+
+    def prime(self, frame: CapturedFrame) -> None:
+        """起動時に撮ったフレームで画面変化の判定を始めておく（最初の静止確認が1回分早まる）。"""
+        if self.detector.enabled:
+            self.detector.is_changed(frame)
+            self.scheduler.next_delay(True)
+
+    def follow(self, cursor: StepCursor) -> None:
+        """照合対象の step を ``cursor`` の現在位置（フロンティアと先読みする step）に合わせる。"""
+        self.step_levels = tuple(tuple(dict.fromkeys(n.text for n in nodes)) for nodes in cursor.levels())
+        self.current_steps = cursor.current_steps
+
+    def save_checkpoint(self, cursor: StepCursor, last_step: str) -> None:
+        """クリック後の step グラフ上の位置を保存する。"""
+        if self.checkpoints is not None:
+            with self.metrics.span("checkpoint"):
+                self.checkpoints.save(cursor, self.resumed_steps + self.stats.steps_done, last_step)
+
+    def request_full_ocr(self) -> None:
+        """次のフレームは画面変化判定を省略して必ず認識させる（クリック直後など）。"""
+        self._full_ocr_requested = True
+
+    def capture(self, epoch: int = 0) -> PreparedFrame:
+        """ウィンドウを解決してキャプチャし、変化判定・キャッシュ参照・エンコードまで行う。
+
+        次のキャプチャまでの待ち時間もここでスケジューラに決めさせる。
+        """
+        if self._full_ocr_requested:
+            self._full_ocr_requested = False
+            self.detector.reset()
+
+        # 念のため毎回前面化＆位置更新（前面のままキャプチャするまで他セッションの操作を待たせる）
+        with _INPUT_LOCK:
+            try:
+                with self.metrics.span("resolve"):
+                    win = self.window.resolve()
+            except Exception as e:
+                self.logger.error("ウィンドウ取得に失敗: %s", e)
+                raise
+
+            with self.metrics.span("capture"):
+                frame = grab_window_region(
+                    win.left,
+                    win.top,
+                    win.width,
+                    win.height,
+                    keep_height=self.config.capture_keep_height,
+                    engine=self.engine,
+                )
+        self._seq += 1
+        self.stats.frames_captured += 1
+        self.metrics.incr("frames_captured")
+        prepared = PreparedFrame(seq=self._seq, win=win, frame=frame)
+
+        # 早送りするフレームでも、送り操作で画面が変わったかを見るため変化判定は行う
+        with self.metrics.span("detect"):
+            changed = self.detector.is_changed(frame)
+
+        # 早送り: 選択肢が出ていそうにない画面は OCR せずに送る
+        if self.classifier is not None:
+            with self.metrics.span("classify"):
+                prepared.choice_likely = self.classifier.is_choice(frame)
+            if not prepared.choice_likely and self._keep_fast_forwarding(changed):
+                self.advance(win)
+                prepared.fast_forward = True
+                prepared.next_delay = self.config.fast_forward_interval
+                # OCR していないフレームは、以後のフレームの再利用の基準にしない
+                self._reference_seq = None
+                return prepared
+            self._ff_streak = 0
+            self._ff_static = 0
+
+        # 変化検出が無効なら常に「変化あり」になるため、スケジューラには静止扱いで渡す
+        prepared.next_delay = self.scheduler.next_delay(changed and self.detector.enabled)
+        # 全体 OCR の周期が来ていれば、静止画面でも切り出した範囲の前回の結果は再利用しない
+        full_due = self.roi.tick()
+        if changed or self._reference_seq is None or full_due:
+            self._reference_seq = prepared.seq
+        else:
+            prepared.reuse_seq = self._reference_seq
+
+        # 遷移アニメーション中などの途中フレームは OCR しない
+        if self.detector.enabled and self.scheduler.settling:
+            prepared.deferred = True
+            return prepared
+
+        self._ff_check = False
+        if prepared.reuse_seq is None:
+            self._lookup_or_encode(prepared)
+        return prepared
+
+    def recognize(self, prepared: PreparedFrame) -> Sequence[OcrParagraph] | None:
+        """OCR 結果を返す。
+
+        画面が落ち着くのを待っている途中のフレーム、および OCR に失敗した場合は
+        None を返す（失敗時はサーバー復旧待ちを済ませてから返す）。
+        """
+        if prepared.deferred or prepared.fast_forward:
+            return None
+        if prepared.reuse_seq is not None:
+            if prepared.reuse_seq == self._last_seq:
+                prepared.source = "reuse"
+                self.logger.debug("画面変化なし (diff=%.2f): 前回の OCR 結果 %d件を再利用", self.detector.last_distance or 0.0, len(self._last_paragraphs))
+                return self._last_paragraphs
+            # 基準フレームが未認識（静止待ち・失敗・破棄）の場合はこのフレームを認識する
+            self._lookup_or_encode(prepared)
+
+        if prepared.replay is not None:
+            replay = prepared.replay
+            prepared.source = "playbook"
+            self.logger.info("プレイブック一致: step='%s' #%d (距離 %d/%d) -> OCR を省略", replay.step, replay.entry.id, replay.distance, replay.patch_distance)
+            self._last_seq = prepared.reuse_seq if prepared.reuse_seq is not None else prepared.seq
+            self._last_paragraphs = [OcrParagraph(text=replay.step, box=replay.entry.box)]
+            return self._last_paragraphs
+
+        if prepared.template_hit is not None:
+            hit = prepared.template_hit
+            prepared.source = "template"
+            self.logger.info("テンプレート一致: '%s' box=%s -> OCR を省略", hit.text, hit.box)
+            self._last_seq = prepared.reuse_seq if prepared.reuse_seq is not None else prepared.seq
+            self._last_paragraphs = [hit]
+            return self._last_paragraphs
+
+        paragraphs = prepared.paragraphs
+        if paragraphs is not None:
+            prepared.source = "cache"
+            self.logger.debug("OCR キャッシュヒット: %s (%d件)", prepared.cache_key, len(paragraphs))
+        else:
+            paragraphs = self._call_ocr(prepared)
+            if paragraphs is None:
+                return None
+            prepared.source = "ocr" if prepared.delta is None else "delta"
+        if self.delta is not None and prepared.roi is None:
+            # 次のフレームの差分 OCR の基準にする（キャプチャ段が画素を上書きしていたら使わない）
+            frame = self.engine.copy_if_live(prepared.frame)
+            if frame is not None:
+                self.delta.commit(frame, paragraphs, prepared.delta)
+            else:
+                self.delta.reset()
+        if prepared.roi is not None:
+            # 切り出し画像内の座標をキャプチャ画像（ウィンドウ）座標へ戻す
+            paragraphs = offset_paragraphs(paragraphs, prepared.roi[0], prepared.roi[1])
+        if prepared.verify is not None:
+            self._verify_playbook(prepared.verify, paragraphs)
+
+        self._last_seq = prepared.reuse_seq if prepared.reuse_seq is not None else prepared.seq
+        self._last_paragraphs = paragraphs
+        return paragraphs
+
+    def log_frame(self, prepared: PreparedFrame, paragraphs: Sequence[OcrParagraph], clicked: Sequence[tuple[str, OcrParagraph]]) -> None:
+        """フレームの候補（全語の文字列・矩形）と判定を1件のログレコードにまとめて出す（デバッグ目的）。
+
+        語ごとにログを出すとループのスレッドで1フレームに何十回も書き出すことになるため、
+        1レコードにまとめ、語の行への展開・JSON 化は書き出し側（:mod:`logger`）で行う。
+        前回の結果を再利用したフレームはデバッグレベルで出す。
+        """
+        level = logging.DEBUG if prepared.source == "reuse" else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+        frame = {
+            "seq": prepared.seq,
+            "source": prepared.source,
+            "words": [{"text": p.text, "box": list(p.box), "score": p.score} for p in paragraphs],
+            "clicked": [{"step": step, "text": p.text, "box": list(p.box)} for step, p in clicked],
+        }
+        decision = f" -> クリック: {', '.join(repr(step) for step, _ in clicked)}" if clicked else ""
+        self.logger.log(level, "OCR words (%d件, %s)%s", len(paragraphs), prepared.source, decision, extra={"frame": frame})
+
+    def close(self) -> None:
+        if self._owns_engine:
+            self.engine.close()
+        if self.archiver is not None:
+            self.archiver.close()
+            if self.archiver.dropped:
+                self.logger.warning("キャプチャ保存が追いつかず %d 枚を保存しませんでした", self.archiver.dropped)
+            if isinstance(self.archiver, SessionArchive) and self.archiver.paths:
+                self.logger.info("セッションアーカイブ: %s（同一フレーム %d 枚を重複排除）", ", ".join(str(p) for p in self.archiver.paths), self.archiver.deduplicated)
+        if self.cache is not None:
+            self.cache.close()
+            if self.cache.stats.dropped:
+                self.logger.warning("OCR キャッシュの保存が追いつかず %d 件をディスクに保存しませんでした", self.cache.stats.dropped)
+            self.stats.cache = self.cache.stats
+        if self.playbook is not None:
+            self.playbook.close()
+        if self.templates is not None:
+            self.templates.close()
+
+    def advance(self, win: WindowInfo) -> None:
+        """会話を1つ送る（早送りの送り操作）。"""
+        action = self.advance_action
+        backend = self.window.backend
+        with _INPUT_LOCK:
+            if backend.foreground_window() != win.hwnd:
+                backend.bring_to_foreground(win.hwnd)
+            if action.key is not None:
+                backend.press_key(action.key)
+            else:
+                x, y = action.position(win.width, win.height)
+                backend.click(win.left + x, win.top + y)
+            self.stats.advances += 1
+        self.metrics.incr("advances")
+
+    def on_unmatched(self, prepared: PreparedFrame) -> bool:
+        """認識したが一致する step が無かったフレームの後処理。送り操作をしたら True を返す。
+
+        切り出した範囲の OCR で一致しなかった場合は、選択肢が範囲の外に出ている可能性があるため、
+        次のフレームは画面が静止していても前回の結果を再利用せずに全体を OCR する。
+
+        早送り中は、選択肢画面でないと判定したフレーム（早送りをやめて確認のため OCR したもの）だけ
+        会話を送る。選択肢画面の可能性があるフレームで送りのクリックをすると選択肢の1つを選んで
+        しまうことがあるため、画面が変わるのを待つ。送り操作をした場合、呼び出し側はそれ以前に
+        キャプチャしたフレーム（まだ送る前の会話画面）で判定しないようにする。
+        """
+        if prepared.roi is not None:
+            self.logger.debug("切り出した範囲 %s に一致する step が無いため、次は全体を OCR します", prepared.roi)
+            self.roi.request_full()
+        if self.classifier is not None and prepared.choice_likely is False:
+            self.advance(prepared.win)
+            return True
+        return False
+
+    def _keep_fast_forwarding(self, changed: bool) -> bool:
+        """選択肢画面でないと判定したフレームを、OCR せずに送ってよいか。
+
+        送り操作をしても画面が変わらないことが ``fast_forward_max_static`` 回続いた場合
+        （判定を逃した選択肢画面で止まっている可能性）と、``fast_forward_ocr_every`` 回続けて
+        送った場合は False を返し、そのフレームを OCR させる（静止待ちで見送られたら次のフレームを OCR させる）。
+        """
+        if self._ff_check:
+            return False
+        if self._ff_streak > 0 and self.detector.enabled:
+            self._ff_static = 0 if changed else self._ff_static + 1
+        self._ff_streak += 1
+        every = self.config.fast_forward_ocr_every
+        if self._ff_static >= self.config.fast_forward_max_static:
+            reason = f"送っても画面が {self._ff_static} 回変わらない"
+        elif every and self._ff_streak > every:
+            reason = f"{every} 回続けて送った"
+        else:
+            return True
+        self.logger.info("早送り: %sため、確認のため OCR します", reason)
+        self.stats.fast_forward_checks += 1
+        self.metrics.incr("fast_forward_checks")
+        self._ff_check = True
+        return False
+
+    def record_click(self, prepared: PreparedFrame, step: str, paragraph: OcrParagraph) -> None:
+        """クリックした判定を記録し、語の位置を ROI の学習に、見た目をテンプレートマッチ・プレイブックに使う。"""
+        from_template = prepared.template_hit is not None
+        replay = prepared.replay
+        self.roi.record_hit(paragraph.box)
+        self.stats.steps_done += 1
+        # 画像から学習する場合は画素をコピーしておく（判定が遅れてリングバッファの画素が
+        # 上書きされていたら、画像からは学習しない）
+        learns = self.classifier is not None or (not from_template and (self.templates is not None or (self.playbook is not None and replay is None)))
+        frame = self.engine.copy_if_live(prepared.frame) if learns else None
+        if learns and frame is None:
+            self.logger.debug("フレーム %d の画素は上書き済みのため学習を省略", prepared.frame.seq)
+        # 選択肢が出ていた画面として覚え、似た画面は以後も早送りしない
+        if self.classifier is not None and frame is not None:
+            self.classifier.learn(frame)
+        # テンプレート一致でのクリックからは学習しない（位置ずれの蓄積を避ける）
+        if self.templates is not None and frame is not None and not from_template and self.templates.learn(step, frame, paragraph.box):
+            self.logger.debug("テンプレートを保存: step='%s' box=%s", step, paragraph.box)
+        if self.playbook is not None:
+            if replay is not None:
+                self.playbook.replayed(replay.entry)
+            elif frame is not None and not from_template:
+                entry = self.playbook.record(step, paragraph.text, frame, paragraph.box)
+                if entry is not None:
+                    self.logger.debug("プレイブックに記録: #%d step='%s' box=%s", entry.id, step, paragraph.box)
+        if isinstance(self.archiver, SessionArchive):
+            source = "playbook" if replay is not None else "template" if from_template else "ocr"
+            decision = {"step": step, "text": paragraph.text, "box": list(paragraph.box), "score": paragraph.score, "source": source}
+            self.archiver.add_decision(prepared.seq, decision)
+
+    def _lookup_or_encode(self, prepared: PreparedFrame) -> None:
+        if self._match_playbook(prepared) or self._match_template(prepared):
+            return
+        if prepared.ocr_frame is None:
+            with self.metrics.span("crop"):
+                prepared.roi = self.roi.plan(prepared.frame.width, prepared.frame.height) if self.roi.enabled else None
+                if prepared.roi is not None and self.batcher is not None:
+                    # 離れた領域は、間の部分を含めずに別々の画像としてモザイクに並べる
+                    parts = self.roi.parts(prepared.frame.width, prepared.frame.height)
+                    prepared.regions = parts if len(parts) > 1 else None
+                prepared.ocr_frame = crop_frame(prepared.frame, prepared.roi) if prepared.roi is not None else prepared.frame
+        # 同一画面（内容ハッシュ一致）の OCR 結果があればネットワークを使わない
+        if self.cache is not None and not prepared.cache_checked:
+            prepared.cache_checked = True
+            with self.metrics.span("cache"):
+                prepared.cache_key = self._cache_key(prepared)
+                prepared.paragraphs = self.cache.get(prepared.cache_key)
+            if prepared.paragraphs is not None:
+                return
+        # 差分 OCR では、送る範囲が決まる OCR 段でエンコードする
+        if self.batcher is None and self.delta is None:
+            self._encode(prepared)
+
+    def _cache_key(self, prepared: PreparedFrame) -> str:
+        """OCR 結果キャッシュのキー。
+
+        画素に加えて、OCR 結果の語・座標を左右する送信画像の設定（形式・グレースケール・縮小など）と
+        切り出し範囲を含める（設定を変えた後に、別の座標系で保存した結果を使わないようにする）。
+        """
+        assert prepared.ocr_frame is not None
+        variant = f"{self.encode_options!r};roi={prepared.roi};regions={prepared.regions}"
+        return OcrResultCache.key_for(prepared.ocr_frame.rgb, prepared.ocr_frame.size, variant)
+
+    def _match_playbook(self, prepared: PreparedFrame) -> bool:
+        """現在の step について記録済みの画面に近ければ、記録した位置を結果にする。
+
+        一致しても ``playbook_verify_rate`` の割合で OCR し、その結果で記録を確かめる。
+        """
+        if prepared.replay is not None:
+            return True
+        if self.playbook is None or prepared.verify is not None:
+            return False
+        with self.metrics.span("playbook"):
+            hit = self.playbook.lookup(self.current_steps, prepared.frame)
+        if hit is None:
+            return False
+        self.metrics.incr("playbook_hits")
+        if self._rng.random() < self.config.playbook_verify_rate:
+            self.logger.debug("プレイブック一致: step='%s' #%d -> 確認のため OCR", hit.step, hit.entry.id)
+            prepared.verify = hit
+            return False
+        prepared.replay = hit
+        return True
+
+    def _verify_playbook(self, hit: PlaybookHit, paragraphs: Sequence[OcrParagraph]) -> None:
+        """OCR 結果で、記録した位置に step の語があるかを確かめる。"""
+        assert self.playbook is not None
+        found = find_matching_paragraph(hit.step, paragraphs)
+        area = patch_box(hit.entry.box, *hit.entry.frame_size)
+        ok = found is not None and area[0] <= (found.box[0] + found.box[2]) / 2 < area[2] and area[1] <= (found.box[1] + found.box[3]) / 2 < area[3]
+        if not ok:
+            self.logger.warning("プレイブックの記録 #%d（step='%s'）を OCR で確認できませんでした", hit.entry.id, hit.step)
+        self.playbook.report(hit.entry, ok)
+
+    def _match_template(self, prepared: PreparedFrame) -> bool:
+        """現在の step と先読みする step の保存済みパッチがフレーム内にあれば、その位置を結果にする。
+
+        OCR の照合と同じく、先読みで飛ばす step の少ない段から順に探す（先読みした step に
+        一致した場合に手前の step を飛ばすかは、OCR の結果と同じく判定段が決める）。
+        """
+        if prepared.template_hit is not None:
+            return True
+        if self.templates is None:
+            return False
+        hit = None
+        with self.metrics.span("template"):
+            for step in (s for level in self.step_levels for s in level):
+                hit = self.templates.find(step, prepared.frame)
+                if hit is not None:
+                    break
+        if hit is None:
+            return False
+        self.logger.debug("テンプレート一致: step='%s' box=%s (NCC %.3f)", step, hit.box, hit.score)
+        self.metrics.incr("template_hits")
+        # 認識スコアによる除外の対象にしないため score は付けない
+        prepared.template_hit = OcrParagraph(text=step, box=hit.box)
+        return True
+
+    def _encode(self, prepared: PreparedFrame) -> None:
+        # メモリ上で前処理・エンコードしてそのまま送信。ディスク保存はバックグラウンドに任せる
+        assert prepared.ocr_frame is not None
+        started = time.perf_counter()
+        with self.metrics.span("encode"):
+            encoded = encode_frame(prepared.ocr_frame, self.encode_options)
+        prepared.encoded = encoded
+        self.metrics.incr("upload_bytes", len(encoded.data))
+        self.logger.debug(
+            "キャプチャ: %dx%d, 送信範囲 %s, 送信画像 %dx%d %s, %d bytes, エンコード %.1f ms (diff=%s)",
+            prepared.frame.width,
+            prepared.frame.height,
+            prepared.roi or "全体",
+            encoded.width,
+            encoded.height,
+            encoded.format,
+            len(encoded.data),
+            (time.perf_counter() - started) * 1000,
+            self.detector.last_distance,
+        )
+        self._archive(prepared, encoded)
+
+    def _archive(self, prepared: PreparedFrame, encoded: EncodedImage) -> None:
+        if isinstance(self.archiver, SessionArchive):
+            self.archiver.add_frame(prepared.seq, encoded.data)
+        elif self.archiver is not None:
+            self.archiver.submit(encoded.data, encoded.suffix)
+
+    def _recognize_mosaic(self, prepared: PreparedFrame) -> tuple[list[OcrParagraph], dict]:
+        """OCR 対象（離れた領域があれば領域ごとの切り出し）を他の画像とまとめて OCR する。
+
+        Returns:
+            ``ocr_frame`` 内座標の語と、モザイク画像の OCR 応答。
+        """
+        assert self.batcher is not None
+        frame = prepared.ocr_frame
+        assert frame is not None
+        if prepared.regions and prepared.roi is not None:
+            x0, y0 = prepared.roi[0], prepared.roi[1]
+            boxes: list[Box | None] = [(b[0] - x0, b[1] - y0, b[2] - x0, b[3] - y0) for b in prepared.regions]
+        else:
+            boxes = [None]
+        # まとめ役のスレッドが後で読むため、リングバッファの画素は切り離しておく
+        crops = [frame.detach() if box is None else crop_frame(frame, box) for box in boxes]
+        parts = self.batcher.recognize(crops)
+        paragraphs: list[OcrParagraph] = []
+        for box, part in zip(boxes, parts, strict=True):
+            paragraphs.extend(part.paragraphs if box is None else offset_paragraphs(part.paragraphs, box[0], box[1]))
+        encoded = parts[0].encoded
+        self.metrics.incr("upload_bytes", len(encoded.data) // parts[0].batch_size)
+        self.logger.debug(
+            "モザイク OCR: %d 領域を計 %d 枚の画像とまとめて送信 (送信画像 %dx%d %s, %d bytes)",
+            len(crops),
+            parts[0].batch_size,
+            encoded.width,
+            encoded.height,
+            encoded.format,
+            len(encoded.data),
         )
-        logger.debug("キャプチャ保存: %s", img_path)
+        self._archive(prepared, encoded)
+        return paragraphs, parts[0].data
+
+    def _recognize_delta(self, prepared: PreparedFrame, plan: DeltaPlan) -> tuple[list[OcrParagraph], dict]:
+        """変化した矩形だけを切り出して OCR し、引き継いだ語と合わせたフレーム全体の結果にする。
 
+        矩形が複数あれば1枚のモザイクに並べて送る（モザイク OCR が有効なら他の画像ともまとめる）。
+
+        Returns:
+            フレーム内座標の語と、OCR 応答（最初のモザイク画像のもの）。
+        """
+        crops = [crop_frame(prepared.frame, r) for r in plan.regions]
+        if self.batcher is not None:
+            parts = self.batcher.recognize(crops)
+        else:
+            parts = []
+            pending = list(crops)
+            while pending:
+                layout = MosaicLayout(self.config.ocr_mosaic_size[0], self.config.ocr_mosaic_size[1], self.config.ocr_mosaic_padding)
+                batch: list[CapturedFrame] = []
+                while pending and layout.fits(pending[0].width, pending[0].height):
+                    layout.add(pending[0].width, pending[0].height)
+                    batch.append(pending.pop(0))
+                parts.extend(analyze_mosaic(self.client, batch, layout, self.encode_options)[0])
+        fresh: list[OcrParagraph] = []
+        for region, part in zip(plan.regions, parts, strict=True):
+            fresh.extend(offset_paragraphs(part.paragraphs, region[0], region[1]))
+        encoded = parts[0].encoded
+        self.metrics.incr("upload_bytes", len(encoded.data) // parts[0].batch_size)
+        self.logger.debug(
+            "差分 OCR: タイル %d/%d 個が変化, %d 矩形 %d 画素を送信（フレームの %.1f%%）, 引き継ぎ %d 語",
+            plan.dirty,
+            plan.tiles,
+            len(plan.regions),
+            plan.pixels,
+            plan.pixels * 100 / (prepared.frame.width * prepared.frame.height),
+            len(plan.kept),
+        )
+        self._archive(prepared, encoded)
+        return plan.combine(fresh), parts[0].data
+
+    def _call_ocr(self, prepared: PreparedFrame) -> Sequence[OcrParagraph] | None:
+        plan = None
+        if self.delta is not None and prepared.roi is None:
+            with self.metrics.span("delta"):
+                plan = prepared.delta = self.delta.plan(prepared.frame)
+            if plan is not None and not plan.regions:
+                # 基準フレームと同一: OCR せずに前回の結果を使う
+                return plan.kept
+        if plan is None and self.batcher is None and prepared.encoded is None:
+            self._encode(prepared)
+        encoded = prepared.encoded
+        mosaic: list[OcrParagraph] | None = None
         # OCR 呼び出し（エンドポイントは設定から取得: 必須）
+        with self.metrics.span("throttle"):
+            self.scheduler.throttle_ocr()
         try:
-            data = call_ocr_api(config.ocr_api_endpoint, img_path)
+            with self.metrics.span("ocr"):
+                if plan is not None:
+                    mosaic, data = self._recognize_delta(prepared, plan)
+                elif self.batcher is not None:
+                    mosaic, data = self._recognize_mosaic(prepared)
+                else:
+                    assert encoded is not None
+                    data = self.client.analyze(encoded.data, filename=encoded.filename, content_type=encoded.content_type)
+        except OcrUnavailableError as e:
+            self.logger.warning("%s", e)
+            # 一律に interval 待つのではなく、ヘルスチェックで復旧したら即再開する
+            self.client.wait_until_available(self.config.interval)
+            return None
         except Exception as e:
-            logger.error("OCR API 失敗: %s", e)
-            time.sleep(config.interval)
-            continue
+            self.stats.frames_ocr += 1
+            self.metrics.incr("ocr_errors")
+            self.logger.error("OCR API 失敗: %s", e)
+            # リトライのバックオフはクライアント側で実施済み
+            self.client.wait_until_available(self.config.interval)
+            return None
+        self.stats.frames_ocr += 1
+        self.metrics.incr("frames_ocr")
+        self.logger.debug("OCR レイテンシ: %.3f 秒", self.client.stats.last or 0.0)
+        if self.stats.first_ocr is None:
+            self.stats.first_ocr = time.monotonic() - self.started_at
+            self.logger.info("最初の OCR 応答: 起動から %.2f 秒", self.stats.first_ocr)
+        if isinstance(self.archiver, SessionArchive):
+            self.archiver.add_ocr(prepared.seq, data)
+
+        # 縮小して送った場合は座標を OCR 対象フレームの座標へ戻す（キャッシュもこの座標で保存）
+        if mosaic is not None:
+            # モザイクの応答は振り分け・座標の変換まで済んでいる
+            paragraphs: Sequence[OcrParagraph] = mosaic
+        else:
+            assert encoded is not None
+            with self.metrics.span("parse"):
+                paragraphs = scale_paragraphs(parse_ocr_result(data), encoded.scale_x, encoded.scale_y)
+        if self.cache is not None:
+            if prepared.cache_key is None:
+                prepared.cache_key = self._cache_key(prepared)
+            self.cache.put(prepared.cache_key, paragraphs)
+        return paragraphs
+
+
+def _try_click_steps(
+    backend: WindowBackend,
+    win: WindowInfo,
+    paragraphs: Sequence[OcrParagraph],
+    cursor: StepCursor,
+    matcher: StepMatcher,
+    max_clicks: int,
+    metrics: BoundMetrics,
+    logger: logging.Logger,
+) -> list[tuple[str, OcrParagraph]]:
+    """一致しうる step すべてと照合し、一致した語をクリックして step を進める。
 
-        paragraphs: list[OcrParagraph] = extract_paragraphs(data)
+    語の前処理は1フレームにつき1度だけ行い、クリックした語を除いて ``max_clicks`` 回まで
+    照合を繰り返す（次の step の選択肢も同じ画面に出ていれば1フレームで進める）。
 
-        # 候補をログに出す（デバッグ目的）
-        if not paragraphs:
-            logger.info("OCR words: 0件")
+    Returns:
+        クリックした (step, 語) の列。
+    """
+    with metrics.span("match"):
+        words = matcher.prepare(paragraphs)
+    clicked: list[tuple[str, OcrParagraph]] = []
+    while len(clicked) < max_clicks and not cursor.done:
+        with metrics.span("match"):
+            hit = cursor.select(matcher, words)
+        if hit is None:
+            if not clicked:
+                logger.debug("未一致: step=%s", list(cursor.current_steps))
+            break
+        step, paragraph = hit.node.text, hit.result.paragraph
+        if hit.level > 0:
+            logger.warning("先読み: step='%s' に一致したため、手前の step を %d 個飛ばします", step, hit.level)
+        if hit.result.score < 1.0:
+            logger.info("一致: step='%s' ~ '%s' (スコア %.2f) -> クリック実行", step, paragraph.text, hit.result.score)
         else:
-            logger.info("OCR words (%d件):", len(paragraphs))
-            for p in paragraphs:
-                logger.info(" - '%s' box=%s", p.text, p.box)
-
-        # 先頭の step にのみ反応（1画像で2回以上のクリックはしない）
-        current = pending_steps[0]
-        hit = find_matching_paragraph(current, paragraphs)
-        if hit:
-            logger.info("一致: step='%s' -> クリック実行", current)
-            _click_in_window_center_of_box(win, hit.box, logger)
-            pending_steps.pop(0)
-            # 次のステップへ。ただし次回キャプチャまで少し待つ
-            time.sleep(max(0.3, min(1.0, config.interval / 10)))
+            logger.info("一致: step='%s' -> クリック実行", step)
+        with metrics.span("click"):
+            _click_in_window_center_of_box(backend, win, paragraph.box, logger)
+        metrics.incr("clicks")
+        cursor.advance(hit.node)
+        clicked.append((step, paragraph))
+        words = [w for w in words if w.paragraph is not paragraph]
+    return clicked
+
+
+def _resume_from_checkpoint(checkpoints: CheckpointStore, cursor: StepCursor, logger: logging.Logger) -> Checkpoint | None:
+    """チェックポイントがあれば ``cursor`` をその位置へ進める。再開したらその内容を返す。"""
+    saved = checkpoints.load(cursor.graph)
+    if saved is None:
+        return None
+    try:
+        cursor.restore(saved.frontier)
+    except ValueError as e:
+        logger.warning("チェックポイントを使えません: %s (%s)", checkpoints.path, e)
+        return None
+    logger.info("チェックポイントから再開: 完了済み step %d 個（最後: '%s'）, 次の step=%s", saved.steps_done, saved.last_step, list(cursor.current_steps))
+    return saved
+
+
+def _run_serial(processor: _FrameProcessor, scheduler: TickScheduler, cursor: StepCursor, matcher: StepMatcher, logger: logging.Logger) -> None:
+    """キャプチャ→OCR→判定→待機を1フレームずつ順に行う。"""
+    while not cursor.done:
+        processor.follow(cursor)
+        prepared = processor.capture()
+        paragraphs = processor.recognize(prepared)
+
+        clicked = _try_click_steps(processor.window.backend, prepared.win, paragraphs, cursor, matcher, processor.config.max_clicks_per_frame, processor.metrics, logger) if paragraphs is not None else []
+        if paragraphs is not None:
+            processor.log_frame(prepared, paragraphs, clicked)
+        for step, hit in clicked:
+            processor.record_click(prepared, step, hit)
+        if clicked:
+            processor.save_checkpoint(cursor, clicked[-1][0])
+            # クリック後は画面が遷移するはずなので、落ち着くまで細かく見て必ず OCR する
+            processor.request_full_ocr()
+            scheduler.on_click()
+            delay = scheduler.min_interval
+        elif paragraphs is not None and processor.on_unmatched(prepared):
+            # 送り操作をした: パイプラインモードと同じく、送りの間隔を空けてからキャプチャし直す
+            delay = processor.config.fast_forward_interval
         else:
-            logger.debug("未一致: step='%s'", current)
-            time.sleep(config.interval)
+            delay = prepared.next_delay
+        with processor.metrics.span("sleep"):
+            time.sleep(delay)
+
+
+def _run_pipelined(processor: _FrameProcessor, scheduler: TickScheduler, cursor: StepCursor, matcher: StepMatcher, stats: RunStats, logger: logging.Logger) -> None:
+    """フレーム N の OCR 中にフレーム N+1 のキャプチャ・エンコードを進める。
+
+    判定は直列ループと同じ関数で行い、クリック後はそれ以前にキャプチャした
+    フレームをすべて破棄するため、古い画面に基づいてクリックすることはない。
+    """
+    processor.follow(cursor)
+    pipe: FramePipeline[PreparedFrame, Sequence[OcrParagraph]] = FramePipeline(processor.capture, processor.recognize, lambda job: job.next_delay, logger)
+    with pipe:
+        while not cursor.done:
+            # 判定段が結果を待った時間（パイプラインでは「待機」に相当）
+            with processor.metrics.span("wait"):
+                item = pipe.get(timeout=1.0)
+            if item is None:
+                continue
+            clicked = _try_click_steps(processor.window.backend, item.job.win, item.result, cursor, matcher, processor.config.max_clicks_per_frame, processor.metrics, logger)
+            processor.log_frame(item.job, item.result, clicked)
+            for step, hit in clicked:
+                processor.record_click(item.job, step, hit)
+            if clicked:
+                processor.save_checkpoint(cursor, clicked[-1][0])
+                # 以後のフレームは次の step のパッチで照合する（破棄前のフレームは使わない）
+                processor.follow(cursor)
+                processor.request_full_ocr()
+                scheduler.on_click()
+                pipe.advance_epoch(not_before=time.monotonic() + scheduler.min_interval)
+            elif processor.on_unmatched(item.job):
+                # 送り操作の前にキャプチャしたフレーム（送る前の会話画面）で、もう一度送らない
+                pipe.advance_epoch(not_before=time.monotonic() + processor.config.fast_forward_interval)
+    stats.frames_dropped = pipe.dropped
+
+
+@dataclass
+class StartupResult:
+    """:func:`start_concurrently` の結果。
+
+    Attributes:
+        client: 生成した OCR 送信口（呼び出し側で閉じる）。
+        healthy: OCR サーバーのヘルスチェックに成功したか。
+        window: 対象ウィンドウを解決済みのリゾルバ。
+        engine: 準備済みのキャプチャエンジン。
+        frame: ウィンドウ解決後に撮った最初のフレーム（失敗時は None）。
+        started_at: 起動時刻（``time.monotonic()``）。最初の OCR 応答までの時間の基準。
+        durations: 準備処理ごとの所要秒（``health`` / ``window`` / ``capture``）。
+    """
+
+    client: OcrService
+    healthy: bool
+    window: WindowResolver
+    engine: CaptureEngine
+    frame: CapturedFrame | None
+    started_at: float
+    durations: dict[str, float]
+
+
+def start_concurrently(
+    config: AppConfig,
+    logger: logging.Logger,
+    *,
+    backend: WindowBackend | None = None,
+    engine: CaptureEngine | None = None,
+    started_at: float | None = None,
+    health_timeout: float = 10.0,
+) -> StartupResult:
+    """OCR サーバーのヘルスチェック、ウィンドウの解決、キャプチャの準備を並行に行う。
+
+    ヘルスチェックの応答待ち（最大 ``health_timeout`` 秒）の間に、ウィンドウを解決して
+    最初のフレームまで撮っておく。ウィンドウの解決・キャプチャに失敗しても例外は送出せず、
+    :func:`run_automation` での再解決に任せる。
+    """
+    started_at = started_at if started_at is not None else time.monotonic()
+    window = WindowResolver(backend if backend is not None else default_backend(), config.title, logger)
+    engine = engine if engine is not None else CaptureEngine()
+    durations: dict[str, float] = {}
+
+    def timed[T](name: str, fn: Callable[[], T]) -> T:
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            durations[name] = time.perf_counter() - t0
+
+    def check_health() -> tuple[OcrService, bool]:
+        client = create_ocr_client(config, logger)
+        return client, client.health(timeout=health_timeout)
+
+    def first_frame() -> CapturedFrame:
+        with _INPUT_LOCK:
+            win = window.resolve()
+            return grab_window_region(win.left, win.top, win.width, win.height, keep_height=config.capture_keep_height, engine=engine)
+
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as pool:
+        health_future = pool.submit(timed, "health", check_health)
+        frame_future = pool.submit(timed, "window", first_frame)
+        # 画面キャプチャの初期化（mss の読み込み等）はウィンドウ解決と重ねる
+        warm_future = pool.submit(timed, "capture", engine.warm_up)
+        client, healthy = health_future.result()
+        frame: CapturedFrame | None = None
+        try:
+            frame = frame_future.result()
+        except Exception as e:
+            logger.warning("起動時のウィンドウ解決・キャプチャに失敗: %s", e)
+        try:
+            warm_future.result()
+        except Exception as e:
+            logger.warning("キャプチャの準備に失敗: %s", e)
+
+    logger.info(
+        "起動準備（並行）: ヘルスチェック %.0f ms / ウィンドウ解決・初回キャプチャ %.0f ms / キャプチャ準備 %.0f ms, 計 %.0f ms",
+        durations.get("health", 0.0) * 1000,
+        durations.get("window", 0.0) * 1000,
+        durations.get("capture", 0.0) * 1000,
+        (time.monotonic() - started_at) * 1000,
+    )
+    return StartupResult(client=client, healthy=healthy, window=window, engine=engine, frame=frame, started_at=started_at, durations=durations)
+
+
+def run_automation(
+    base_dir: Path,
+    config: AppConfig,
+    logger: logging.Logger,
+    client: OcrService | None = None,
+    *,
+    shared_limiter: RateLimiter | None = None,
+    session_name: str | None = None,
+    backend: WindowBackend | None = None,
+    startup: StartupResult | None = None,
+    resume: bool = True,
+    capture: CaptureEngine | None = None,
+    batcher: MosaicBatcher | None = None,
+) -> RunStats:
+    """自動操作のメインループ。
+
+    1. 対象ウィンドウを探して前面化
+    2. スケジューラが決めた間隔（上限 interval）毎にキャプチャ→OCR→ログへ候補出力
+       （前回 OCR 時から画面が変化していなければ OCR を省略して前回結果を再利用し、
+       過去に同一内容の画面を OCR 済みならキャッシュから結果を取り出す）
+       画像はメモリ上で送信し、``capture/`` への保存はバックグラウンドで行う
+    3. 一致しうる step（分岐・候補・先読みを含む）に部分一致（設定に応じてあいまい一致）したらクリック
+    4. step グラフの終端まで進んだら終了
+
+    ``config.pipeline`` が有効な場合は、キャプチャ・OCR・判定を別スレッドで重ねて実行する。
+
+    Args:
+        base_dir: プロジェクトルート。
+        config: アプリ設定。
+        logger: ロガー。
+        client: 任意。共有する OCR クライアント。未指定なら設定から生成し、終了時に閉じる。
+        shared_limiter: 任意。複数セッションで共有する全体の OCR レート制限。
+        session_name: 任意。複数セッション実行時のセッション名（キャプチャ保存先の分離に使う）。
+        backend: 任意。ウィンドウ操作のバックエンド。未指定なら実行環境の既定（Win32）。
+        startup: 任意。:func:`start_concurrently` の結果。解決済みのウィンドウと最初の
+            フレームを使い、最初の OCR 応答までの時間を起動時刻から測る。
+        resume: False ならチェックポイントを消して最初の step から始める。
+        capture: 任意。キャプチャエンジン（合成フレームの取得元を差し込む場合など）。
+            未指定なら ``startup`` のもの、それも無ければ mss を使うエンジンを作り、終了時に閉じる。
+        batcher: 任意。複数セッションで共有するモザイク OCR のまとめ役。未指定で
+            ``config.ocr_mosaic`` が有効なら、このセッション専用のもの（離れた領域をまとめる）を作る。
+
+    Returns:
+        キャプチャ数・OCR 送信数などの集計値。
+    """
+    if startup is not None:
+        window = startup.window
+        client = client if client is not None else startup.client
+    else:
+        window = WindowResolver(backend if backend is not None else default_backend(), config.title, logger)
+    with _INPUT_LOCK:
+        window.resolve()
+
+    cursor = create_step_cursor(config)
+    checkpoints = create_checkpoint_store(base_dir, config, logger, session_name)
+    resumed = None
+    if checkpoints is not None:
+        if resume:
+            resumed = _resume_from_checkpoint(checkpoints, cursor, logger)
+        else:
+            checkpoints.clear()
+    logger.info(
+        "開始: title='%s', interval=%s, steps=%s%s, ocr_api_endpoints=%s, keep_height=%s, change_threshold=%s, pipeline=%s",
+        config.title,
+        config.interval,
+        config.steps,
+        "" if cursor.graph.is_linear else "（分岐・候補あり）",
+        config.endpoints,
+        config.capture_keep_height,
+        config.change_threshold,
+        config.pipeline,
+    )
+
+    stats = RunStats()
+    owns_client = client is None
+    ocr_client = client if client is not None else create_ocr_client(config, logger)
+    scheduler = create_scheduler(config, logger, shared_limiter)
+    engine = capture if capture is not None else startup.engine if startup is not None else None
+    owns_batcher = batcher is None and config.ocr_mosaic
+    if owns_batcher:
+        batcher = create_mosaic_batcher(config, ocr_client, logger)
+    processor = _FrameProcessor(base_dir, config, logger, ocr_client, stats, scheduler, window, session_name, checkpoints, engine, batcher)
+    if resumed is not None:
+        processor.resumed_steps = resumed.steps_done
+    if startup is not None:
+        processor.started_at = startup.started_at
+        if startup.frame is not None:
+            processor.prime(startup.frame)
+    matcher = create_matcher(config)
+
+    started = time.monotonic()
+    if batcher is not None:
+        batcher.register()
+    try:
+        if config.pipeline:
+            _run_pipelined(processor, scheduler, cursor, matcher, stats, logger)
+        else:
+            _run_serial(processor, scheduler, cursor, matcher, logger)
+        logger.info("全てのステップが完了しました。終了します。")
+        if checkpoints is not None:
+            checkpoints.clear()
+    finally:
+        stats.elapsed = time.monotonic() - started
+        if batcher is not None:
+            # 他のセッションがこのセッションの画像を待たないようにする
+            batcher.unregister()
+        processor.close()
+        latency = ocr_client.stats
+        if latency.count:
+            logger.info(
+                "OCR レイテンシ: 成功 %d 件 / 失敗 %d 件 / リトライ %d 回, 平均 %.3f 秒, p50 %.3f 秒, p95 %.3f 秒",
+                latency.count,
+                latency.failures,
+                latency.retries,
+                latency.mean or 0.0,
+                latency.percentile(50) or 0.0,
+                latency.percentile(95) or 0.0,
+            )
+        if stats.cache is not None:
+            logger.info(
+                "OCR キャッシュ: ヒット %d 件（メモリ %d / ディスク %d）, ミス %d 件, 追い出し %d 件, ヒット率 %.1f%%",
+                stats.cache.hits,
+                stats.cache.memory_hits,
+                stats.cache.disk_hits,
+                stats.cache.misses,
+                stats.cache.evictions,
+                stats.cache.hit_rate * 100,
+            )
+        if owns_batcher and batcher is not None and batcher.stats.requests:
+            log_mosaic_stats(batcher, logger)
+        if owns_client:
+            ocr_client.close()
+        logger.info(
+            "集計: キャプチャ %d 枚 / OCR 送信 %d 枚（省略 %d 枚, 破棄 %d 枚）",
+            stats.frames_captured,
+            stats.frames_ocr,
+            stats.frames_skipped,
+            stats.frames_dropped,
+        )
+        logger.info("進行: step %d 個 / %.1f 秒（%.2f step/分）", stats.steps_done, stats.elapsed, stats.steps_per_minute)
+        if stats.first_ocr is not None:
+            logger.info("最初の OCR 応答まで: %.2f 秒", stats.first_ocr)
+        if processor.classifier is not None:
+            ff = processor.classifier.stats
+            logger.info(
+                "早送り: 送り %d 回, 判定 %d 枚（選択肢の可能性あり %d 枚）, 確認の OCR %d 回, 選択肢画面の学習 %d 件",
+                stats.advances,
+                ff.frames,
+                ff.choice,
+                stats.fast_forward_checks,
+                ff.learned,
+            )
+        if processor.delta is not None:
+            dst = processor.delta.stats
+            logger.info("差分 OCR: 差分 %d 回（送信画素 フレームの %.1f%%）, 変化なし %d 回", dst.delta, dst.sent_ratio * 100, dst.unchanged)
+        if processor.playbook is not None:
+            pst = processor.playbook.stats
+            logger.info(
+                "プレイブック: 一致 %d 回 / 照合 %d 回, 確認 %d 回（失敗 %d 回, 破棄 %d 件）, 新規記録 %d 件（計 %d 件）",
+                pst.hits,
+                pst.lookups,
+                pst.verified + pst.failures,
+                pst.failures,
+                pst.dropped,
+                pst.recorded,
+                len(processor.playbook),
+            )
+        templates = processor.templates
+        if templates is not None:
+            logger.info("テンプレートマッチ: 一致 %d 回 / 不一致 %d 回, 保存 %d 件", templates.stats.hits, templates.stats.misses, len(templates))
+        logger.info("ウィンドウ解決: %d 回（キャッシュ再利用 %d 回 / 全列挙 %d 回）", window.stats.resolves, window.stats.cache_hits, window.stats.enumerations)
+        stage_lines = processor.metrics.summary_lines()
+        if stage_lines:
+            logger.info("処理段ごとの所要時間:")
+            for line in stage_lines:
+                logger.info(" - %s", line)
 
-    logger.info("全てのステップが完了しました。終了します。")
+    return stats
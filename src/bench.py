@@ -0,0 +1,237 @@
+"""ベンチマーク。
+
+実機（Windows / OCR サーバー）なしで、各処理の1フレームあたりのコストを計測する。
+
+使い方::
+
+    uv run python src/bench.py matcher --steps 300 --words 300
+    uv run python src/bench.py encode --image capture/sample.png --endpoint http://deep01.local:3200
+    uv run python src/bench.py suite --save        # ベースラインを保存
+    uv run python src/bench.py suite               # ベースラインと比較（遅くなっていれば終了コード 1）
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import click
+
+from benchsuite import default_cases, environment, find_regressions, load_baseline, run_cases, save_baseline, synthetic_frame
+from capture import CapturedFrame
+from encode import EncodeOptions, encode_frame, pillow_available
+from matcher import StepMatcher
+from ocr import OcrClient, OcrParagraph, extract_paragraphs, find_matching_paragraph
+
+# encode ベンチマークで比較する前処理・エンコードの組み合わせ
+_ENCODE_PROFILES: tuple[EncodeOptions, ...] = (
+    EncodeOptions(),
+    EncodeOptions(png_level=1),
+    EncodeOptions(grayscale=True),
+    EncodeOptions(grayscale=True, png_level=1),
+    EncodeOptions(grayscale=True, scale=0.75),
+    EncodeOptions(grayscale=True, scale=0.5),
+    EncodeOptions(contrast_stretch=True, scale=0.75),
+    EncodeOptions(binarize=128, scale=0.75),
+    EncodeOptions(format="jpeg", quality=85),
+    EncodeOptions(format="jpeg", grayscale=True, scale=0.75, quality=80),
+    EncodeOptions(format="webp", quality=80),
+)
+
+# 合成テキストに使う文字（ひらがな・カタカナ・取り違えやすい文字を含む漢字）
+_ALPHABET = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんアイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲンー一口力工二夕卜八"
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    """``fn`` を ``repeat`` 回実行し、1回あたりの秒数の最小値（ウォームアップ後）を返す。"""
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _random_text(rng: random.Random, lo: int, hi: int) -> str:
+    return "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(lo, hi)))
+
+
+def _garble(rng: random.Random, text: str) -> str:
+    """OCR 誤認識を模して1文字を置換または欠落させる。"""
+    i = rng.randrange(len(text))
+    if rng.random() < 0.5:
+        return text[:i] + text[i + 1 :]
+    return text[:i] + rng.choice(_ALPHABET) + text[i + 1 :]
+
+
+@click.group()
+def cli() -> None:
+    """実機なしで実行できるベンチマーク。"""
+
+
+@cli.command()
+@click.option("--steps", "n_steps", type=int, default=300, show_default=True, help="ステップ数")
+@click.option("--words", "n_words", type=int, default=300, show_default=True, help="1フレームあたりの OCR 語数")
+@click.option("--min-score", type=float, default=0.8, show_default=True, help="あいまい一致の最低スコア")
+@click.option("--repeat", type=int, default=5, show_default=True, help="計測の繰り返し回数（最小値を採用）")
+@click.option("--seed", type=int, default=0, show_default=True, help="乱数シード")
+def matcher(n_steps: int, n_words: int, min_score: float, repeat: int, seed: int) -> None:
+    """Step 照合の1フレームあたりのコストを計測する。
+
+    1フレーム分の語に対して全ステップを照合する（最悪ケース: 先頭 step 以外も評価）。
+    語の一部はステップ文字列そのもの、一部は1文字を誤認識させたもの、残りは無関係な文字列。
+    """
+    rng = random.Random(seed)
+    steps = [_random_text(rng, 3, 10) for _ in range(n_steps)]
+    texts: list[str] = []
+    for i in range(n_words):
+        r = i % 10
+        if r == 0:
+            texts.append(rng.choice(steps))
+        elif r == 1:
+            texts.append(_garble(rng, rng.choice(steps)))
+        else:
+            texts.append(_random_text(rng, 2, 20))
+    paragraphs = [OcrParagraph(text=t, box=(0, i * 20, 100, i * 20 + 18), score=0.9) for i, t in enumerate(texts)]
+
+    def legacy() -> int:
+        return sum(1 for s in steps if find_matching_paragraph(s, paragraphs) is not None)
+
+    exact = StepMatcher(steps)
+    fuzzy = StepMatcher(steps, min_score=min_score)
+
+    def run(m: StepMatcher) -> Callable[[], int]:
+        def f() -> int:
+            words = m.prepare(paragraphs)
+            return sum(1 for s in steps if m.match(s, words) is not None)
+
+        return f
+
+    click.echo(f"steps={n_steps} words={n_words} min_score={min_score}")
+    click.echo(f"{'方式':<28}{'1フレーム(ms)':>14}{'1step(us)':>12}{'一致数':>8}")
+    for name, fn in (
+        ("find_matching_paragraph", legacy),
+        ("StepMatcher (完全一致)", run(exact)),
+        (f"StepMatcher (スコア>={min_score})", run(fuzzy)),
+    ):
+        sec = _timeit(fn, repeat)
+        click.echo(f"{name:<28}{sec * 1000:>14.2f}{sec / max(1, n_steps) * 1e6:>12.1f}{fn():>8}")
+
+    # 実運用では1フレームあたり先頭 step の照合1回のみ
+    words_once = fuzzy.prepare(paragraphs)
+    prepare_sec = _timeit(lambda: fuzzy.prepare(paragraphs), repeat)
+    match_sec = _timeit(lambda: fuzzy.match(steps[0], words_once), repeat)
+    click.echo(f"実運用相当（prepare + 先頭 step 1回）: {(prepare_sec + match_sec) * 1000:.3f} ms")
+
+
+def _load_frame(image: Path | None, width: int, height: int) -> CapturedFrame:
+    """ベンチマーク用のフレーム。画像未指定なら文字列風の縞模様を合成する。"""
+    if image is not None:
+        if not pillow_available():
+            raise click.UsageError("--image の読み込みには Pillow が必要です（uv add pillow）")
+        from PIL import Image  # type: ignore
+
+        with Image.open(image) as img:
+            rgb = img.convert("RGB")
+            return CapturedFrame(rgb=rgb.tobytes(), width=rgb.width, height=rgb.height)
+
+    return synthetic_frame(width, height)
+
+
+@cli.command()
+@click.option("--image", type=click.Path(path_type=Path, exists=True, dir_okay=False), default=None, help="計測に使う画像（未指定なら合成画像。読み込みには Pillow が必要）")
+@click.option("--width", type=int, default=1280, show_default=True, help="合成画像の幅")
+@click.option("--height", type=int, default=720, show_default=True, help="合成画像の高さ")
+@click.option("--endpoint", default=None, help="OCR API のベースエンドポイント（指定すると各設定で実際に OCR してレイテンシを計測）")
+@click.option("--repeat", type=int, default=5, show_default=True, help="計測の繰り返し回数（エンコードは最小値、OCR は中央値を採用）")
+def encode(image: Path | None, width: int, height: int, endpoint: str | None, repeat: int) -> None:
+    """OCR 送信画像の前処理・エンコード設定ごとに、エンコード時間・送信サイズ・OCR レイテンシを計測する。"""
+    frame = _load_frame(image, width, height)
+    client = OcrClient(endpoint, max_retries=0) if endpoint else None
+    click.echo(f"画像 {frame.width}x{frame.height}" + (f", OCR {endpoint}" if endpoint else ""))
+    click.echo(f"{'設定':<36}{'送信画像':>12}{'エンコード(ms)':>16}{'サイズ(KB)':>12}{'OCR(ms)':>10}{'語数':>6}")
+    try:
+        for options in _ENCODE_PROFILES:
+            if options.format != "png" and not pillow_available():
+                click.echo(f"{options.describe():<36}  (Pillow 未インストールのため省略)")
+                continue
+            encoded = encode_frame(frame, options)
+            sec = _timeit(lambda o=options: encode_frame(frame, o), repeat)
+            ocr_ms, words = "-", "-"
+            if client is not None:
+                latencies: list[float] = []
+                for _ in range(max(1, repeat)):
+                    started = time.perf_counter()
+                    data = client.analyze(encoded.data, filename=encoded.filename, content_type=encoded.content_type)
+                    latencies.append(time.perf_counter() - started)
+                ocr_ms = f"{sorted(latencies)[len(latencies) // 2] * 1000:.0f}"
+                words = str(len(extract_paragraphs(data)))
+            click.echo(f"{options.describe():<36}{f'{encoded.width}x{encoded.height}':>12}{sec * 1000:>16.1f}{len(encoded.data) / 1024:>12.1f}{ocr_ms:>10}{words:>6}")
+    finally:
+        if client is not None:
+            client.close()
+
+
+def _format_seconds(sec: float) -> str:
+    if sec >= 1e-3:
+        return f"{sec * 1e3:.2f} ms"
+    return f"{sec * 1e6:.2f} us"
+
+
+@cli.command()
+@click.option(
+    "--baseline",
+    "baseline_path",
+    type=click.Path(path_type=Path, dir_okay=False),
+    default=Path(__file__).resolve().parent.parent / "benchmarks" / "baseline.json",
+    show_default=True,
+    help="ベースラインの JSON ファイル",
+)
+@click.option("--save", is_flag=True, help="今回の結果をベースラインとして保存する（比較はしない）")
+@click.option("--threshold", type=float, default=0.25, show_default=True, help="ベースラインからこの割合を超えて遅くなったら失敗とする")
+@click.option("-k", "--filter", "name_filter", default=None, help="名前にこの文字列を含むベンチマークだけ実行する")
+@click.option("--repeat", type=int, default=5, show_default=True, help="計測の繰り返し回数（最小値を採用）")
+@click.option("--min-time", type=float, default=0.2, show_default=True, help="1回の計測に最低限かける秒数")
+def suite(baseline_path: Path, save: bool, threshold: float, name_filter: str | None, repeat: int, min_time: float) -> None:
+    """毎フレーム呼ばれる処理のマイクロベンチマークを実行し、ベースラインと比較する。
+
+    ベースラインより ``--threshold`` を超えて遅くなったものがあれば終了コード 1 で終わる。
+    """
+    cases = [c for c in default_cases() if name_filter is None or name_filter in c.name]
+    if not cases:
+        raise click.UsageError(f"該当するベンチマークがありません: {name_filter}")
+
+    baseline: dict[str, float] = {}
+    if not save and baseline_path.exists():
+        base_env, baseline = load_baseline(baseline_path)
+        if base_env != environment():
+            click.echo(f"注意: ベースラインの計測環境が異なります（{base_env} / 現在 {environment()}）", err=True)
+    elif not save:
+        click.echo(f"ベースラインがありません: {baseline_path}（--save で作成）", err=True)
+
+    width = max(len(c.name) for c in cases) + 2
+
+    def report(name: str, sec: float) -> None:
+        base = baseline.get(name)
+        diff = f"{(sec / base - 1) * 100:+7.1f}%" if base else ""
+        click.echo(f"{name:<{width}}{_format_seconds(sec):>12}{diff:>10}")
+
+    results = run_cases(cases, repeat=repeat, min_time=min_time, on_result=report)
+
+    if save:
+        save_baseline(baseline_path, results)
+        click.echo(f"ベースラインを保存しました: {baseline_path}")
+        return
+
+    regressions = find_regressions(results, baseline, threshold)
+    for r in regressions:
+        click.echo(f"遅延: {r.name} {_format_seconds(r.baseline)} -> {_format_seconds(r.current)} ({r.ratio:.2f} 倍)", err=True)
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cli()
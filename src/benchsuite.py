@@ -0,0 +1,348 @@
+"""毎フレーム呼ばれる処理のマイクロベンチマークと、ベースラインとの比較。
+
+実機・ネットワークなしで動く（入力は合成フレームとリポジトリ同梱の OCR 応答例）。
+結果は関数 1 回あたりの秒数で、JSON のベースラインに保存して次回以降と比較する。
+"""
+
+from __future__ import annotations
+
+import copy
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import timeit
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from capture import CapturedFrame, CaptureEngine, SyntheticSource, crop_frame, encode_frame_png
+from change_detect import luminance_grid
+from delta import dirty_tiles
+from encode import EncodeOptions, encode_frame
+from fast_forward import ChoiceClassifier
+from logger import BatchingFileHandler, BatchingStreamHandler, FrameTextFormatter, LogOptions, configure_logger
+from matcher import StepMatcher
+from mosaic import MosaicLayout, Placement, compose, split
+from ocr import OcrParagraph, OcrResultCache, _as_box, extract_paragraphs, find_matching_paragraph
+from ocr_result import parse_ocr_result
+from screen_playbook import BKTree, dhash
+from step_graph import StepCursor, StepGraph
+from template_match import TemplateMatcher
+from utils import normalize_text_for_matching
+from window_backend import FakeBackend, WindowResolver
+
+# OCR 応答例（typical ペイロードの元データ）
+EXAMPLE_RESPONSE = Path(__file__).resolve().parent.parent / "ocr-api-response-example.json"
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    """ベンチマーク1件。``setup()`` が計測対象の引数なし関数を返す。"""
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+
+
+@dataclass(frozen=True)
+class Regression:
+    """ベースラインより遅くなった計測結果。"""
+
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+
+def synthetic_frame(width: int = 1280, height: int = 720) -> CapturedFrame:
+    """文字列風の縞模様とグラデーション背景を持つ合成フレーム。"""
+    rows = []
+    for y in range(height):
+        in_text = (y // 12) % 4 == 1 and height // 3 < y < height * 2 // 3
+        row = bytearray()
+        for x in range(width):
+            v = 30 if in_text and (x * 7 + y) % 11 < 4 else 140 + (x * 80 // max(1, width))
+            row += bytes((v, v, min(255, v + 20)))
+        rows.append(bytes(row))
+    return CapturedFrame(rgb=b"".join(rows), width=width, height=height)
+
+
+def ocr_payload(words: int) -> dict:
+    """OCR 応答例と同じ形で、``words`` 語を含むペイロードを作る。"""
+    example = json.loads(EXAMPLE_RESPONSE.read_text(encoding="utf-8"))
+    page = example["content"][0]
+    base = page["words"]
+    out = []
+    for i in range(words):
+        w = copy.deepcopy(base[i % len(base)])
+        dy = (i // len(base)) * 30
+        w["points"] = [[x, y + dy] for x, y in w["points"]]
+        w["content"] = f"{w['content']}{i}" if i >= len(base) else w["content"]
+        out.append(w)
+    page = dict(page, words=out)
+    return dict(example, content=[page])
+
+
+def default_cases() -> list[BenchCase]:
+    """標準のベンチマーク一覧。"""
+
+    def normalize() -> Callable[[], object]:
+        texts = [w["content"] for w in ocr_payload(6)["content"][0]["words"]] + ["ＡＢＣ１２３　テスト"]
+        return lambda: [normalize_text_for_matching(t) for t in texts]
+
+    def as_box_points() -> Callable[[], object]:
+        pts = [[286, 342], [515, 342], [515, 366], [286, 366]]
+        return lambda: _as_box(pts)
+
+    def as_box_box() -> Callable[[], object]:
+        box = [286, 342, 515, 366]
+        return lambda: _as_box(box)
+
+    def extract(words: int) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            payload = ocr_payload(words)
+            return lambda: extract_paragraphs(payload)
+
+        return setup
+
+    def parse(words: int) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            payload = ocr_payload(words)
+            return lambda: parse_ocr_result(payload)
+
+        return setup
+
+    def words_in() -> Callable[[], object]:
+        result = parse_ocr_result(ocr_payload(2000))
+        # 索引の作成は計測に含めない
+        result.nearest(0, 0)
+        return lambda: result.words_in((200, 300, 700, 800), partial=True)
+
+    def nearest() -> Callable[[], object]:
+        result = parse_ocr_result(ocr_payload(2000))
+        result.nearest(0, 0)
+        return lambda: result.nearest(640, 2400)
+
+    def find_typical() -> Callable[[], object]:
+        paragraphs = extract_paragraphs(ocr_payload(20))
+        # 一致しないステップ（全語を走査する最悪ケース）
+        return lambda: find_matching_paragraph("図書館に行ってみる", paragraphs)
+
+    def matcher_typical() -> Callable[[], object]:
+        paragraphs = extract_paragraphs(ocr_payload(20))
+        m = StepMatcher(["図書館に行ってみる", "大声で驚かす"], min_score=0.8)
+        return lambda: m.match("図書館に行ってみる", m.prepare(paragraphs))
+
+    def cursor_select() -> Callable[[], object]:
+        # 候補 4 つ + 先読み 2 段で、どれにも一致しない（全 step を照合する最悪ケース）
+        paragraphs = extract_paragraphs(ocr_payload(20))
+        graph = StepGraph.from_config([{"any": ["図書館に行ってみる", "大声で驚かす", "家に帰る", "電話をかける"]}, {"optional": "寝る"}, "学校へ行く", "終わる"])
+        m = StepMatcher(graph.texts, min_score=0.8)
+        cursor = StepCursor(graph, lookahead=2)
+        return lambda: cursor.select(m, m.prepare(paragraphs))
+
+    def resolve(cached: bool) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            # 対象ウィンドウが Z オーダーの奥にある（全列挙が最も重い）状況
+            backend = FakeBackend()
+            backend.add_window("彼女たちの流儀", (100, 100, 1380, 820))
+            for i in range(300):
+                backend.add_window(f"window {i}")
+            resolver = WindowResolver(backend, "彼女たちの流儀", logging.getLogger(__name__))
+            if cached:
+                return resolver.resolve
+
+            def uncached() -> object:
+                resolver.invalidate()
+                return resolver.resolve()
+
+            return uncached
+
+        return setup
+
+    def template(hit: bool) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            frame = synthetic_frame()
+            matcher = TemplateMatcher()
+            # 合成フレームの文字列風の行に選択肢があるものとして学習する
+            matcher.learn("図書館に行ってみる", frame, (400, 252, 640, 288))
+            # 不一致側は左右・上下を反転したフレーム（探索範囲をすべて試す最悪ケース）
+            target = frame if hit else CapturedFrame(rgb=frame.rgb[::-1], width=frame.width, height=frame.height)
+            return lambda: matcher.find("図書館に行ってみる", target)
+
+        return setup
+
+    def log_frame(queued: bool) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            # 語の多い画面 1 フレーム分のログ出力で、ループのスレッドが費やす時間
+            paragraphs = extract_paragraphs(ocr_payload(30))
+            console = io.TextIOWrapper(io.FileIO(os.devnull, "w"), encoding="utf-8")
+            logger = logging.getLogger(f"{__name__}.log_frame.{'queued' if queued else 'sync'}")
+            logger.propagate = False
+            if not queued:
+                # 従来の出力: 同期のファイル・コンソール出力に語ごとに1行
+                logger.setLevel(logging.DEBUG)
+                logger.handlers.clear()
+                for h in (logging.FileHandler(os.devnull, encoding="utf-8"), logging.StreamHandler(console)):
+                    h.setFormatter(FrameTextFormatter())
+                    logger.addHandler(h)
+
+                def per_word() -> None:
+                    logger.info("OCR words (%d件):", len(paragraphs))
+                    for p in paragraphs:
+                        logger.info(" - '%s' box=%s", p.text, p.box)
+
+                return per_word
+            fh = BatchingFileHandler(Path(os.devnull))
+            ch = BatchingStreamHandler(console)
+            for h in (fh, ch):
+                h.setFormatter(FrameTextFormatter())
+            configure_logger(logger, [fh, ch], LogOptions())
+
+            def per_frame() -> None:
+                frame = {"seq": 1, "source": "ocr", "words": [{"text": p.text, "box": list(p.box), "score": p.score} for p in paragraphs], "clicked": []}
+                logger.info("OCR words (%d件, %s)%s", len(paragraphs), "ocr", "", extra={"frame": frame})
+
+            return per_frame
+
+        return setup
+
+    def engine_grab() -> Callable[[], object]:
+        # 取得元のコストを除いた、リングバッファへの取り込みとフレーム作成のコスト
+        rgb = synthetic_frame().rgb
+        engine = CaptureEngine(SyntheticSource(lambda seq, width, height: rgb))
+        return lambda: engine.grab(0, 0, 1280, 720)
+
+    def mosaic_compose() -> Callable[[], object]:
+        # 2セッション分の選択肢領域（880x450）を1枚に並べる
+        crop = crop_frame(synthetic_frame(), (200, 150, 1080, 600))
+
+        def run() -> object:
+            layout = MosaicLayout(2048, 2048, 16)
+            layout.add(crop.width, crop.height)
+            layout.add(crop.width, crop.height)
+            return compose([crop, crop], layout)
+
+        return run
+
+    def mosaic_split() -> Callable[[], object]:
+        placements = [Placement(16, 16, 880, 450), Placement(912, 16, 880, 450)]
+        words = [OcrParagraph(text=f"w{i}", box=(20 + (i % 60) * 29, 20 + (i // 60) * 40, 40 + (i % 60) * 29, 40 + (i // 60) * 40), score=0.9) for i in range(200)]
+        return lambda: split(words, placements)
+
+    def delta_tiles() -> Callable[[], object]:
+        # 台詞の1行（1280x40）だけが変わったフレーム
+        prev = bytes(synthetic_frame().rgb)
+        cur = bytearray(prev)
+        for y in range(600, 640):
+            cur[y * 3840 : (y + 1) * 3840] = bytes(3840)
+        cur_bytes = bytes(cur)
+        return lambda: dirty_tiles(prev, cur_bytes, 1280, 720, 64)
+
+    def bktree_search() -> Callable[[], object]:
+        # 1000 画面分の記録から、距離 10 以内を探す
+        rng = random.Random(0)
+        tree = BKTree()
+        keys = [rng.getrandbits(256) for _ in range(1000)]
+        for i, k in enumerate(keys):
+            tree.add(k, i)
+        probe = keys[500] ^ 0b1011
+        return lambda: tree.search(probe, 10)
+
+    def frame_case(fn: Callable[[CapturedFrame], object]) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            frame = synthetic_frame()
+            return lambda: fn(frame)
+
+        return setup
+
+    return [
+        BenchCase("utils.normalize_text_for_matching", normalize),
+        BenchCase("ocr._as_box[points]", as_box_points),
+        BenchCase("ocr._as_box[box]", as_box_box),
+        BenchCase("ocr.extract_paragraphs[small]", extract(1)),
+        BenchCase("ocr.extract_paragraphs[typical]", extract(6)),
+        BenchCase("ocr.extract_paragraphs[huge]", extract(2000)),
+        BenchCase("ocr_result.parse_ocr_result[typical]", parse(6)),
+        BenchCase("ocr_result.parse_ocr_result[huge]", parse(2000)),
+        BenchCase("ocr_result.OcrResult.words_in[huge]", words_in),
+        BenchCase("ocr_result.OcrResult.nearest[huge]", nearest),
+        BenchCase("ocr.find_matching_paragraph[typical]", find_typical),
+        BenchCase("matcher.StepMatcher[typical]", matcher_typical),
+        BenchCase("step_graph.StepCursor.select[miss]", cursor_select),
+        BenchCase("logger.frame[sync per word]", log_frame(False)),
+        BenchCase("logger.frame[queued]", log_frame(True)),
+        BenchCase("window_backend.WindowResolver.resolve[cached]", resolve(True)),
+        BenchCase("window_backend.WindowResolver.resolve[enumerate]", resolve(False)),
+        BenchCase("template_match.TemplateMatcher.find[hit]", template(True)),
+        BenchCase("template_match.TemplateMatcher.find[miss]", template(False)),
+        BenchCase("capture.CaptureEngine.grab[1280x720 synthetic]", engine_grab),
+        BenchCase("delta.dirty_tiles[1280x720 one line]", delta_tiles),
+        BenchCase("screen_playbook.dhash[1280x720 256bit]", frame_case(lambda f: dhash(f, 16))),
+        BenchCase("screen_playbook.BKTree.search[1000 r=10]", bktree_search),
+        BenchCase("mosaic.compose[2x880x450]", mosaic_compose),
+        BenchCase("mosaic.split[200 words]", mosaic_split),
+        BenchCase("capture.encode_frame_png[1280x720]", frame_case(encode_frame_png)),
+        BenchCase("capture.crop_frame[1280x720]", frame_case(lambda f: crop_frame(f, (200, 150, 1080, 600)))),
+        BenchCase("encode.encode_frame[gray x0.5]", frame_case(lambda f: encode_frame(f, EncodeOptions(grayscale=True, scale=0.5)))),
+        BenchCase("change_detect.luminance_grid[1280x720]", frame_case(luminance_grid)),
+        BenchCase("fast_forward.ChoiceClassifier.is_choice[1280x720]", frame_case(ChoiceClassifier().is_choice)),
+        BenchCase("ocr.OcrResultCache.key_for[1280x720]", frame_case(lambda f: OcrResultCache.key_for(f.rgb, f.size))),
+    ]
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> float:
+    """1回あたりの実行秒数を返す。
+
+    ``min_time`` 秒以上かかるループ回数を決めてから ``repeat`` 回計測し、最小値を採る
+    （最小値は他プロセスの割り込みなどのノイズの影響を最も受けにくい）。
+    """
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=max(1, repeat), number=number)) / number
+
+
+def run_cases(cases: list[BenchCase], repeat: int = 5, min_time: float = 0.2, on_result: Callable[[str, float], None] | None = None) -> dict[str, float]:
+    """ベンチマークを順に実行し、名前 → 1回あたりの秒数を返す。"""
+    results: dict[str, float] = {}
+    for case in cases:
+        sec = measure(case.setup(), repeat, min_time)
+        results[case.name] = sec
+        if on_result is not None:
+            on_result(case.name, sec)
+    return results
+
+
+def environment() -> dict[str, str]:
+    """計測環境（ベースラインと比較する際の注意喚起に使う）。"""
+    return {"python": sys.version.split()[0], "implementation": platform.python_implementation(), "machine": platform.machine(), "system": platform.system()}
+
+
+def save_baseline(path: Path, results: dict[str, float]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"environment": environment(), "results": results}
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def load_baseline(path: Path) -> tuple[dict[str, str], dict[str, float]]:
+    """ベースラインを読み込み、(計測環境, 結果) を返す。"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return dict(data.get("environment") or {}), {str(k): float(v) for k, v in (data.get("results") or {}).items()}
+
+
+def find_regressions(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[Regression]:
+    """ベースラインより ``threshold``（0.25 なら 25%）を超えて遅くなったものを返す。"""
+    out: list[Regression] = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is not None and current > base * (1.0 + threshold):
+            out.append(Regression(name=name, baseline=base, current=current))
+    return out
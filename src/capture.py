@@ -1,13 +1,292 @@
-"""ウィンドウ領域のキャプチャ保存。"""
+"""ウィンドウ領域のキャプチャと保存。
+
+キャプチャは常駐の :class:`CaptureEngine` が行う。取得元（既定は mss）を開いたままにし、
+画素は事前に確保したリングバッファのスロットへ直接書き込む。各フレームはスロットを指す
+読み取り専用の ``memoryview`` として渡すため、変化判定・切り出し・エンコードが同じ
+フレームをコピーせずに参照できる。スロットは ``slots`` 枚先のキャプチャで上書きされる
+ため、それより長く持つフレームは :meth:`CapturedFrame.detach` でコピーしておく。
+"""
 
 from __future__ import annotations
 
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, replace
 from pathlib import Path
-
-from mss import mss, tools
+from typing import Any, Protocol
 
 from utils import timestamp_for_filename
 
+# 保持枚数の管理対象にする保存画像の拡張子
+_ARCHIVE_SUFFIXES = (".png", ".jpg", ".webp")
+
+# リングバッファのスロット数の既定値（パイプラインで同時に使われるフレーム数より十分多く）
+DEFAULT_RING_SLOTS = 8
+
+
+@dataclass(frozen=True)
+class CapturedFrame:
+    """キャプチャしたフレーム（RGB 24bit, 行優先）。
+
+    Attributes:
+        rgb: 画素。:class:`CaptureEngine` が返すフレームはリングバッファを指す ``memoryview``。
+        width: 幅。
+        height: 高さ。
+        seq: キャプチャ連番（エンジン外で作ったフレームは 0）。
+        timestamp: キャプチャ時刻（``time.monotonic()``。エンジン外で作ったフレームは 0）。
+    """
+
+    rgb: bytes | memoryview
+    width: int
+    height: int
+    seq: int = 0
+    timestamp: float = 0.0
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    def detach(self) -> CapturedFrame:
+        """リングバッファから切り離したコピー（上書きされた後も使い続ける場合に使う）。"""
+        if isinstance(self.rgb, bytes):
+            return self
+        return replace(self, rgb=bytes(self.rgb))
+
+
+class FrameSource(Protocol):
+    """:class:`CaptureEngine` の取得元。"""
+
+    def grab_into(self, left: int, top: int, width: int, height: int, out: bytearray) -> tuple[int, int]:
+        """指定領域の RGB 画素を ``out`` の先頭へ書き込み、実際の (幅, 高さ) を返す。
+
+        ``out`` は ``width * height * 3`` バイト以上ある。
+        """
+        ...
+
+    def close(self) -> None:
+        """取得元を閉じる。"""
+        ...
+
+
+class MssSource:
+    """mss による画面キャプチャ（初回の取得時に mss を読み込んで開き、以後は使い回す）。"""
+
+    def __init__(self) -> None:
+        self._sct: Any = None
+        self._lock = threading.Lock()
+
+    def grab_into(self, left: int, top: int, width: int, height: int, out: bytearray) -> tuple[int, int]:
+        with self._lock:
+            if self._sct is None:
+                # 遅延インポート（起動時は並行して準備する: :func:`warm_up_capture`）
+                from mss import mss
+
+                self._sct = mss()
+            img = self._sct.grab({"left": left, "top": top, "width": width, "height": height})
+        w, h = img.width, img.height
+        n = w * h * 3
+        # BGRA を RGB へ並べ替えながらスロットへ直接書き込む（中間の RGB バイト列を作らない）
+        raw = img.raw
+        out[0:n:3] = raw[2::4]
+        out[1:n:3] = raw[1::4]
+        out[2:n:3] = raw[0::4]
+        return w, h
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sct is not None:
+                self._sct.close()
+                self._sct = None
+
+
+class SyntheticSource:
+    """合成フレームを返す取得元（実機・画面なしでのテスト・ベンチマーク用）。
+
+    Args:
+        render: 任意。``(seq, width, height)`` から RGB 画素を作る関数。未指定なら
+            呼び出しごとに明るさが変わる縞模様。
+    """
+
+    def __init__(self, render: Callable[[int, int, int], bytes] | None = None) -> None:
+        self.render = render or _stripes
+        self.calls = 0
+
+    def grab_into(self, left: int, top: int, width: int, height: int, out: bytearray) -> tuple[int, int]:
+        self.calls += 1
+        rgb = self.render(self.calls, width, height)
+        out[: len(rgb)] = rgb
+        return width, height
+
+    def close(self) -> None:
+        pass
+
+
+def _stripes(seq: int, width: int, height: int) -> bytes:
+    row = bytes((seq * 16 + x // 8 * 32) % 256 for x in range(width) for _ in range(3))
+    return row * height
+
+
+@dataclass
+class EngineStats:
+    """:class:`CaptureEngine` の集計値。"""
+
+    frames: int = 0
+    allocations: int = 0
+
+
+class CaptureEngine:
+    """取得元を開いたまま、フレームをリングバッファへ取り込む（スレッドセーフ）。
+
+    Args:
+        source: 任意。取得元。未指定なら :class:`MssSource`。
+        slots: リングバッファのスロット数。
+    """
+
+    def __init__(self, source: FrameSource | None = None, slots: int = DEFAULT_RING_SLOTS) -> None:
+        self.source = source if source is not None else MssSource()
+        self.stats = EngineStats()
+        self._lock = threading.Lock()
+        self._slots: list[bytearray] = [bytearray() for _ in range(max(2, slots))]
+        self._slot_seq = [0] * len(self._slots)
+        self._seq = 0
+
+    def grab(self, left: int, top: int, width: int, height: int) -> CapturedFrame:
+        """指定領域をキャプチャし、リングバッファを指すフレームを返す。"""
+        width, height = max(1, int(width)), max(1, int(height))
+        with self._lock:
+            self._seq += 1
+            index = self._seq % len(self._slots)
+            slot = self._slots[index]
+            need = width * height * 3
+            if len(slot) < need:
+                # 取り出し済みのフレームが参照していても大きさは変えられないため、新しく確保して差し替える
+                slot = self._slots[index] = bytearray(need)
+                self.stats.allocations += 1
+            w, h = self.source.grab_into(int(left), int(top), width, height, slot)
+            self._slot_seq[index] = self._seq
+            self.stats.frames += 1
+            return CapturedFrame(rgb=memoryview(slot)[: w * h * 3].toreadonly(), width=w, height=h, seq=self._seq, timestamp=time.monotonic())
+
+    def is_live(self, frame: CapturedFrame) -> bool:
+        """``frame`` の画素がまだ上書きされていないか（エンジン外のフレームは常に True）。"""
+        if isinstance(frame.rgb, bytes) or frame.seq == 0:
+            return True
+        with self._lock:
+            return self._slot_seq[frame.seq % len(self._slots)] == frame.seq
+
+    def copy_if_live(self, frame: CapturedFrame) -> CapturedFrame | None:
+        """``frame`` の画素をコピーし、コピーし終えるまで上書きされていなければそのコピーを返す。
+
+        :meth:`is_live` で確かめてから画素を使うと、その間に別のスレッドのキャプチャで
+        スロットが上書きされることがあるため、先にコピーしてから確かめる。上書きされていたら None。
+        """
+        copy = frame.detach()
+        return copy if self.is_live(frame) else None
+
+    def warm_up(self) -> None:
+        """取得元の準備（mss の読み込み・初期化と 1 ピクセルの試し撮り）を済ませる。"""
+        self.grab(0, 0, 1, 1)
+
+    def close(self) -> None:
+        self.source.close()
+
+
+_DEFAULT_ENGINE: CaptureEngine | None = None
+_DEFAULT_ENGINE_LOCK = threading.Lock()
+
+
+def default_engine() -> CaptureEngine:
+    """プロセスで共有する既定のキャプチャエンジン（mss）。"""
+    global _DEFAULT_ENGINE
+    with _DEFAULT_ENGINE_LOCK:
+        if _DEFAULT_ENGINE is None:
+            _DEFAULT_ENGINE = CaptureEngine()
+        return _DEFAULT_ENGINE
+
+
+def warm_up_capture() -> None:
+    """既定のキャプチャエンジンの準備を済ませる。"""
+    default_engine().warm_up()
+
+
+def grab_window_region(
+    left: int,
+    top: int,
+    width: int,
+    height: int,
+    *,
+    keep_height: int | None = None,
+    engine: CaptureEngine | None = None,
+) -> CapturedFrame:
+    """指定領域をキャプチャしてメモリ上のフレームとして返す。
+
+    Args:
+        left: スクリーン座標の左上X。
+        top: スクリーン座標の左上Y。
+        width: 幅。
+        height: 高さ。
+        keep_height: 任意。上部からこのピクセル数だけを残す。
+            未指定または 1 未満の場合は全体。
+        engine: 任意。使うキャプチャエンジン。未指定なら :func:`default_engine`。
+
+    Returns:
+        キャプチャしたフレーム（エンジンのリングバッファを指す）。
+    """
+    # 高さの制限（上部のみ使用）
+    effective_height = int(height)
+    if keep_height is not None and keep_height > 0:
+        effective_height = max(1, min(int(height), int(keep_height)))
+
+    return (engine if engine is not None else default_engine()).grab(int(left), int(top), int(width), effective_height)
+
+
+def crop_frame(frame: CapturedFrame, box: tuple[int, int, int, int]) -> CapturedFrame:
+    """フレームから ``box``（x1, y1, x2, y2。フレーム内座標）の範囲を切り出す。
+
+    ``box`` はフレームの範囲内に収めてから切り出す。
+    """
+    x1 = max(0, min(frame.width, box[0]))
+    y1 = max(0, min(frame.height, box[1]))
+    x2 = max(x1, min(frame.width, box[2]))
+    y2 = max(y1, min(frame.height, box[3]))
+    if (x1, y1, x2, y2) == (0, 0, frame.width, frame.height):
+        return frame
+
+    stride = frame.width * 3
+    rgb = frame.rgb
+    rows = [rgb[y * stride + x1 * 3 : y * stride + x2 * 3] for y in range(y1, y2)]
+    return CapturedFrame(rgb=b"".join(rows), width=x2 - x1, height=y2 - y1)
+
+
+def encode_frame_png(frame: CapturedFrame) -> bytes:
+    """フレームをメモリ上で PNG にエンコードする。"""
+    from mss import tools
+
+    return tools.to_png(frame.rgb, frame.size)
+
+
+def save_frame_png(base_dir: Path, frame: CapturedFrame) -> Path:
+    """フレームを ``capture/`` にPNG保存する。
+
+    Args:
+        base_dir: プロジェクトルート。
+        frame: 保存するフレーム。
+
+    Returns:
+        保存した画像のパス。
+    """
+    cap_dir = base_dir / "capture"
+    cap_dir.mkdir(parents=True, exist_ok=True)
+
+    ts = timestamp_for_filename()
+    out_path = cap_dir / f"{ts}.png"
+    out_path.write_bytes(encode_frame_png(frame))
+    return out_path
+
 
 def capture_window_region(
     base_dir: Path,
@@ -32,26 +311,81 @@ def capture_window_region(
     Returns:
         保存した画像のパス。
     """
-    cap_dir = base_dir / "capture"
-    cap_dir.mkdir(parents=True, exist_ok=True)
+    frame = grab_window_region(left, top, width, height, keep_height=keep_height)
+    return save_frame_png(base_dir, frame)
 
-    ts = timestamp_for_filename()
-    out_path = cap_dir / f"{ts}.png"
 
-    # 高さの制限（上部のみ使用）
-    effective_height = int(height)
-    if keep_height is not None and keep_height > 0:
-        effective_height = max(1, min(int(height), int(keep_height)))
+class CaptureArchiver:
+    """エンコード済み画像をバックグラウンドスレッドで ``capture/`` に保存する。
 
-    region = {
-        "left": int(left),
-        "top": int(top),
-        "width": int(width),
-        "height": effective_height,
-    }
-    with mss() as sct:
-        img = sct.grab(region)
-        png_bytes = tools.to_png(img.rgb, img.size)
-        out_path.write_bytes(png_bytes)
+    ループ側は :meth:`submit` でキューに積むだけで、ディスク書き込みを待たない。
+    キューが満杯の場合はそのフレームの保存を諦める（ループを止めないことを優先）。
+    保存枚数が ``retention`` を超えたら古いファイルから削除する。
 
-    return out_path
+    Args:
+        base_dir: プロジェクトルート。
+        retention: ``capture/`` に残す最大枚数。0 以下で無制限。
+        logger: ロガー。
+        max_pending: 書き込み待ちキューの上限。
+        subdir: 任意。``capture/`` 配下のサブディレクトリ名（複数セッション実行時のセッション名）。
+    """
+
+    def __init__(self, base_dir: Path, retention: int, logger: logging.Logger, max_pending: int = 16, subdir: str | None = None) -> None:
+        self.cap_dir = base_dir / "capture" / subdir if subdir else base_dir / "capture"
+        self.retention = retention
+        self.logger = logger
+        self.dropped = 0
+        self._seq = 0
+        self._queue: queue.Queue[tuple[bytes, str] | None] = queue.Queue(maxsize=max_pending)
+        self._saved: deque[Path] = deque()
+        self._thread = threading.Thread(target=self._run, name="capture-archiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: bytes, suffix: str = ".png") -> None:
+        """保存を依頼する（ブロックしない）。
+
+        Args:
+            image: エンコード済み画像。
+            suffix: ファイルの拡張子（``.png`` / ``.jpg`` など）。
+        """
+        try:
+            self._queue.put_nowait((image, suffix))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """キューに残ったフレームを書き出してスレッドを終了する。"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        self.cap_dir.mkdir(parents=True, exist_ok=True)
+        # 既存ファイルも保持枚数の対象にする（名前順 = 時刻順）
+        self._saved.extend(sorted(p for p in self.cap_dir.iterdir() if p.suffix in _ARCHIVE_SUFFIXES))
+        self._enforce_retention()
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            image, suffix = item
+            # 同一秒内の上書きを避けるため連番を付与
+            self._seq += 1
+            out_path = self.cap_dir / f"{timestamp_for_filename()}-{self._seq:06d}{suffix}"
+            try:
+                out_path.write_bytes(image)
+            except OSError as e:
+                self.logger.warning("キャプチャ保存に失敗: %s (%s)", out_path, e)
+                continue
+            self._saved.append(out_path)
+            self._enforce_retention()
+
+    def _enforce_retention(self) -> None:
+        if self.retention <= 0:
+            return
+        while len(self._saved) > self.retention:
+            old = self._saved.popleft()
+            try:
+                old.unlink(missing_ok=True)
+            except OSError as e:
+                self.logger.warning("古いキャプチャの削除に失敗: %s (%s)", old, e)
@@ -0,0 +1,108 @@
+"""フレーム変化検出。
+
+前回キャプチャの縮小輝度グリッドを保持し、新しいフレームとの差分が
+しきい値以下なら「画面に変化なし」とみなして OCR を省略できるようにする。
+"""
+
+from __future__ import annotations
+
+from capture import CapturedFrame
+
+# 輝度グリッドの 1 辺のセル数と、1 セルあたりの 1 辺のサンプル数
+DEFAULT_GRID = 32
+_SAMPLES_PER_CELL = 4
+
+
+def luminance_grid(frame: CapturedFrame, grid: int = DEFAULT_GRID) -> list[int]:
+    """フレームを ``grid x grid`` の輝度グリッド（0..255）に縮小する。
+
+    全画素を走査すると Python では重いため、各セル内を格子状に
+    間引きサンプリングした平均輝度（ITU-R BT.601 の整数近似）を使う。
+
+    Args:
+        frame: RGB フレーム。
+        grid: グリッドの 1 辺のセル数。
+
+    Returns:
+        行優先で並べた ``grid * grid`` 個の輝度値。
+    """
+    width, height, rgb = frame.width, frame.height, frame.rgb
+    if width <= 0 or height <= 0:
+        return [0] * (grid * grid)
+
+    stride = width * 3
+    # セル内のサンプル位置（画素座標）を事前計算
+    samples = grid * _SAMPLES_PER_CELL
+    xs = [(i * 2 + 1) * width // (samples * 2) for i in range(samples)]
+    ys = [(i * 2 + 1) * height // (samples * 2) for i in range(samples)]
+
+    out: list[int] = []
+    n = _SAMPLES_PER_CELL * _SAMPLES_PER_CELL
+    for cy in range(grid):
+        rows = [ys[cy * _SAMPLES_PER_CELL + sy] * stride for sy in range(_SAMPLES_PER_CELL)]
+        for cx in range(grid):
+            total = 0
+            for sx in range(_SAMPLES_PER_CELL):
+                col = xs[cx * _SAMPLES_PER_CELL + sx] * 3
+                for row in rows:
+                    i = row + col
+                    total += 77 * rgb[i] + 150 * rgb[i + 1] + 29 * rgb[i + 2]
+            out.append((total >> 8) // n)
+    return out
+
+
+def grid_distance(a: list[int], b: list[int]) -> float:
+    """2つの輝度グリッドの平均絶対差（0..255）を返す。"""
+    if len(a) != len(b) or not a:
+        return 255.0
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+class FrameChangeDetector:
+    """直前フレームとの比較で画面変化を判定する。
+
+    Args:
+        threshold: 平均絶対輝度差（0..255）がこの値以下なら「変化なし」。
+            負値を指定すると常に「変化あり」を返す（無効化）。
+        grid: 輝度グリッドの 1 辺のセル数。
+    """
+
+    def __init__(self, threshold: float, grid: int = DEFAULT_GRID) -> None:
+        self.threshold = threshold
+        self.grid = grid
+        self.last_distance: float | None = None
+        self._prev: list[int] | None = None
+        self._prev_size: tuple[int, int] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold >= 0
+
+    def reset(self) -> None:
+        """保持している直前フレームを破棄し、次回は必ず「変化あり」とする。"""
+        self._prev = None
+        self._prev_size = None
+        self.last_distance = None
+
+    def is_changed(self, frame: CapturedFrame) -> bool:
+        """``frame`` が基準フレームから変化したかを判定する。
+
+        「変化あり」と判定したときのみ基準フレームを更新する。
+        基準を毎回更新しないことで、ゆっくりしたフェード等の累積変化も検出できる。
+        """
+        if not self.enabled:
+            return True
+
+        sig = luminance_grid(frame, self.grid)
+        size = (frame.width, frame.height)
+        if self._prev is None or self._prev_size != size:
+            changed = True
+            self.last_distance = None
+        else:
+            self.last_distance = grid_distance(self._prev, sig)
+            changed = self.last_distance > self.threshold
+
+        if changed:
+            self._prev = sig
+            self._prev_size = size
+        return changed
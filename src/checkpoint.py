@@ -0,0 +1,118 @@
+"""異常終了後に途中の step から再開するためのチェックポイント。
+
+クリックに成功するたびに、step グラフ上の現在位置（フロンティア）を JSON ファイルへ
+原子的に（一時ファイルへ書いて fsync してから置き換えて）保存する。再起動時に同じ
+ウィンドウタイトル・同じ step グラフのチェックポイントがあれば、その位置から再開し、
+既に進めた部分の照合とクリックを省く。全 step が完了したらファイルを消す。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from step_graph import StepCursor, StepGraph
+
+CHECKPOINT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """保存した進行状況。
+
+    Attributes:
+        signature: 保存時の step グラフの構造のハッシュ（設定が変わっていたら使わない）。
+        frontier: 次に一致しうる節点の番号。
+        steps_done: 保存時までにクリックした step の数（再開前の分を含む）。
+        last_step: 最後にクリックした step の文字列。
+        saved_at: 保存時刻（UNIX 時刻）。
+    """
+
+    signature: str
+    frontier: tuple[int, ...]
+    steps_done: int
+    last_step: str | None
+    saved_at: float
+
+
+class CheckpointStore:
+    """チェックポイントファイルの読み書き（スレッドセーフ）。
+
+    Args:
+        path: 保存先の JSON ファイル。
+        logger: ロガー。
+    """
+
+    def __init__(self, path: Path, logger: logging.Logger | None = None) -> None:
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def load(self, graph: StepGraph) -> Checkpoint | None:
+        """``graph`` に対応するチェックポイントを読む。無い・壊れている・設定が変わった場合は None。"""
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning("チェックポイントの読み込みに失敗: %s (%s)", self.path, e)
+            return None
+        try:
+            if int(raw["version"]) != CHECKPOINT_VERSION:
+                return None
+            checkpoint = Checkpoint(
+                signature=str(raw["signature"]),
+                frontier=tuple(int(i) for i in raw["frontier"]),
+                steps_done=int(raw["steps_done"]),
+                last_step=None if raw.get("last_step") is None else str(raw["last_step"]),
+                saved_at=float(raw.get("saved_at", 0.0)),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning("チェックポイントの読み込みに失敗: %s (%s)", self.path, e)
+            return None
+        if checkpoint.signature != graph.signature:
+            self.logger.info("steps の設定が変わったためチェックポイントを使いません: %s", self.path)
+            return None
+        return checkpoint
+
+    def save(self, cursor: StepCursor, steps_done: int, last_step: str | None) -> None:
+        """現在位置を保存する（失敗しても自動操作は続ける）。"""
+        payload = {
+            "version": CHECKPOINT_VERSION,
+            "signature": cursor.graph.signature,
+            "frontier": sorted(cursor.frontier),
+            "steps_done": steps_done,
+            "last_step": last_step,
+            "saved_at": time.time(),
+        }
+        tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with tmp.open("w", encoding="utf-8") as f:
+                    json.dump(payload, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                tmp.replace(self.path)
+            except OSError as e:
+                self.logger.warning("チェックポイントの保存に失敗: %s (%s)", self.path, e)
+
+    def clear(self) -> None:
+        """チェックポイントを消す（全 step の完了時・やり直し時）。"""
+        with self._lock:
+            try:
+                self.path.unlink(missing_ok=True)
+            except OSError as e:
+                self.logger.warning("チェックポイントの削除に失敗: %s (%s)", self.path, e)
+
+
+def checkpoint_path(base_dir: Path, title: str, session_name: str | None = None) -> Path:
+    """ウィンドウタイトル（とセッション名）ごとの保存先（``cache/checkpoints/``）。"""
+    key = title if session_name is None else f"{session_name}\0{title}"
+    return base_dir / "cache" / "checkpoints" / f"{hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()}.json"
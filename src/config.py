@@ -2,10 +2,12 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
-import yaml
+from encode import IMAGE_FORMATS, pillow_available
+from fast_forward import parse_action
+from step_graph import StepGraph
 
 
 @dataclass(frozen=True)
@@ -14,11 +16,77 @@ class AppConfig:
 
     Attributes:
         title: 部分一致で探す対象ウィンドウのタイトル。
-        interval: キャプチャ間隔（秒）。デフォルト5秒。
-        steps: クリック対象となる文字列の配列（順番に処理）。
+        interval: キャプチャ間隔の上限（秒）。デフォルト5秒。
+        steps: クリック対象となる文字列の配列（記述順。分岐・候補を含む場合も全 step を並べたもの）。
         ocr_api_endpoint: OCR API のベースエンドポイント（例: ``http://deep01.local:3200``）。
+            複数指定した場合は先頭のもの。
         capture_keep_height: 任意。ウィンドウ上部からこのピクセル数だけを残して
             キャプチャ・OCR 対象にする。未指定または 1 未満なら無効（全体）。
+        change_threshold: 前回 OCR したフレームとの平均輝度差（0..255）がこの値以下なら
+            画面変化なしとみなし、OCR を省略して前回結果を再利用する。負値で無効。
+        capture_archive: OCR に送ったフレームを ``capture/`` に保存するか。
+            保存はバックグラウンドで行い、OCR 送信はメモリ上の画像で直接行う。
+        capture_retention: ``capture/`` に残す最大枚数。0 以下で無制限。
+        ocr_connect_timeout: OCR API への接続タイムアウト秒。
+        ocr_read_timeout: OCR API の応答待ちタイムアウト秒。
+        ocr_max_retries: OCR リクエスト失敗時の最大リトライ回数。
+        ocr_cache_size: OCR 結果キャッシュ（メモリ LRU）の最大件数。0 以下で無効。
+        ocr_cache_persist: OCR 結果キャッシュを ``cache/ocr/`` にも保存し、再起動後も使うか。
+        pipeline: キャプチャ・OCR・判定を別スレッドで重ねて実行するか。
+        min_interval: キャプチャ間隔の下限（秒）。クリック直後や画面変化中のポーリング間隔。
+        backoff_factor: 静止画面が続くときにキャプチャ間隔を伸ばす倍率。
+        settle_frames: 何回連続で静止したら画面が落ち着いたとみなして OCR するか。
+        max_ocr_rate: OCR 送信の上限（回/秒）。0 以下で無制限。
+        ocr_api_endpoints: OCR API のベースエンドポイント一覧（``ocr_api_endpoint`` を含む）。
+        ocr_hedge: 応答の遅いエンドポイントへの送信を別エンドポイントにも重ねて送るか。
+        ocr_health_interval: 複数エンドポイント時のヘルスチェック間隔（秒）。
+        match_min_score: あいまい一致を採用する最低スコア（0..1、1.0 で完全な部分一致のみ）。
+        match_min_rec_score: 照合対象とする語の最低認識スコア。
+        match_ignore_top: 照合対象から外す画像上端の高さ（ピクセル）。
+        capture_regions: OCR する固定領域（キャプチャ画像内の x1, y1, x2, y2）の一覧。
+        roi_learn: 一致した語の位置から OCR 領域を学習するか。
+        roi_warmup: 学習した領域を使い始めるまでの一致回数。
+        roi_margin: 学習した語の矩形を広げるピクセル数。
+        roi_full_every: 領域使用時に全体を OCR する周期（キャプチャ回数、0 で無効）。
+        ocr_image_format: OCR 送信画像の形式（png / jpeg / webp）。
+        ocr_grayscale: OCR 送信画像をグレースケール化するか。
+        ocr_scale: OCR 送信画像の縮小倍率（0 より大きく 1 以下）。
+        ocr_binarize: OCR 送信画像の2値化しきい値（0..255、None で無効）。
+        ocr_contrast_stretch: OCR 送信画像のコントラストを伸長するか。
+        ocr_png_level: PNG の圧縮レベル（0..9）。
+        ocr_quality: JPEG / WebP の品質（1..100）。
+        capture_format: ``capture/`` への保存形式（archive: セッションアーカイブ / files: 1枚1ファイル）。
+        capture_rotate_mb: セッションアーカイブ1ファイルの上限サイズ（MB、0 以下で無制限）。
+        capture_archive_keep: ``capture/`` に残すセッションアーカイブの最大個数。0 以下で無制限。
+        template_match: 一度 OCR で一致した選択肢の画像パッチで、以後のフレームを OCR なしで判定するか。
+        template_threshold: パッチが一致したとみなす正規化相互相関の下限（0..1）。
+        template_radius: パッチを探す元の位置からの範囲（ピクセル）。
+        template_persist: パッチを ``cache/templates/`` に保存し、再起動後・周回時にも使うか
+            （``ocr_cache_persist`` とは独立）。
+        step_graph: ``steps`` をコンパイルした step グラフ（分岐・省略可能な step・候補を含む）。
+            None なら ``steps`` を順番どおりに処理する。
+        step_lookahead: 現在の step が見つからないとき、その先の step を何個まで先読みして照合するか。
+        max_clicks_per_frame: 1フレームの OCR 結果で進めてよい step の上限（クリック回数）。
+        fast_forward: 選択肢が出ていそうにない画面では OCR せずに会話を送るか。
+        fast_forward_interval: 早送り中の送り操作の間隔（秒）。
+        fast_forward_action: 送り操作（``click`` またはキー名）。
+        fast_forward_click: 送りのクリック位置（キャプチャ画像内の x, y。None なら下端付近の中央）。
+        fast_forward_region: 選択肢が出る縦方向の範囲（画面の高さに対する割合の上端, 下端）。
+        fast_forward_max_static: 送り操作をしても画面が変わらないことがこの回数続いたら、早送りをやめて OCR する。
+        fast_forward_ocr_every: 早送りの送り操作がこの回数続いたら、確認のため OCR する（0 で行わない）。
+        checkpoint: クリックごとに進行状況を保存し、再起動時にその位置から再開するか。
+        ocr_mosaic: 同時に OCR 待ちになった画像（複数の固定領域・複数セッションのフレーム）を
+            1枚のモザイク画像にまとめて OCR するか。
+        ocr_mosaic_delay: モザイクに加える画像を待つ最大秒数。
+        ocr_mosaic_size: モザイク画像の (幅, 高さ) の上限。
+        ocr_mosaic_padding: モザイク内の画像どうしの余白（ピクセル）。
+        ocr_delta: 前回 OCR したフレームから変化したタイルだけを OCR し直すか（差分 OCR）。
+        ocr_delta_tile: 差分 OCR のタイルの1辺（ピクセル）。
+        ocr_delta_max_ratio: 変化した範囲がフレームに対してこの割合を超えたら全体を OCR する。
+        ocr_delta_full_every: 差分 OCR をこの回数続けたら全体を OCR する（0 で行わない）。
+        playbook: クリックした画面のフィンガープリントを記録し、以後は記録済みの画面を OCR せずにクリックするか。
+        playbook_threshold: 記録済みの画面とみなすフィンガープリント（256 bit）のハミング距離の上限。
+        playbook_verify_rate: 記録済みの画面に一致したフレームを、確認のため OCR する割合（0..1）。
     """
 
     title: str
@@ -26,6 +94,71 @@ class AppConfig:
     steps: list[str]
     ocr_api_endpoint: str
     capture_keep_height: int | None
+    change_threshold: float = 1.0
+    capture_archive: bool = True
+    capture_retention: int = 1000
+    ocr_connect_timeout: float = 3.0
+    ocr_read_timeout: float = 30.0
+    ocr_max_retries: int = 2
+    ocr_cache_size: int = 256
+    ocr_cache_persist: bool = False
+    pipeline: bool = False
+    min_interval: float = 0.3
+    backoff_factor: float = 2.0
+    settle_frames: int = 2
+    max_ocr_rate: float = 2.0
+    ocr_api_endpoints: list[str] = field(default_factory=list)
+    ocr_hedge: bool = False
+    ocr_health_interval: float = 10.0
+    match_min_score: float = 1.0
+    match_min_rec_score: float = 0.0
+    match_ignore_top: int = 0
+    capture_regions: list[tuple[int, int, int, int]] = field(default_factory=list)
+    roi_learn: bool = False
+    roi_warmup: int = 3
+    roi_margin: int = 16
+    roi_full_every: int = 10
+    ocr_image_format: str = "png"
+    ocr_grayscale: bool = False
+    ocr_scale: float = 1.0
+    ocr_binarize: int | None = None
+    ocr_contrast_stretch: bool = False
+    ocr_png_level: int = 6
+    ocr_quality: int = 85
+    capture_format: str = "archive"
+    capture_rotate_mb: float = 256.0
+    capture_archive_keep: int = 8
+    template_match: bool = False
+    template_threshold: float = 0.95
+    template_radius: int = 8
+    template_persist: bool = True
+    step_graph: StepGraph | None = None
+    step_lookahead: int = 0
+    max_clicks_per_frame: int = 1
+    fast_forward: bool = False
+    fast_forward_interval: float = 0.2
+    fast_forward_action: str = "click"
+    fast_forward_click: tuple[int, int] | None = None
+    fast_forward_region: tuple[float, float] = (0.1, 0.75)
+    fast_forward_max_static: int = 3
+    fast_forward_ocr_every: int = 30
+    checkpoint: bool = True
+    ocr_mosaic: bool = False
+    ocr_mosaic_delay: float = 0.05
+    ocr_mosaic_size: tuple[int, int] = (2048, 2048)
+    ocr_mosaic_padding: int = 16
+    ocr_delta: bool = False
+    ocr_delta_tile: int = 64
+    ocr_delta_max_ratio: float = 0.5
+    ocr_delta_full_every: int = 10
+    playbook: bool = False
+    playbook_threshold: int = 10
+    playbook_verify_rate: float = 0.1
+
+    @property
+    def endpoints(self) -> list[str]:
+        """使用する OCR エンドポイントの一覧（1つ以上）。"""
+        return list(self.ocr_api_endpoints) or [self.ocr_api_endpoint]
 
 
 def load_config(path: Path) -> AppConfig:
@@ -37,6 +170,9 @@ def load_config(path: Path) -> AppConfig:
     Returns:
         パース済み ``AppConfig``。
     """
+    # 遅延インポート（起動時に必要になるまで PyYAML を読み込まない）
+    import yaml
+
     with path.open("r", encoding="utf-8") as f:
         data = yaml.safe_load(f)
 
@@ -48,15 +184,18 @@ def load_config(path: Path) -> AppConfig:
     steps_raw = data.get("steps", []) or []
     if not isinstance(steps_raw, list):
         raise ValueError("設定 'steps' は配列である必要があります")
-    steps = [str(s) for s in steps_raw]
+    # 文字列の配列のほか、any / optional / branch のマッピングも書ける（step グラフにコンパイル）
+    step_graph = StepGraph.from_config(steps_raw)
+    steps = step_graph.texts
 
-    # OCR API のベースエンドポイントは必須（デフォルト無し）
+    # OCR API のベースエンドポイントは必須（デフォルト無し）。配列で複数指定も可
     endpoint_raw = data.get("ocr_api_endpoint")
     if endpoint_raw is None:
         raise ValueError("設定 'ocr_api_endpoint' が未指定です（必須）")
-    endpoint = str(endpoint_raw).strip()
-    if not endpoint:
+    endpoints = [str(e).strip() for e in endpoint_raw] if isinstance(endpoint_raw, list) else [str(endpoint_raw).strip()]
+    if not endpoints or not all(endpoints):
         raise ValueError("設定 'ocr_api_endpoint' が空文字です（必須）")
+    endpoint = endpoints[0]
 
     # 任意: 上部の残存高さ（ピクセル）。未指定または不正値は None。
     keep_raw = data.get("capture_keep_height")
@@ -68,10 +207,237 @@ def load_config(path: Path) -> AppConfig:
     if keep is not None and keep < 1:
         keep = None
 
+    # 任意: 画面変化検出のしきい値（負値で無効）
+    change_threshold = float(data.get("change_threshold", 1.0))
+
+    # 任意: キャプチャのディスク保存（バックグラウンド）と保持枚数
+    capture_archive = bool(data.get("capture_archive", True))
+    capture_retention = int(data.get("capture_retention", 1000))
+
+    # 任意: OCR クライアントのタイムアウトとリトライ回数
+    ocr_connect_timeout = float(data.get("ocr_connect_timeout", 3.0))
+    ocr_read_timeout = float(data.get("ocr_read_timeout", 30.0))
+    ocr_max_retries = int(data.get("ocr_max_retries", 2))
+
+    # 任意: OCR 結果キャッシュ（メモリ LRU + ディスク）
+    ocr_cache_size = int(data.get("ocr_cache_size", 256))
+    ocr_cache_persist = bool(data.get("ocr_cache_persist", False))
+
+    # 任意: パイプライン実行
+    pipeline = bool(data.get("pipeline", False))
+
+    # 任意: 適応スケジューラ（interval は待ち時間の上限になる）
+    min_interval = float(data.get("min_interval", 0.3))
+    backoff_factor = float(data.get("backoff_factor", 2.0))
+    settle_frames = int(data.get("settle_frames", 2))
+    max_ocr_rate = float(data.get("max_ocr_rate", 2.0))
+
+    # 任意: 複数エンドポイント時のヘッジ送信とヘルスチェック間隔
+    ocr_hedge = bool(data.get("ocr_hedge", False))
+    ocr_health_interval = float(data.get("ocr_health_interval", 10.0))
+
+    # 任意: step 照合（あいまい一致・認識スコア・ヘッダー領域の除外）
+    match_min_score = float(data.get("match_min_score", 1.0))
+    if not 0.0 <= match_min_score <= 1.0:
+        raise ValueError("match_min_score は 0 以上 1 以下で指定してください")
+    match_min_rec_score = float(data.get("match_min_rec_score", 0.0))
+    match_ignore_top = max(0, int(data.get("match_ignore_top", 0)))
+
+    # 任意: OCR 領域（固定領域と学習モード）
+    regions_raw = data.get("capture_regions") or []
+    if not isinstance(regions_raw, list):
+        raise ValueError("capture_regions は [x1, y1, x2, y2] のリストで指定してください")
+    capture_regions: list[tuple[int, int, int, int]] = []
+    for r in regions_raw:
+        if not isinstance(r, list) or len(r) != 4:
+            raise ValueError(f"capture_regions の要素は [x1, y1, x2, y2] で指定してください: {r!r}")
+        x1, y1, x2, y2 = (int(v) for v in r)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"capture_regions の要素は x1 < x2, y1 < y2 で指定してください: {r!r}")
+        capture_regions.append((x1, y1, x2, y2))
+    roi_learn = bool(data.get("roi_learn", False))
+    roi_warmup = int(data.get("roi_warmup", 3))
+    roi_margin = int(data.get("roi_margin", 16))
+    roi_full_every = int(data.get("roi_full_every", 10))
+
+    # 任意: OCR 送信画像の前処理とエンコード
+    ocr_image_format = str(data.get("ocr_image_format", "png")).strip().lower()
+    if ocr_image_format == "jpg":
+        ocr_image_format = "jpeg"
+    if ocr_image_format not in IMAGE_FORMATS:
+        raise ValueError(f"ocr_image_format は {' / '.join(IMAGE_FORMATS)} のいずれかで指定してください: {ocr_image_format}")
+    if ocr_image_format != "png" and not pillow_available():
+        raise ValueError(f"ocr_image_format={ocr_image_format} には Pillow が必要です（uv add pillow）")
+    ocr_grayscale = bool(data.get("ocr_grayscale", False))
+    ocr_scale = float(data.get("ocr_scale", 1.0))
+    if not 0.0 < ocr_scale <= 1.0:
+        raise ValueError("ocr_scale は 0 より大きく 1 以下で指定してください")
+    binarize_raw = data.get("ocr_binarize")
+    ocr_binarize = int(binarize_raw) if binarize_raw is not None else None
+    if ocr_binarize is not None and not 0 <= ocr_binarize <= 255:
+        raise ValueError("ocr_binarize は 0 以上 255 以下で指定してください")
+    ocr_contrast_stretch = bool(data.get("ocr_contrast_stretch", False))
+    ocr_png_level = int(data.get("ocr_png_level", 6))
+    if not 0 <= ocr_png_level <= 9:
+        raise ValueError("ocr_png_level は 0 以上 9 以下で指定してください")
+    ocr_quality = int(data.get("ocr_quality", 85))
+    if not 1 <= ocr_quality <= 100:
+        raise ValueError("ocr_quality は 1 以上 100 以下で指定してください")
+
+    # 任意: キャプチャの保存形式（セッションアーカイブのローテーションと保持個数）
+    capture_format = str(data.get("capture_format", "archive")).strip().lower()
+    if capture_format not in ("archive", "files"):
+        raise ValueError(f"capture_format は archive / files のいずれかで指定してください: {capture_format}")
+    capture_rotate_mb = float(data.get("capture_rotate_mb", 256.0))
+    capture_archive_keep = int(data.get("capture_archive_keep", 8))
+
+    # 任意: 選択肢パッチのテンプレートマッチ（OCR の省略）
+    template_match = bool(data.get("template_match", False))
+    template_threshold = float(data.get("template_threshold", 0.95))
+    if not 0.0 < template_threshold <= 1.0:
+        raise ValueError("template_threshold は 0 より大きく 1 以下で指定してください")
+    template_radius = int(data.get("template_radius", 8))
+    if template_radius < 0:
+        raise ValueError("template_radius は 0 以上で指定してください")
+    template_persist = bool(data.get("template_persist", True))
+
+    # 任意: step グラフの先読みと、1フレームで進める step の上限
+    step_lookahead = int(data.get("step_lookahead", 0))
+    if step_lookahead < 0:
+        raise ValueError("step_lookahead は 0 以上で指定してください")
+    max_clicks_per_frame = int(data.get("max_clicks_per_frame", 1))
+    if max_clicks_per_frame < 1:
+        raise ValueError("max_clicks_per_frame は 1 以上で指定してください")
+
+    # 任意: 選択肢のない画面の早送り
+    fast_forward = bool(data.get("fast_forward", False))
+    fast_forward_interval = float(data.get("fast_forward_interval", 0.2))
+    if fast_forward_interval < 0:
+        raise ValueError("fast_forward_interval は 0 以上で指定してください")
+    fast_forward_action = str(data.get("fast_forward_action", "click")).strip().lower()
+    parse_action(fast_forward_action)
+    click_raw = data.get("fast_forward_click")
+    fast_forward_click: tuple[int, int] | None = None
+    if click_raw is not None:
+        if not isinstance(click_raw, list) or len(click_raw) != 2:
+            raise ValueError("fast_forward_click は [x, y] の形式で指定してください")
+        fast_forward_click = (int(click_raw[0]), int(click_raw[1]))
+    region_raw = data.get("fast_forward_region", [0.1, 0.75])
+    if not isinstance(region_raw, list) or len(region_raw) != 2:
+        raise ValueError("fast_forward_region は [上端, 下端] の形式で指定してください")
+    fast_forward_region = (float(region_raw[0]), float(region_raw[1]))
+    if not 0.0 <= fast_forward_region[0] < fast_forward_region[1] <= 1.0:
+        raise ValueError("fast_forward_region は 0 以上 1 以下で、上端 < 下端 となるよう指定してください")
+    fast_forward_max_static = int(data.get("fast_forward_max_static", 3))
+    if fast_forward_max_static < 1:
+        raise ValueError("fast_forward_max_static は 1 以上で指定してください")
+    fast_forward_ocr_every = int(data.get("fast_forward_ocr_every", 30))
+    if fast_forward_ocr_every < 0:
+        raise ValueError("fast_forward_ocr_every は 0 以上で指定してください")
+
+    # 任意: 異常終了後の再開（チェックポイント）
+    checkpoint = bool(data.get("checkpoint", True))
+
+    # 任意: 複数画像のモザイク OCR
+    ocr_mosaic = bool(data.get("ocr_mosaic", False))
+    ocr_mosaic_delay = float(data.get("ocr_mosaic_delay", 0.05))
+    if ocr_mosaic_delay < 0:
+        raise ValueError("ocr_mosaic_delay は 0 以上で指定してください")
+    size_raw = data.get("ocr_mosaic_size", [2048, 2048])
+    if not isinstance(size_raw, list) or len(size_raw) != 2:
+        raise ValueError("ocr_mosaic_size は [幅, 高さ] の形式で指定してください")
+    ocr_mosaic_size = (int(size_raw[0]), int(size_raw[1]))
+    if ocr_mosaic_size[0] <= 0 or ocr_mosaic_size[1] <= 0:
+        raise ValueError("ocr_mosaic_size は正の値で指定してください")
+    ocr_mosaic_padding = int(data.get("ocr_mosaic_padding", 16))
+    if ocr_mosaic_padding < 0:
+        raise ValueError("ocr_mosaic_padding は 0 以上で指定してください")
+
+    # 任意: 変化したタイルだけの差分 OCR
+    ocr_delta = bool(data.get("ocr_delta", False))
+    ocr_delta_tile = int(data.get("ocr_delta_tile", 64))
+    if ocr_delta_tile < 8:
+        raise ValueError("ocr_delta_tile は 8 以上で指定してください")
+    ocr_delta_max_ratio = float(data.get("ocr_delta_max_ratio", 0.5))
+    if not 0.0 < ocr_delta_max_ratio <= 1.0:
+        raise ValueError("ocr_delta_max_ratio は 0 より大きく 1 以下で指定してください")
+    ocr_delta_full_every = int(data.get("ocr_delta_full_every", 10))
+    if ocr_delta_full_every < 0:
+        raise ValueError("ocr_delta_full_every は 0 以上で指定してください")
+
+    # 任意: 既知の画面を OCR なしでクリックするプレイブック
+    playbook = bool(data.get("playbook", False))
+    playbook_threshold = int(data.get("playbook_threshold", 10))
+    if not 0 <= playbook_threshold <= 64:
+        raise ValueError("playbook_threshold は 0 以上 64 以下で指定してください")
+    playbook_verify_rate = float(data.get("playbook_verify_rate", 0.1))
+    if not 0.0 <= playbook_verify_rate <= 1.0:
+        raise ValueError("playbook_verify_rate は 0 以上 1 以下で指定してください")
+
     return AppConfig(
         title=title,
         interval=interval,
         steps=steps,
         ocr_api_endpoint=endpoint,
         capture_keep_height=keep,
+        change_threshold=change_threshold,
+        capture_archive=capture_archive,
+        capture_retention=capture_retention,
+        ocr_connect_timeout=ocr_connect_timeout,
+        ocr_read_timeout=ocr_read_timeout,
+        ocr_max_retries=ocr_max_retries,
+        ocr_cache_size=ocr_cache_size,
+        ocr_cache_persist=ocr_cache_persist,
+        pipeline=pipeline,
+        min_interval=min_interval,
+        backoff_factor=backoff_factor,
+        settle_frames=settle_frames,
+        max_ocr_rate=max_ocr_rate,
+        ocr_api_endpoints=endpoints,
+        ocr_hedge=ocr_hedge,
+        ocr_health_interval=ocr_health_interval,
+        match_min_score=match_min_score,
+        match_min_rec_score=match_min_rec_score,
+        match_ignore_top=match_ignore_top,
+        capture_regions=capture_regions,
+        roi_learn=roi_learn,
+        roi_warmup=roi_warmup,
+        roi_margin=roi_margin,
+        roi_full_every=roi_full_every,
+        ocr_image_format=ocr_image_format,
+        ocr_grayscale=ocr_grayscale,
+        ocr_scale=ocr_scale,
+        ocr_binarize=ocr_binarize,
+        ocr_contrast_stretch=ocr_contrast_stretch,
+        ocr_png_level=ocr_png_level,
+        ocr_quality=ocr_quality,
+        capture_format=capture_format,
+        capture_rotate_mb=capture_rotate_mb,
+        capture_archive_keep=capture_archive_keep,
+        template_match=template_match,
+        template_threshold=template_threshold,
+        template_radius=template_radius,
+        template_persist=template_persist,
+        step_graph=step_graph,
+        step_lookahead=step_lookahead,
+        max_clicks_per_frame=max_clicks_per_frame,
+        fast_forward=fast_forward,
+        fast_forward_interval=fast_forward_interval,
+        fast_forward_action=fast_forward_action,
+        fast_forward_click=fast_forward_click,
+        fast_forward_region=fast_forward_region,
+        fast_forward_max_static=fast_forward_max_static,
+        fast_forward_ocr_every=fast_forward_ocr_every,
+        checkpoint=checkpoint,
+        ocr_mosaic=ocr_mosaic,
+        ocr_mosaic_delay=ocr_mosaic_delay,
+        ocr_mosaic_size=ocr_mosaic_size,
+        ocr_mosaic_padding=ocr_mosaic_padding,
+        ocr_delta=ocr_delta,
+        ocr_delta_tile=ocr_delta_tile,
+        ocr_delta_max_ratio=ocr_delta_max_ratio,
+        ocr_delta_full_every=ocr_delta_full_every,
+        playbook=playbook,
+        playbook_threshold=playbook_threshold,
+        playbook_verify_rate=playbook_verify_rate,
     )
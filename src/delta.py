@@ -0,0 +1,172 @@
+"""変化したタイルだけを OCR し直す差分 OCR。
+
+台詞の行だけが書き換わり、選択肢のメニューは動かない、というように画面の一部だけが
+変わる場合、全体を OCR し直すのは無駄が大きい。直前に OCR したフレーム（基準フレーム）と
+新しいフレームをタイルに分けて比べ、変化したタイル（dirty タイル）をまとめた矩形だけを
+OCR に送る。変化していない部分の語は基準フレームの OCR 結果から引き継ぎ、
+フレーム全体の OCR 結果として組み立てる。
+
+基準フレームとの比較は画素の完全一致で行う（行ごとに比べ、違う行だけタイルに分けて比べる）。
+タイルの境界をまたぐ語を途中で切らないよう、dirty 矩形は重なる既知の語を包むまで広げる。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from capture import CapturedFrame
+from ocr import OcrParagraph
+from roi import Box, merge_boxes
+
+
+def dirty_tiles(prev: bytes, cur: bytes, width: int, height: int, tile: int) -> list[Box]:
+    """同じ大きさの2つの RGB フレームを ``tile`` 四方のタイルに分け、画素の違うタイルを返す。"""
+    stride = width * 3
+    cols = [(x, x * 3, min(width, x + tile) * 3) for x in range(0, width, tile)]
+    found: set[tuple[int, int]] = set()
+    for y in range(height):
+        start = y * stride
+        if prev[start : start + stride] == cur[start : start + stride]:
+            continue
+        ty = y - y % tile
+        for x, a, b in cols:
+            if (x, ty) not in found and prev[start + a : start + b] != cur[start + a : start + b]:
+                found.add((x, ty))
+    return [(x, y, min(width, x + tile), min(height, y + tile)) for x, y in sorted(found, key=lambda t: (t[1], t[0]))]
+
+
+def _intersects(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _inside(box: Box, regions: Sequence[Box]) -> bool:
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    return any(r[0] <= cx < r[2] and r[1] <= cy < r[3] for r in regions)
+
+
+@dataclass(frozen=True)
+class DeltaPlan:
+    """1フレームの差分 OCR の計画。
+
+    Attributes:
+        regions: OCR し直す矩形（フレーム内座標、互いに重ならない）。空なら基準フレームと同一。
+        kept: 引き継ぐ基準フレームの語（``regions`` の外にあるもの）。
+        dirty: 変化したタイルの数。
+        tiles: タイルの総数。
+    """
+
+    regions: list[Box]
+    kept: list[OcrParagraph]
+    dirty: int
+    tiles: int
+
+    @property
+    def pixels(self) -> int:
+        """OCR に送る画素数。"""
+        return sum((r[2] - r[0]) * (r[3] - r[1]) for r in self.regions)
+
+    def combine(self, fresh: Sequence[OcrParagraph]) -> list[OcrParagraph]:
+        """引き継いだ語と、``regions`` を OCR し直した語（フレーム内座標）を上から順に並べる。"""
+        return sorted([*self.kept, *fresh], key=lambda p: (p.box[1], p.box[0]))
+
+
+@dataclass
+class DeltaStats:
+    """差分 OCR の集計値。
+
+    Attributes:
+        delta: 変化した部分だけを OCR した回数。
+        unchanged: 基準フレームと同一で OCR しなかった回数。
+        sent_pixels: 差分 OCR で送った画素数の合計。
+        frame_pixels: 差分 OCR したフレームの画素数の合計。
+    """
+
+    delta: int = 0
+    unchanged: int = 0
+    sent_pixels: int = 0
+    frame_pixels: int = 0
+
+    @property
+    def sent_ratio(self) -> float:
+        """差分 OCR で送った画素の、フレーム全体に対する割合。"""
+        return self.sent_pixels / self.frame_pixels if self.frame_pixels else 0.0
+
+
+class DeltaTracker:
+    """基準フレームとその OCR 結果を持ち、次のフレームの差分 OCR を計画する。
+
+    OCR 段の単一スレッドから使う前提。
+
+    Args:
+        tile: タイルの1辺（ピクセル）。
+        max_ratio: 変化した範囲がフレームに対してこの割合を超えたら全体を OCR する。
+        full_every: 差分 OCR をこの回数続けたら、ずれの蓄積を避けるため全体を OCR する（0 で行わない）。
+        margin: dirty 矩形を広げるピクセル数（文字の端の欠けを防ぐ）。
+    """
+
+    def __init__(self, tile: int = 64, *, max_ratio: float = 0.5, full_every: int = 10, margin: int = 4) -> None:
+        self.tile = max(8, tile)
+        self.max_ratio = max_ratio
+        self.full_every = max(0, full_every)
+        self.margin = max(0, margin)
+        self.stats = DeltaStats()
+        self._base: bytes | None = None
+        self._size: tuple[int, int] | None = None
+        self._paragraphs: list[OcrParagraph] = []
+        self._since_full = 0
+
+    def reset(self) -> None:
+        """基準フレームを捨てる（次は全体を OCR する）。"""
+        self._base = None
+        self._size = None
+        self._paragraphs = []
+
+    def plan(self, frame: CapturedFrame) -> DeltaPlan | None:
+        """``frame`` の差分 OCR の計画を返す。全体を OCR すべき場合は None。"""
+        if self._base is None or self._size != frame.size:
+            return None
+        if self.full_every and self._since_full >= self.full_every:
+            return None
+        width, height = frame.size
+        rgb = bytes(frame.rgb)
+        tiles = dirty_tiles(self._base, rgb, width, height, self.tile)
+        total = -(-width // self.tile) * -(-height // self.tile)
+        if not tiles:
+            return DeltaPlan([], list(self._paragraphs), 0, total)
+        m = self.margin
+        regions = merge_boxes((max(0, b[0] - m), max(0, b[1] - m), min(width, b[2] + m), min(height, b[3] + m)) for b in tiles)
+        # 境界をまたぐ既知の語を切らないよう、重なる語を包むまで広げる
+        while True:
+            grown = merge_boxes([*regions, *(p.box for p in self._paragraphs if any(_intersects(p.box, r) for r in regions))])
+            if grown == regions:
+                break
+            regions = grown
+        regions = [(max(0, r[0]), max(0, r[1]), min(width, r[2]), min(height, r[3])) for r in regions]
+        plan = DeltaPlan(regions, [p for p in self._paragraphs if not _inside(p.box, regions)], len(tiles), total)
+        if plan.pixels > self.max_ratio * width * height:
+            return None
+        return plan
+
+    def commit(self, frame: CapturedFrame, paragraphs: Sequence[OcrParagraph], plan: DeltaPlan | None = None) -> None:
+        """``frame`` の全体の認識結果（フレーム内座標）を次の基準にする。
+
+        Args:
+            frame: 認識したフレーム。
+            paragraphs: フレーム全体の語。
+            plan: 差分 OCR で組み立てた結果なら、その計画（全体を OCR した・キャッシュから得た場合は None）。
+        """
+        if plan is not None and not plan.regions:
+            # 基準フレームと同一
+            self.stats.unchanged += 1
+            return
+        if plan is None:
+            self._since_full = 0
+        else:
+            self.stats.delta += 1
+            self.stats.sent_pixels += plan.pixels
+            self.stats.frame_pixels += frame.width * frame.height
+            self._since_full += 1
+        self._base = bytes(frame.rgb)
+        self._size = frame.size
+        self._paragraphs = list(paragraphs)
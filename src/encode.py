@@ -0,0 +1,240 @@
+"""OCR 送信用の画像前処理とエンコード。
+
+キャプチャしたフレームをそのままフル解像度の RGB PNG にすると、エンコードの CPU 負荷と
+送信サイズが大きい。ここでは次の処理を選択して組み合わせられるようにする。
+
+- グレースケール化
+- 縮小（``scale`` 倍）
+- コントラスト伸長・2値化（グレースケール化を伴う）
+- PNG 圧縮レベルの指定
+- JPEG / WebP（非可逆。Pillow が必要）
+
+縮小した画像の OCR 結果の座標は :func:`scale_paragraphs` で元の座標へ戻す。
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import struct
+import zlib
+from collections.abc import Sequence
+from dataclasses import dataclass
+from operator import itemgetter
+
+from capture import CapturedFrame
+from ocr import OcrParagraph
+from ocr_result import OcrResult
+
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+_CONTENT_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+_SUFFIXES = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+# BT.601 の重み（合計 256）。各チャネルを重み付けした値の床関数の和は 255 を超えない
+_WEIGHT_TABLES = tuple(bytes((w * i) >> 8 for i in range(256)) for w in (77, 150, 29))
+
+
+def pillow_available() -> bool:
+    """Pillow（JPEG / WebP に必要）がインストールされているか。"""
+    return importlib.util.find_spec("PIL") is not None
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    """OCR 送信画像の前処理・エンコード設定。
+
+    Attributes:
+        format: ``png`` / ``jpeg`` / ``webp``。
+        grayscale: グレースケール化するか。
+        scale: 縮小倍率（0 より大きく 1 以下）。
+        binarize: 2値化のしきい値（0..255）。None で無効。
+        contrast_stretch: 輝度の最小〜最大を 0..255 に引き伸ばすか。
+        png_level: PNG の圧縮レベル（0..9）。
+        quality: JPEG / WebP の品質（1..100）。
+    """
+
+    format: str = "png"
+    grayscale: bool = False
+    scale: float = 1.0
+    binarize: int | None = None
+    contrast_stretch: bool = False
+    png_level: int = 6
+    quality: int = 85
+
+    @property
+    def single_channel(self) -> bool:
+        return self.grayscale or self.binarize is not None or self.contrast_stretch
+
+    def describe(self) -> str:
+        """ログ・ベンチマーク表示用の短い説明。"""
+        parts = [self.format]
+        if self.format == "png":
+            parts.append(f"level={self.png_level}")
+        else:
+            parts.append(f"q={self.quality}")
+        if self.single_channel:
+            parts.append("gray")
+        if self.scale < 1.0:
+            parts.append(f"x{self.scale:g}")
+        if self.contrast_stretch:
+            parts.append("stretch")
+        if self.binarize is not None:
+            parts.append(f"bin={self.binarize}")
+        return " ".join(parts)
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """エンコード済みの OCR 送信画像。
+
+    Attributes:
+        data: エンコード済みバイト列。
+        format: 画像形式。
+        width: 送信画像の幅。
+        height: 送信画像の高さ。
+        scale_x: 送信画像の幅 / 元フレームの幅。
+        scale_y: 送信画像の高さ / 元フレームの高さ。
+    """
+
+    data: bytes
+    format: str
+    width: int
+    height: int
+    scale_x: float = 1.0
+    scale_y: float = 1.0
+
+    @property
+    def content_type(self) -> str:
+        return _CONTENT_TYPES[self.format]
+
+    @property
+    def suffix(self) -> str:
+        return _SUFFIXES[self.format]
+
+    @property
+    def filename(self) -> str:
+        return f"capture{self.suffix}"
+
+
+def to_grayscale(rgb: bytes | memoryview) -> bytes:
+    """RGB バイト列（リングバッファの ``memoryview`` も可）を 8bit 輝度に変換する。
+
+    画素ごとの Python ループを避けるため、チャネルごとの重み付けを ``bytes.translate``
+    で行い、多倍長整数の加算で全画素を一度に足し合わせる（桁上がりは起きない）。
+    """
+    n = len(rgb) // 3
+    if isinstance(rgb, memoryview):
+        # 飛び飛びの memoryview からのコピーは遅いため、先に連続したバイト列へ1度だけ写す
+        rgb = rgb.tobytes()
+    total = 0
+    for k, table in enumerate(_WEIGHT_TABLES):
+        total += int.from_bytes(rgb[k::3].translate(table), "little")
+    return total.to_bytes(n, "little")
+
+
+def resize_nearest(data: bytes | memoryview, width: int, height: int, channels: int, out_width: int, out_height: int) -> bytes:
+    """最近傍法で縮小する（行ごとに ``itemgetter`` で画素を拾う）。"""
+    xs = [(2 * i + 1) * width // (2 * out_width) for i in range(out_width)]
+    ys = [(2 * j + 1) * height // (2 * out_height) for j in range(out_height)]
+    idx = [x * channels + c for x in xs for c in range(channels)]
+    stride = width * channels
+    if len(idx) == 1:
+        return bytes(data[y * stride + idx[0]] for y in ys)
+    pick = itemgetter(*idx)
+    return b"".join(bytes(pick(data[y * stride : (y + 1) * stride])) for y in ys)
+
+
+def stretch_contrast(gray: bytes) -> bytes:
+    """輝度の最小〜最大を 0..255 に引き伸ばす。"""
+    if not gray:
+        return gray
+    lo, hi = min(gray), max(gray)
+    if hi <= lo:
+        return gray
+    return gray.translate(bytes(min(255, max(0, (i - lo) * 255 // (hi - lo))) for i in range(256)))
+
+
+def binarize(gray: bytes, threshold: int) -> bytes:
+    """しきい値以上を 255、未満を 0 にする。"""
+    return gray.translate(bytes(255 if i >= threshold else 0 for i in range(256)))
+
+
+def write_png(raw: bytes | memoryview, width: int, height: int, channels: int, level: int = 6) -> bytes:
+    """8bit グレースケール / RGB の生データを PNG にする。"""
+    stride = width * channels
+    scanlines = b"".join(b"\x00" + raw[y * stride : (y + 1) * stride] for y in range(height))
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF)
+
+    color_type = 0 if channels == 1 else 2
+    header = struct.pack(">2I5B", width, height, 8, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(scanlines, level)) + chunk(b"IEND", b"")
+
+
+def _encode_lossy(raw: bytes | memoryview, width: int, height: int, channels: int, options: EncodeOptions) -> bytes:
+    # 遅延インポート（PNG のみ使う環境では Pillow を必要としない）
+    from PIL import Image  # type: ignore
+
+    img = Image.frombytes("L" if channels == 1 else "RGB", (width, height), raw)
+    buf = io.BytesIO()
+    img.save(buf, format=options.format.upper(), quality=options.quality)
+    return buf.getvalue()
+
+
+def encode_frame(frame: CapturedFrame, options: EncodeOptions | None = None) -> EncodedImage:
+    """フレームを前処理して OCR 送信用にエンコードする。
+
+    処理順はグレースケール化 → 縮小 → コントラスト伸長 → 2値化 → エンコード。
+
+    Raises:
+        ValueError: 未対応の形式の場合。
+    """
+    options = options or EncodeOptions()
+    if options.format not in IMAGE_FORMATS:
+        raise ValueError(f"未対応の画像形式です: {options.format}")
+
+    raw, channels = frame.rgb, 3
+    width, height = frame.width, frame.height
+    if options.single_channel:
+        raw, channels = to_grayscale(raw), 1
+
+    out_width, out_height = width, height
+    if 0 < options.scale < 1.0:
+        out_width = max(1, round(width * options.scale))
+        out_height = max(1, round(height * options.scale))
+        raw = resize_nearest(raw, width, height, channels, out_width, out_height)
+
+    if options.contrast_stretch:
+        raw = stretch_contrast(raw)
+    if options.binarize is not None:
+        raw = binarize(raw, options.binarize)
+
+    if options.format == "png":
+        data = write_png(raw, out_width, out_height, channels, options.png_level)
+    else:
+        data = _encode_lossy(raw, out_width, out_height, channels, options)
+    return EncodedImage(
+        data=data,
+        format=options.format,
+        width=out_width,
+        height=out_height,
+        scale_x=out_width / width if width else 1.0,
+        scale_y=out_height / height if height else 1.0,
+    )
+
+
+def scale_paragraphs(paragraphs: Sequence[OcrParagraph], scale_x: float, scale_y: float) -> Sequence[OcrParagraph]:
+    """縮小画像内の OCR 結果の座標を、元フレームの座標へ戻す（:class:`OcrResult` はその型のまま）。"""
+    if scale_x >= 1.0 and scale_y >= 1.0:
+        return paragraphs
+    if isinstance(paragraphs, OcrResult):
+        return paragraphs.scaled(scale_x, scale_y)
+    return [
+        OcrParagraph(
+            text=p.text,
+            box=(round(p.box[0] / scale_x), round(p.box[1] / scale_y), round(p.box[2] / scale_x), round(p.box[3] / scale_y)),
+            score=p.score,
+        )
+        for p in paragraphs
+    ]
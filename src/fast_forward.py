@@ -0,0 +1,155 @@
+"""選択肢のない画面を OCR せずに送る早送りモード。
+
+ノベルゲームの大半は選択肢のない会話画面で、そこでは OCR しても一致する step はない。
+:class:`ChoiceClassifier` はキャプチャ画像の水平方向の帯ごとに「文字らしさ」
+（隣り合う画素の強い輝度差の密度）を求め、選択肢が出ていそうかを安く判定する。
+
+- 会話画面: 文字の帯は画面下部のテキストウィンドウにだけある
+- 選択肢画面: 画面中央付近に、文字の帯のまとまりが縦に複数並ぶ（選択肢のボタン）
+
+選択肢画面と判定しなければ OCR せずに送り操作（クリックまたはキー入力）を行う。
+判定は偽陽性（会話画面を選択肢画面とみなす）側に倒しており、その場合は OCR して
+一致が無ければ、送り操作はせずに画面が変わるのを待つ（選択肢の可能性がある画面で
+送りのクリックをすると、選択肢の1つを選んでしまうことがあるため）。一度 step に一致した
+画面の帯の並びは覚えておき、似た画面は以後も選択肢画面とみなす。
+
+判定を逃した選択肢画面（選択肢が1つだけのメニューなど）で送り続けないよう、早送り中も
+画面変化を調べ、送っても画面が変わらないことが続いた場合と、一定回数送り続けた場合は
+早送りをやめてそのフレームを OCR する（自動操作ループ側で行う）。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from itertools import pairwise
+
+from capture import CapturedFrame
+
+# 送り操作に使えるキー（仮想キーコード）
+KEY_CODES = {"enter": 0x0D, "space": 0x20, "ctrl": 0x11, "right": 0x27, "down": 0x28, "pagedown": 0x22}
+
+# 「強い輝度差」とみなす隣接画素（間引き後）の差
+_EDGE_DELTA = 48
+# 帯ごとに見る行数と、行内で画素を間引く間隔
+_ROWS_PER_BAND = 2
+_COLUMN_STEP = 3
+# 覚えた選択肢画面と同じとみなす帯の並びの一致率（Jaccard 係数）
+_EXEMPLAR_SIMILARITY = 0.75
+
+
+def text_band_profile(frame: CapturedFrame, bands: int = 36) -> list[float]:
+    """水平方向の ``bands`` 本の帯ごとの文字らしさ（0..1、強い輝度差の密度）。
+
+    全画素は見ず、各帯から等間隔に数行を選び、緑チャネル（輝度の近似）を間引いて比べる。
+    """
+    width, height, rgb = frame.width, frame.height, frame.rgb
+    if width < 2 or height < bands:
+        return [0.0] * bands
+    stride = width * 3
+    pixel_step = 3 * _COLUMN_STEP
+    out: list[float] = []
+    for b in range(bands):
+        hits = 0
+        total = 0
+        for r in range(_ROWS_PER_BAND):
+            y = (b * _ROWS_PER_BAND + r) * height // (bands * _ROWS_PER_BAND) + height // (bands * _ROWS_PER_BAND * 2)
+            row = rgb[y * stride + 1 : (y + 1) * stride : pixel_step]
+            hits += sum(1 for a, c in pairwise(row) if a - c > _EDGE_DELTA or c - a > _EDGE_DELTA)
+            total += len(row) - 1
+        out.append(hits / total if total > 0 else 0.0)
+    return out
+
+
+@dataclass
+class ClassifierStats:
+    """:class:`ChoiceClassifier` の集計値。"""
+
+    frames: int = 0
+    choice: int = 0
+    learned: int = 0
+
+
+class ChoiceClassifier:
+    """選択肢画面が出ていそうかを、帯ごとの文字らしさから判定する（スレッドセーフ）。
+
+    Args:
+        region: 選択肢が出る縦方向の範囲（画面の高さに対する割合 (上端, 下端)）。
+        bands: 画面を分割する帯の数。
+        density: 文字の帯とみなす文字らしさの下限。
+        min_groups: 選択肢画面とみなす、``region`` 内の文字の帯のまとまりの数の下限。
+        max_exemplars: 覚えておく選択肢画面の数（古いものから捨てる）。
+    """
+
+    def __init__(self, region: tuple[float, float] = (0.1, 0.75), bands: int = 36, density: float = 0.06, min_groups: int = 2, max_exemplars: int = 16) -> None:
+        self.bands = max(4, bands)
+        self.density = density
+        self.min_groups = max(1, min_groups)
+        self._lo = max(0, min(self.bands, int(region[0] * self.bands)))
+        self._hi = max(self._lo, min(self.bands, round(region[1] * self.bands)))
+        self.stats = ClassifierStats()
+        self._lock = threading.Lock()
+        self._exemplars: deque[frozenset[int]] = deque(maxlen=max(1, max_exemplars))
+
+    def text_bands(self, frame: CapturedFrame) -> frozenset[int]:
+        """``region`` 内で文字の帯とみなした帯の番号。"""
+        profile = text_band_profile(frame, self.bands)
+        return frozenset(i for i in range(self._lo, self._hi) if profile[i] >= self.density)
+
+    def is_choice(self, frame: CapturedFrame) -> bool:
+        """選択肢画面の可能性があれば True（迷う場合も True）。"""
+        bands = self.text_bands(frame)
+        # 連続する文字の帯を1つのまとまり（選択肢1つ分）と数える
+        groups = sum(1 for i in bands if i - 1 not in bands)
+        likely = groups >= self.min_groups
+        if not likely and bands:
+            with self._lock:
+                likely = any(len(bands & e) / len(bands | e) >= _EXEMPLAR_SIMILARITY for e in self._exemplars)
+        with self._lock:
+            self.stats.frames += 1
+            self.stats.choice += likely
+        return likely
+
+    def learn(self, frame: CapturedFrame) -> None:
+        """一致する step があった（選択肢が出ていた）画面の帯の並びを覚える。"""
+        bands = self.text_bands(frame)
+        if not bands:
+            return
+        with self._lock:
+            if bands not in self._exemplars:
+                self._exemplars.append(bands)
+                self.stats.learned += 1
+
+
+@dataclass(frozen=True)
+class AdvanceAction:
+    """会話を送る操作。
+
+    Attributes:
+        key: 送りに使うキーの仮想キーコード（None ならクリック）。
+        point: クリック位置（キャプチャ画像内座標。None なら下端付近の中央）。
+    """
+
+    key: int | None = None
+    point: tuple[int, int] | None = None
+
+    def position(self, width: int, height: int) -> tuple[int, int]:
+        """ウィンドウ画像内のクリック位置。"""
+        if self.point is not None:
+            return self.point
+        return width // 2, height * 9 // 10
+
+
+def parse_action(text: str) -> AdvanceAction:
+    """設定の ``fast_forward_action``（``click`` またはキー名）を解釈する。
+
+    Raises:
+        ValueError: 未知のキー名の場合。
+    """
+    name = text.strip().lower()
+    if name == "click":
+        return AdvanceAction()
+    if name not in KEY_CODES:
+        raise ValueError(f"fast_forward_action は click / {' / '.join(KEY_CODES)} のいずれかで指定してください: {text}")
+    return AdvanceAction(key=KEY_CODES[name])
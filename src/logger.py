@@ -1,47 +1,369 @@
-"""ログ設定ユーティリティ。"""
+"""ログ設定ユーティリティ。
+
+既定では、ログレコードはキューに積むだけにして、ファイル・コンソールへの書き出しは
+バックグラウンドスレッドがまとめて行う（自動操作ループのスレッドで書式化・書き込み・
+フラッシュを待たない）。ログファイルは大きさ・経過時間でローテーションする。
+``format="jsonl"`` ではログファイルを1レコード1行の JSON で出力し、フレームごとの
+認識結果（全語の文字列・矩形と判定）を1レコードにまとめる。
+"""
 
 from __future__ import annotations
 
+import abc
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
+from typing import IO, Any
 
 from utils import timestamp_for_filename
 
+_TEXT_FORMAT = "%(asctime)s.%(msecs)03d [%(levelname)s] %(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_FORMATS = ("text", "jsonl")
+
+
+@dataclass(frozen=True)
+class LogOptions:
+    """ログ出力の設定。
+
+    Attributes:
+        format: ログファイルの形式（``text`` または ``jsonl``）。コンソールは常に text。
+        queued: 書き出しをバックグラウンドスレッドでまとめて行うか。
+        max_bytes: ログファイルをローテーションする大きさ（0 で無制限）。
+        rotate_interval: ログファイルをローテーションする間隔（秒、0 で無効）。
+        backup_count: ローテーションで残す古いログファイルの数。
+        flush_interval: バックグラウンドスレッドがまとめて書き出すまでに待つ最大秒数。
+    """
+
+    format: str = "text"
+    queued: bool = True
+    max_bytes: int = 64 * 1024 * 1024
+    rotate_interval: float = 0.0
+    backup_count: int = 5
+    flush_interval: float = 0.2
+
+
+class FrameTextFormatter(logging.Formatter):
+    """テキスト形式。フレームの認識結果を持つレコードは、語ごとの行を続けて出す。"""
+
+    def __init__(self, fmt: str = _TEXT_FORMAT) -> None:
+        super().__init__(fmt=fmt, datefmt=_DATE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        frame = getattr(record, "frame", None)
+        if frame is None:
+            return text
+        lines = [text]
+        lines.extend(f" - '{w['text']}' box={tuple(w['box'])}" for w in frame.get("words", ()))
+        return "\n".join(lines)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """1レコード1行の JSON 形式（フレームの認識結果は ``frame`` に入れる）。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        frame = getattr(record, "frame", None)
+        if frame is not None:
+            out["frame"] = frame
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False)
+
+
+class RotatingLogFile:
+    """大きさ・経過時間でローテーションする追記専用のログファイル。
+
+    ローテーション時は ``<name>.1`` … ``<name>.<backup_count>`` へずらし、最も古いものを消す。
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 0, rotate_interval: float = 0.0, backup_count: int = 5) -> None:
+        self.path = path
+        self.max_bytes = max(0, max_bytes)
+        self.rotate_interval = max(0.0, rotate_interval)
+        self.backup_count = max(0, backup_count)
+        self.rotations = 0
+        self._stream: IO[bytes] = path.open("ab")
+        self._size = self._stream.tell()
+        self._opened = time.monotonic()
+
+    def write(self, data: bytes) -> None:
+        if self._should_rotate(len(data)):
+            self._rotate()
+        self._stream.write(data)
+        self._size += len(data)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size + incoming > self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.monotonic() - self._opened >= self.rotate_interval
+
+    def _rotate(self) -> None:
+        self._stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = self.path.with_name(f"{self.path.name}.{i}")
+                if src.exists():
+                    src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._stream = self.path.open("ab")
+        self._size = 0
+        self._opened = time.monotonic()
+        self.rotations += 1
 
-def setup_file_logger(base_dir: Path) -> tuple[logging.Logger, Path]:
+
+class BatchingHandler(logging.Handler, abc.ABC):
+    """複数のレコードを書式化して1回の書き込み・フラッシュで出力するハンドラの基底。
+
+    サブクラスは :meth:`write` で書き出し先を実装する。
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle_batch([record])
+
+    def handle_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        """``records`` のうちこのハンドラのレベル以上のものをまとめて書き出す。"""
+        lines = []
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.write("\n".join(lines) + "\n")
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+    @abc.abstractmethod
+    def write(self, text: str) -> None:
+        """書式化済みの複数行 ``text`` を書き出してフラッシュする（ロックを取った状態で呼ばれる）。"""
+
+
+class BatchingFileHandler(BatchingHandler):
+    """:class:`RotatingLogFile` へまとめて書き出すハンドラ。"""
+
+    def __init__(self, path: Path, max_bytes: int = 0, rotate_interval: float = 0.0, backup_count: int = 5) -> None:
+        super().__init__()
+        self.file = RotatingLogFile(path, max_bytes, rotate_interval, backup_count)
+
+    def write(self, text: str) -> None:
+        self.file.write(text.encode("utf-8"))
+        self.file.flush()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            self.file.close()
+        finally:
+            self.release()
+        super().close()
+
+
+class BatchingStreamHandler(BatchingHandler):
+    """コンソール（標準エラー）へまとめて書き出すハンドラ。"""
+
+    def __init__(self, stream: IO[str] | None = None) -> None:
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stderr
+
+    def write(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """ループのスレッドではメッセージの組み立てだけ行い、レコードをキューに積む。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 引数は後で変更されうるため、ここで文字列にしておく（時刻の書式化・出力は書き出し側）
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchingLogWriter:
+    """キューに積まれたレコードを、バックグラウンドスレッドでまとめて書き出す。
+
+    最初のレコードを受け取ってから ``flush_interval`` 秒以内に届いたもの（最大 ``max_batch`` 件）を
+    1回の書き込みにまとめる。警告以上のレコードは待たずに書き出す。
+    """
+
+    _STOP = object()
+
+    def __init__(self, handlers: Sequence[BatchingHandler], flush_interval: float = 0.2, max_batch: int = 1024) -> None:
+        self.queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self.handlers = list(handlers)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.records = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self) -> BatchingLogWriter:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """キューに残っているレコードを書き出してから止める。"""
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join()
+        for h in self.handlers:
+            h.close()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and item.levelno < logging.WARNING:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            for h in self.handlers:
+                h.handle_batch(batch)
+            self.batches += 1
+            self.records += len(batch)
+
+
+_WRITERS: list[BatchingLogWriter] = []
+_WRITERS_LOCK = threading.Lock()
+
+
+def shutdown_logging() -> None:
+    """バックグラウンドの書き出しをすべて止める（残りのレコードは書き出す）。終了時に自動で呼ばれる。"""
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS)
+        _WRITERS.clear()
+    for writer in writers:
+        writer.stop()
+
+
+atexit.register(shutdown_logging)
+
+
+def configure_logger(logger: logging.Logger, handlers: Sequence[BatchingHandler], options: LogOptions) -> None:
+    """``logger`` にハンドラを割り当てる。``options.queued`` ならバックグラウンドスレッド経由で出力する。"""
+    logger.setLevel(logging.DEBUG)
+    logger.handlers.clear()
+    if not options.queued:
+        for h in handlers:
+            logger.addHandler(h)
+        return
+    writer = BatchingLogWriter(handlers, options.flush_interval).start()
+    with _WRITERS_LOCK:
+        _WRITERS.append(writer)
+    logger.addHandler(_EnqueueHandler(writer.queue))
+
+
+def _file_handler(logfile: Path, options: LogOptions) -> BatchingFileHandler:
+    fh = BatchingFileHandler(logfile, options.max_bytes, options.rotate_interval, options.backup_count)
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(JsonLinesFormatter() if options.format == "jsonl" else FrameTextFormatter())
+    return fh
+
+
+def setup_file_logger(base_dir: Path, options: LogOptions | None = None) -> tuple[logging.Logger, Path]:
     """ログ出力を設定し、ロガーとログファイルパスを返す。
 
     Args:
         base_dir: プロジェクトのルートディレクトリ。
+        options: 任意。ログの形式・ローテーション・非同期書き出しの設定。
 
     Returns:
         - ``logging.Logger``: 設定済みロガー。
         - ``Path``: 作成したログファイルのパス。
     """
+    options = options or LogOptions()
     logs_dir = base_dir / "logs"
     logs_dir.mkdir(parents=True, exist_ok=True)
 
     ts = timestamp_for_filename()
-    logfile = logs_dir / f"{ts}.log"
+    logfile = logs_dir / f"{ts}.{'jsonl' if options.format == 'jsonl' else 'log'}"
 
     logger = logging.getLogger("app")
-    logger.setLevel(logging.DEBUG)
-    logger.handlers.clear()
-
-    fh = logging.FileHandler(logfile, encoding="utf-8")
-    fh.setLevel(logging.DEBUG)
-    formatter = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
 
     # コンソールにも最低限の情報を出す（デバッグ容易化）
-    ch = logging.StreamHandler()
+    ch = BatchingStreamHandler()
     ch.setLevel(logging.INFO)
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    ch.setFormatter(FrameTextFormatter())
+    configure_logger(logger, [_file_handler(logfile, options), ch], options)
 
     logger.debug("ロガー初期化完了: %s", logfile)
     return logger, logfile
+
+
+def setup_session_logger(base_dir: Path, name: str, options: LogOptions | None = None) -> tuple[logging.Logger, Path]:
+    """複数セッション実行時のセッション別ロガーを設定する。
+
+    ``app.<name>`` ロガーに専用のログファイルを割り当て、コンソールには
+    セッション名を付けて出力する。:func:`setup_file_logger` の後に呼ぶこと。
+
+    Args:
+        base_dir: プロジェクトのルートディレクトリ。
+        name: セッション名（ログファイル名にも使う）。
+        options: 任意。ログの形式・ローテーション・非同期書き出しの設定。
+
+    Returns:
+        - ``logging.Logger``: 設定済みロガー。
+        - ``Path``: 作成したログファイルのパス。
+    """
+    options = options or LogOptions()
+    logs_dir = base_dir / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+
+    ts = timestamp_for_filename()
+    logfile = logs_dir / f"{ts}-{name}.{'jsonl' if options.format == 'jsonl' else 'log'}"
+
+    logger = logging.getLogger(f"app.{name}")
+    # 親（app）のハンドラには流さず、セッション専用のハンドラだけに出す
+    logger.propagate = False
+
+    ch = BatchingStreamHandler()
+    ch.setLevel(logging.INFO)
+    ch.setFormatter(FrameTextFormatter("%(asctime)s.%(msecs)03d [%(levelname)s] [" + name.replace("%", "%%") + "] %(message)s"))
+    configure_logger(logger, [_file_handler(logfile, options), ch], options)
+
+    logger.debug("セッションロガー初期化完了: %s", logfile)
+    return logger, logfile
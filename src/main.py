@@ -1,39 +1,144 @@
 from __future__ import annotations
 
+import logging
+import time
+from contextlib import ExitStack
 from pathlib import Path
 
 import click
 
-from automation import run_automation
 from config import AppConfig, load_config
-from logger import setup_file_logger
-from ocr import check_ocr_health
+from logger import LOG_FORMATS, LogOptions, setup_file_logger
+from metrics import REGISTRY, JsonlMetricsExporter, PrometheusExporter
+from profiler import SamplingProfiler
 
 
 @click.command()
-@click.option("--config", "config_path", type=click.Path(path_type=Path, exists=True, dir_okay=False), required=True, help="設定YAMLファイルのパス")
-def main(config_path: Path) -> None:
+@click.option(
+    "--config",
+    "config_paths",
+    type=click.Path(path_type=Path, exists=True, dir_okay=False),
+    required=True,
+    multiple=True,
+    help="設定YAMLファイルのパス（複数指定すると各設定を別セッションとして同時に実行）",
+)
+@click.option("--max-ocr-rate", type=float, default=4.0, show_default=True, help="複数セッション実行時の全体の OCR 送信上限（回/秒、0 以下で無制限）")
+@click.option("--metrics-file", type=click.Path(path_type=Path, dir_okay=False), default=None, help="処理段ごとの所要時間などのメトリクスを JSON Lines で追記するファイル")
+@click.option("--metrics-interval", type=float, default=10.0, show_default=True, help="--metrics-file への書き出し間隔（秒）")
+@click.option("--metrics-port", type=int, default=None, help="指定するとローカルの http://127.0.0.1:<port>/metrics で Prometheus 形式のメトリクスを公開")
+@click.option("--profile", is_flag=True, help="サンプリングプロファイラを有効にし、終了時に logs/ へ結果を保存")
+@click.option("--fresh", is_flag=True, help="チェックポイントを破棄し、最初の step から始める")
+@click.option("--log-format", type=click.Choice(LOG_FORMATS), default="text", show_default=True, help="ログファイルの形式（jsonl は1行1レコードの JSON で、フレームごとの認識結果を1レコードにまとめる）")
+@click.option("--log-max-mb", type=float, default=64.0, show_default=True, help="ログファイルをローテーションする大きさ（MB、0 で無制限）")
+@click.option("--log-rotate-hours", type=float, default=0.0, show_default=True, help="ログファイルをローテーションする間隔（時間、0 で無効）")
+@click.option("--log-backups", type=int, default=5, show_default=True, help="ローテーションで残す古いログファイルの数")
+@click.option("--log-sync", is_flag=True, help="バックグラウンドスレッドを使わず、ログをその場で書き出す")
+def main(
+    config_paths: tuple[Path, ...],
+    max_ocr_rate: float,
+    metrics_file: Path | None,
+    metrics_interval: float,
+    metrics_port: int | None,
+    profile: bool,
+    fresh: bool,
+    log_format: str,
+    log_max_mb: float,
+    log_rotate_hours: float,
+    log_backups: int,
+    log_sync: bool,
+) -> None:
     """テキストノベルゲームの自動操作アプリを起動する。"""
+    # 最初の OCR 応答までの時間の基準
+    started_at = time.monotonic()
     base_dir = Path(__file__).resolve().parent.parent
-    logger, logfile = setup_file_logger(base_dir)
+    log_options = LogOptions(
+        format=log_format,
+        queued=not log_sync,
+        max_bytes=int(log_max_mb * 1024 * 1024),
+        rotate_interval=log_rotate_hours * 3600,
+        backup_count=log_backups,
+    )
+    logger, logfile = setup_file_logger(base_dir, log_options)
     logger.info("ログファイル: %s", logfile)
 
-    try:
-        config: AppConfig = load_config(config_path)
-    except Exception as e:
-        logger.exception("設定の読み込みに失敗しました: %s", e)
-        raise SystemExit(2) from e
+    configs: list[AppConfig] = []
+    for config_path in config_paths:
+        try:
+            configs.append(load_config(config_path))
+        except Exception as e:
+            logger.exception("設定の読み込みに失敗しました: %s (%s)", e, config_path)
+            raise SystemExit(2) from e
+
+    with ExitStack() as stack:
+        if metrics_file is not None:
+            exporter = JsonlMetricsExporter(metrics_file, metrics_interval, REGISTRY, logger).start()
+            stack.callback(exporter.close)
+            logger.info("メトリクスファイル: %s", metrics_file)
+        if metrics_port is not None:
+            server = PrometheusExporter(metrics_port).start()
+            stack.callback(server.close)
+            logger.info("メトリクス公開: %s", server.address)
+        if profile:
+            profiler = SamplingProfiler()
+            profiler.start()
+            stack.callback(_save_profile, profiler, logfile.with_suffix(".profile.txt"), logger)
+        _run(base_dir, configs, list(config_paths), max_ocr_rate, logger, started_at, resume=not fresh, log_options=log_options)
+
+
+def _save_profile(profiler: SamplingProfiler, path: Path, logger: logging.Logger) -> None:
+    """プロファイラを止め、結果を保存して上位の関数をログに出す。"""
+    profiler.stop()
+    profiler.write_collapsed(path)
+    logger.info("プロファイル: %d サンプル, collapsed 形式で保存 %s", profiler.samples, path)
+    for func, self_count, total_count in profiler.top(15):
+        logger.info(" - %-50s 自己 %6d  累積 %6d", func, self_count, total_count)
 
-    # OCR サーバーヘルスチェック（/health が {"status": "ok"} を返すか）
-    if not check_ocr_health(config.ocr_api_endpoint, timeout=10.0):
-        logger.error("OCRサーバーが起動していません: %s", config.ocr_api_endpoint)
-        raise SystemExit(3)
 
+def _run(
+    base_dir: Path,
+    configs: list[AppConfig],
+    config_paths: list[Path],
+    max_ocr_rate: float,
+    logger: logging.Logger,
+    started_at: float,
+    *,
+    resume: bool = True,
+    log_options: LogOptions | None = None,
+) -> None:
+    # 自動操作まわり（requests・mss 等）は設定の読み込み後に読み込む
+    from automation import run_automation, start_concurrently
+    from sessions import OcrHealthError, SessionSpec, run_sessions, unique_session_names
+
+    if len(configs) > 1:
+        specs = [SessionSpec(name=name, config=config) for name, config in zip(unique_session_names(config_paths), configs)]
+        try:
+            results = run_sessions(base_dir, specs, logger, max_ocr_rate, resume=resume, log_options=log_options)
+        except OcrHealthError as e:
+            logger.error("%s", e)
+            raise SystemExit(3) from e
+        if any(r.error is not None for r in results):
+            raise SystemExit(1)
+        return
+
+    config = configs[0]
+    # OCR サーバーヘルスチェック（/health が {"status": "ok"} を返すか）の応答を待つ間に、
+    # ウィンドウの解決と最初のキャプチャを済ませておく
+    startup = start_concurrently(config, logger, started_at=started_at)
+    # OCR クライアントは接続プールを持つため、ヘルスチェックと本処理で使い回す
+    client = startup.client
     try:
-        run_automation(base_dir, config, logger)
-    except Exception as e:
-        logger.exception("実行中にエラーが発生しました: %s", e)
-        raise SystemExit(1) from e
+        if not startup.healthy:
+            logger.error("OCRサーバーが起動していません: %s", ", ".join(config.endpoints))
+            raise SystemExit(3)
+
+        try:
+            run_automation(base_dir, config, logger, client=client, startup=startup, resume=resume)
+        except Exception as e:
+            logger.exception("実行中にエラーが発生しました: %s", e)
+            raise SystemExit(1) from e
+    finally:
+        client.close()
+        startup.engine.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+"""ステップ文字列と OCR 結果の照合エンジン。
+
+:func:`ocr.find_matching_paragraph` は毎回すべての語を正規化し直し、完全な部分一致
+しか判定しない。:class:`StepMatcher` は次の点でこれを置き換える。
+
+- ステップ一覧は生成時に1度だけ正規化（コンパイル）する
+- 1フレームの語は :meth:`StepMatcher.prepare` で1度だけ正規化し、複数ステップの
+  照合で使い回す
+- OCR で取り違えやすい文字（「ー」と「一」など）を同一視する
+- 編集距離に上限を設けたあいまい部分一致（スコア = 1 - 距離 / ステップ文字数）
+- 認識スコア（``rec_score``）の低い語や、ヘッダー領域（ウィンドウ上端付近）の語を除外
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+from ocr import OcrParagraph
+from utils import normalize_text_for_matching
+
+# OCR で取り違えやすい文字を代表文字へ寄せる（照合時のみ。表示・ログには影響しない）
+_CONFUSABLE_GROUPS: tuple[tuple[str, str], ...] = (
+    ("ー", "一－-―—‐−ｰ"),
+    ("ロ", "口"),
+    ("カ", "力"),
+    ("エ", "工"),
+    ("ニ", "二"),
+    ("タ", "夕"),
+    ("ト", "卜"),
+    ("ハ", "八"),
+    ("ヘ", "へ"),
+    ("!", "！"),
+    ("?", "？"),
+    ("〜", "～~"),
+    ("・", "･"),
+)
+_CONFUSABLE_TRANSLATION: dict[int, int] = {ord(c): ord(rep) for rep, chars in _CONFUSABLE_GROUPS for c in chars}
+
+
+def fold_for_matching(text: str) -> str:
+    """名寄せ用正規化に加え、取り違えやすい文字を代表文字へ寄せる。"""
+    return normalize_text_for_matching(text).translate(_CONFUSABLE_TRANSLATION)
+
+
+def substring_edit_distance(pattern: str, text: str, max_distance: int) -> int | None:
+    """``text`` のいずれかの部分文字列と ``pattern`` の編集距離の最小値を返す。
+
+    ``max_distance`` を超えることが確定した時点で打ち切り、None を返す。
+    （Sellers のアルゴリズム: 部分文字列の開始位置を自由にした編集距離 DP）
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    if m - max_distance > len(text):
+        return None
+
+    prev = list(range(m + 1))
+    best = prev[m]
+    for ch in text:
+        # cur[0] = 0: 部分文字列はどの位置から始まってもよい
+        cur = [0] * (m + 1)
+        for i in range(1, m + 1):
+            cost = 0 if pattern[i - 1] == ch else 1
+            cur[i] = min(prev[i - 1] + cost, prev[i] + 1, cur[i - 1] + 1)
+        if cur[m] < best:
+            best = cur[m]
+            if best == 0:
+                return 0
+        prev = cur
+    return best if best <= max_distance else None
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """照合用に前処理したステップ。"""
+
+    text: str
+    folded: str
+    chars: Counter[str]
+    max_distance: int
+
+
+@dataclass(frozen=True)
+class PreparedWord:
+    """照合用に前処理した OCR の語。"""
+
+    paragraph: OcrParagraph
+    folded: str
+    chars: Counter[str]
+
+
+@dataclass(frozen=True)
+class MatchResult:
+    """照合結果。"""
+
+    paragraph: OcrParagraph
+    score: float
+
+
+class StepMatcher:
+    """ステップ一覧をコンパイルして OCR 結果と照合する。
+
+    Args:
+        steps: 照合対象のステップ文字列。未登録の文字列も :meth:`match` 時にコンパイルされる。
+        min_score: あいまい一致を採用する最低スコア（0..1）。1.0 なら完全な部分一致のみ。
+        min_rec_score: これ未満の認識スコアの語は照合しない（スコア不明の語は対象）。
+        ignore_top: 画像上端からこのピクセル数の範囲に収まる語（タイトルバー等）は照合しない。
+    """
+
+    def __init__(self, steps: Iterable[str] = (), *, min_score: float = 1.0, min_rec_score: float = 0.0, ignore_top: int = 0) -> None:
+        self.min_score = min(1.0, max(0.0, min_score))
+        self.min_rec_score = min_rec_score
+        self.ignore_top = ignore_top
+        self._compiled: dict[str, CompiledStep] = {}
+        for step in steps:
+            self.compile(step)
+
+    def compile(self, step: str) -> CompiledStep:
+        """ステップ文字列を前処理する（同じ文字列は1度だけ）。"""
+        compiled = self._compiled.get(step)
+        if compiled is None:
+            folded = fold_for_matching(step)
+            max_distance = int(len(folded) * (1.0 - self.min_score) + 1e-9)
+            compiled = CompiledStep(text=step, folded=folded, chars=Counter(folded), max_distance=max_distance)
+            self._compiled[step] = compiled
+        return compiled
+
+    def prepare(self, paragraphs: Sequence[OcrParagraph]) -> list[PreparedWord]:
+        """1フレーム分の語を除外判定・正規化する（フレームごとに1度だけ呼ぶ）。"""
+        out: list[PreparedWord] = []
+        for p in paragraphs:
+            if p.score is not None and p.score < self.min_rec_score:
+                continue
+            if self.ignore_top > 0 and p.box[3] <= self.ignore_top:
+                continue
+            folded = fold_for_matching(p.text)
+            out.append(PreparedWord(paragraph=p, folded=folded, chars=Counter(folded)))
+        return out
+
+    def match(self, step: str, words: Sequence[PreparedWord]) -> MatchResult | None:
+        """``step`` に一致する語を探す。
+
+        完全な部分一致があれば（OCR 順で）最初のものをスコア 1.0 で返す。
+        無ければ編集距離の上限内で最もスコアの高い語を返す。
+        """
+        compiled = self.compile(step)
+        target = compiled.folded
+        for w in words:
+            if target in w.folded:
+                return MatchResult(paragraph=w.paragraph, score=1.0)
+
+        k = compiled.max_distance
+        if k <= 0 or not target:
+            return None
+
+        best: MatchResult | None = None
+        best_distance = k + 1
+        for w in words:
+            # 文字の出現数による足切り: 共通文字が m - k 未満なら距離は k を超える
+            if len(w.folded) < len(target) - k:
+                continue
+            common = sum((compiled.chars & w.chars).values())
+            if common < len(target) - k:
+                continue
+            distance = substring_edit_distance(target, w.folded, min(k, best_distance - 1))
+            if distance is not None and distance < best_distance:
+                best_distance = distance
+                best = MatchResult(paragraph=w.paragraph, score=1.0 - distance / len(target))
+        return best
+
+    def match_many(self, steps: Sequence[str], words: Sequence[PreparedWord]) -> dict[str, MatchResult]:
+        """複数の ``step`` をまとめて照合し、一致したものだけを返す。
+
+        完全な部分一致は語を1度だけ走査して全 step を判定し、
+        見つからなかった step だけをあいまい一致で照合する。
+        """
+        targets = {step: self.compile(step).folded for step in dict.fromkeys(steps)}
+        found: dict[str, MatchResult] = {}
+        for w in words:
+            for step, target in targets.items():
+                if step not in found and target in w.folded:
+                    found[step] = MatchResult(paragraph=w.paragraph, score=1.0)
+            if len(found) == len(targets):
+                return found
+        for step in targets:
+            if step not in found:
+                hit = self.match(step, words)
+                if hit is not None:
+                    found[step] = hit
+        return found
+
+    def match_paragraphs(self, step: str, paragraphs: Sequence[OcrParagraph]) -> MatchResult | None:
+        """:meth:`prepare` と :meth:`match` をまとめて行う（1ステップだけ照合する場合）。"""
+        return self.match(step, self.prepare(paragraphs))
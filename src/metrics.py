@@ -0,0 +1,302 @@
+"""処理段ごとの所要時間の計測と出力。
+
+自動操作ループの各段（ウィンドウ取得・キャプチャ・エンコード・OCR・照合・クリック・待機など）
+を :meth:`MetricsRegistry.span` で囲み、``time.perf_counter`` による高分解能の所要時間を
+段ごとのヒストグラムに集計する。
+
+- 集計はプロセス全体で1つの :data:`REGISTRY` に行い、セッション名などはラベルで区別する
+- :class:`JsonlMetricsExporter`: 一定間隔でスナップショットを JSON Lines ファイルに追記する
+- :class:`PrometheusExporter`: ``/metrics`` で Prometheus テキスト形式を返すローカル HTTP サーバー
+- :meth:`MetricsRegistry.summary_lines`: 終了時にログへ出す p50 / p95 / p99 の要約
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Generator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# Prometheus 形式のヒストグラムのバケット上限（秒）
+DEFAULT_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 段の所要時間のメトリクス名（ラベル stage で段を区別する）
+STAGE_METRIC = "stage_seconds"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels_key(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+@dataclass
+class Histogram:
+    """所要時間（秒）の分布。
+
+    累積バケット（Prometheus 出力用）と、直近 ``window`` 件のサンプル（パーセンタイル用）を持つ。
+    """
+
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    window: int = 2048
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    bucket_counts: list[int] = field(default_factory=list)
+    samples: deque[float] = field(default_factory=deque)
+
+    def __post_init__(self) -> None:
+        if not self.bucket_counts:
+            self.bucket_counts = [0] * len(self.buckets)
+        self.samples = deque(self.samples, maxlen=self.window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, q: float) -> float | None:
+        """直近サンプルの ``q`` パーセンタイル（0..100）。サンプルが無ければ None。"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class MetricsRegistry:
+    """ラベル付きのヒストグラムとカウンタを保持する（スレッドセーフ）。"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """``name`` のヒストグラムに値（秒）を1つ記録する。"""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets=self.buckets)
+            hist.observe(value)
+
+    def incr(self, name: str, amount: float = 1, **labels: str) -> None:
+        """``name`` のカウンタを増やす。"""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, stage: str, **labels: str) -> Generator[None]:
+        """囲んだ処理の所要時間を段 ``stage`` として記録する（例外時も記録する）。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_METRIC, time.perf_counter() - started, stage=stage, **labels)
+
+    def bind(self, **labels: str) -> BoundMetrics:
+        """固定のラベル（セッション名など）を付けて記録するビューを返す。"""
+        return BoundMetrics(self, labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """JSON に変換できる形の集計値を返す。"""
+        with self._lock:
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.total,
+                    "max": h.max,
+                    "p50": h.percentile(50),
+                    "p95": h.percentile(95),
+                    "p99": h.percentile(99),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": v} for (name, labels), v in sorted(self._counters.items())]
+        return {"time": time.time(), "histograms": histograms, "counters": counters}
+
+    def render_prometheus(self, prefix: str = "adv_") -> str:
+        """Prometheus のテキスト形式（exposition format 0.0.4）で出力する。"""
+        lines: list[str] = []
+        with self._lock:
+            hist_names = sorted({name for name, _ in self._histograms})
+            for name in hist_names:
+                metric = f"{prefix}{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for (n, labels), h in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for le, c in zip(h.buckets, h.bucket_counts):
+                        cumulative += c
+                        lines.append(f"{metric}_bucket{_format_labels(labels, le=_format_float(le))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {h.count}")
+                    lines.append(f"{metric}_sum{_format_labels(labels)} {h.total:.9f}")
+                    lines.append(f"{metric}_count{_format_labels(labels)} {h.count}")
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                metric = f"{prefix}{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (n, labels), v in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f"{metric}{_format_labels(labels)} {_format_float(v)}")
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self, name: str = STAGE_METRIC, **labels: str) -> list[str]:
+        """``labels`` に合致するヒストグラムの件数・平均・p50 / p95 / p99 を1行ずつ返す。"""
+        want = set(_labels_key(labels))
+        out: list[str] = []
+        with self._lock:
+            for (n, key), h in sorted(self._histograms.items()):
+                if n != name or not want.issubset(key) or not h.count:
+                    continue
+                rest = ", ".join(f"{k}={v}" for k, v in key if (k, v) not in want)
+                out.append(f"{rest}: {h.count} 回, 平均 {h.total / h.count * 1000:.2f} ms, p50 {(h.percentile(50) or 0.0) * 1000:.2f} ms, p95 {(h.percentile(95) or 0.0) * 1000:.2f} ms, p99 {(h.percentile(99) or 0.0) * 1000:.2f} ms, 最大 {h.max * 1000:.2f} ms")
+        return out
+
+
+class BoundMetrics:
+    """固定ラベル付きで :class:`MetricsRegistry` に記録するビュー。"""
+
+    def __init__(self, registry: MetricsRegistry, labels: dict[str, str]) -> None:
+        self.registry = registry
+        self.labels = labels
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self.registry.observe(name, value, **self.labels, **labels)
+
+    def incr(self, name: str, amount: float = 1, **labels: str) -> None:
+        self.registry.incr(name, amount, **self.labels, **labels)
+
+    def span(self, stage: str, **labels: str) -> AbstractContextManager[None]:
+        return self.registry.span(stage, **self.labels, **labels)
+
+    def summary_lines(self) -> list[str]:
+        return self.registry.summary_lines(**self.labels)
+
+
+def _format_float(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in items)
+    return "{" + escaped + "}"
+
+
+# プロセス全体の集計先
+REGISTRY = MetricsRegistry()
+
+
+class JsonlMetricsExporter:
+    """一定間隔で :meth:`MetricsRegistry.snapshot` を JSON Lines ファイルに追記する。
+
+    Args:
+        path: 出力先ファイル。
+        interval: 書き出し間隔（秒）。
+        registry: 集計元。
+        logger: ロガー。
+    """
+
+    def __init__(self, path: Path, interval: float = 10.0, registry: MetricsRegistry = REGISTRY, logger: logging.Logger | None = None) -> None:
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-jsonl", daemon=True)
+
+    def start(self) -> JsonlMetricsExporter:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """スレッドを止め、最後のスナップショットを書き出す。"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self._write()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self) -> None:
+        try:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(self.registry.snapshot(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.logger.warning("メトリクスの書き出しに失敗: %s (%s)", self.path, e)
+
+
+class PrometheusExporter:
+    """``http://{host}:{port}/metrics`` で Prometheus テキスト形式を返す HTTP サーバー。
+
+    Args:
+        port: 待ち受けポート（0 で空きポート）。
+        host: 待ち受けアドレス（既定はローカルのみ）。
+        registry: 集計元。
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> None:
+        # 遅延インポート（http.server は email / ssl 等を読み込み重いため、公開する場合のみ）
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.registry = registry
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> PrometheusExporter:
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,305 @@
+"""複数の切り出し画像を1枚のモザイク画像にまとめて OCR する（バッチ化）。
+
+OCR 要求1回ごとに HTTP・サーバー側のスケジューリング等の固定費がかかるため、同時に
+OCR 待ちになった画像（複数セッションのフレーム、1ウィンドウの複数の ROI）を余白を挟んで
+敷き詰め、``/analyze`` を1回だけ呼ぶ。返ってきた語は矩形の中心がどの画像の配置範囲に
+あるかで元の画像へ振り分け、元の画像内の座標へ戻す。
+
+:class:`MosaicBatcher` は呼び出し元のスレッドをまとめ役と待ち役に分ける。バッチを開いた
+スレッドが、参加者全員の画像が揃うか ``max_delay`` 秒経つかモザイクが一杯になるまで待って
+送信し、待っていたスレッドにそれぞれの結果を渡す。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from capture import CapturedFrame
+from encode import EncodedImage, EncodeOptions, encode_frame, scale_paragraphs
+from ocr import OcrParagraph, OcrService
+from ocr_result import parse_ocr_result
+from roi import Box
+
+
+@dataclass(frozen=True)
+class Placement:
+    """モザイク内の1画像の配置（モザイク座標）。"""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+    @property
+    def box(self) -> Box:
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+
+class MosaicLayout:
+    """画像を左から右へ、行があふれたら次の行へ並べる（棚詰め）。
+
+    Args:
+        max_width: モザイクの幅の上限。
+        max_height: モザイクの高さの上限。
+        padding: 画像どうし・外周の余白（ピクセル）。語が隣の画像とつながらないようにする。
+    """
+
+    def __init__(self, max_width: int, max_height: int, padding: int) -> None:
+        self.max_width = max_width
+        self.max_height = max_height
+        self.padding = max(0, padding)
+        self.placements: list[Placement] = []
+        self.width = 0
+        self.height = 0
+        self._x = self.padding
+        self._y = self.padding
+        self._row_height = 0
+
+    def __len__(self) -> int:
+        return len(self.placements)
+
+    def fits(self, width: int, height: int) -> bool:
+        """次の画像を置けるか（空のレイアウトには大きさによらず1枚は置ける）。"""
+        return self._place(width, height) is not None or not self.placements
+
+    def add(self, width: int, height: int) -> Placement:
+        """次の画像を置き、その配置を返す。"""
+        pos = self._place(width, height)
+        if pos is None:
+            if self.placements:
+                raise ValueError("モザイクに収まりません")
+            # 上限より大きい画像は単独で置く
+            pos = (self.padding, self.padding, False)
+        x, y, new_row = pos
+        if new_row:
+            self._y = y
+            self._row_height = 0
+        placement = Placement(x, y, width, height)
+        self.placements.append(placement)
+        self._x = x + width + self.padding
+        self._row_height = max(self._row_height, height)
+        self.width = max(self.width, self._x)
+        self.height = max(self.height, y + height + self.padding)
+        return placement
+
+    def _place(self, width: int, height: int) -> tuple[int, int, bool] | None:
+        p = self.padding
+        if self._x + width + p <= self.max_width and self._y + height + p <= self.max_height:
+            return self._x, self._y, False
+        y = self._y + self._row_height + p
+        if self._row_height and p + width + p <= self.max_width and y + height + p <= self.max_height:
+            return p, y, True
+        return None
+
+
+def compose(frames: Sequence[CapturedFrame], layout: MosaicLayout) -> CapturedFrame:
+    """``layout`` の配置（``frames`` と同じ順）どおりに画像を敷き詰めたモザイクを作る（余白は黒）。"""
+    width, height = layout.width, layout.height
+    canvas = bytearray(width * height * 3)
+    stride = width * 3
+    for frame, placement in zip(frames, layout.placements, strict=True):
+        row = frame.width * 3
+        rgb = frame.rgb
+        base = placement.y * stride + placement.x * 3
+        for y in range(frame.height):
+            canvas[base + y * stride : base + y * stride + row] = rgb[y * row : (y + 1) * row]
+    return CapturedFrame(rgb=bytes(canvas), width=width, height=height)
+
+
+def split(paragraphs: Sequence[OcrParagraph], placements: Sequence[Placement]) -> tuple[list[list[OcrParagraph]], int]:
+    """モザイク座標の語を、矩形の中心を含む配置の画像へ振り分けて画像内座標へ戻す。
+
+    Returns:
+        画像ごとの語の列と、どの画像にも属さなかった（余白上の）語の数。
+    """
+    out: list[list[OcrParagraph]] = [[] for _ in placements]
+    orphans = 0
+    for p in paragraphs:
+        cx, cy = (p.box[0] + p.box[2]) / 2, (p.box[1] + p.box[3]) / 2
+        for i, pl in enumerate(placements):
+            if pl.x <= cx < pl.x + pl.width and pl.y <= cy < pl.y + pl.height:
+                box = (
+                    max(0, p.box[0] - pl.x),
+                    max(0, p.box[1] - pl.y),
+                    min(pl.width, p.box[2] - pl.x),
+                    min(pl.height, p.box[3] - pl.y),
+                )
+                out[i].append(OcrParagraph(text=p.text, box=box, score=p.score))
+                break
+        else:
+            orphans += 1
+    return out, orphans
+
+
+@dataclass(frozen=True)
+class MosaicPart:
+    """モザイクで OCR した1画像分の結果。
+
+    Attributes:
+        paragraphs: 元の画像内座標の語。
+        encoded: 送信したモザイク画像（同じバッチの画像で共通）。
+        data: OCR 応答（同じバッチの画像で共通。座標はモザイク座標）。
+        placement: モザイク内の配置。
+        batch_size: 同じ要求で送った画像の数。
+    """
+
+    paragraphs: list[OcrParagraph]
+    encoded: EncodedImage
+    data: dict
+    placement: Placement
+    batch_size: int
+
+
+def analyze_mosaic(client: OcrService, frames: Sequence[CapturedFrame], layout: MosaicLayout, options: EncodeOptions) -> tuple[list[MosaicPart], int]:
+    """``layout`` どおりに並べたモザイクを1回の要求で OCR する。
+
+    Returns:
+        画像ごとの結果（``frames`` と同じ順）と、どの画像にも属さなかった語の数。
+    """
+    mosaic = compose(frames, layout)
+    encoded = encode_frame(mosaic, options)
+    data = client.analyze(encoded.data, filename=encoded.filename, content_type=encoded.content_type)
+    paragraphs = scale_paragraphs(parse_ocr_result(data), encoded.scale_x, encoded.scale_y)
+    per_image, orphans = split(paragraphs, layout.placements)
+    return [MosaicPart(words, encoded, data, placement, len(frames)) for words, placement in zip(per_image, layout.placements, strict=True)], orphans
+
+
+@dataclass
+class MosaicStats:
+    """:class:`MosaicBatcher` の集計値。"""
+
+    requests: int = 0
+    images: int = 0
+    orphans: int = 0
+
+    @property
+    def saved(self) -> int:
+        """まとめたことで省いた OCR 要求の数。"""
+        return self.images - self.requests
+
+
+@dataclass
+class _Batch:
+    layout: MosaicLayout
+    deadline: float
+    frames: list[CapturedFrame] = field(default_factory=list)
+    callers: int = 0
+    closed: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+    parts: list[MosaicPart] = field(default_factory=list)
+    error: BaseException | None = None
+
+
+class MosaicBatcher:
+    """同時に OCR 待ちになった画像をモザイクにまとめて送る（スレッドセーフ）。
+
+    Args:
+        client: OCR 送信口。
+        options: モザイク画像のエンコード設定。
+        max_delay: バッチを開いてから、他の参加者の画像を待つ最大秒数。
+        max_size: モザイクの (幅, 高さ) の上限。
+        padding: 画像どうしの余白（ピクセル）。
+        logger: ロガー。
+    """
+
+    def __init__(
+        self,
+        client: OcrService,
+        options: EncodeOptions | None = None,
+        *,
+        max_delay: float = 0.05,
+        max_size: tuple[int, int] = (2048, 2048),
+        padding: int = 16,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.client = client
+        self.options = options or EncodeOptions()
+        self.max_delay = max(0.0, max_delay)
+        self.max_size = max_size
+        self.padding = padding
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = MosaicStats()
+        self._cond = threading.Condition()
+        self._participants = 0
+        self._open: _Batch | None = None
+
+    def register(self) -> None:
+        """参加者（画像を送ってくるセッション）を1つ増やす。"""
+        with self._cond:
+            self._participants += 1
+
+    def unregister(self) -> None:
+        """参加者を1つ減らす（残りの参加者の画像が揃っていれば待たずに送る）。"""
+        with self._cond:
+            self._participants = max(0, self._participants - 1)
+            batch = self._open
+            if batch is not None and batch.callers >= self._participants:
+                batch.closed = True
+                self._cond.notify_all()
+
+    def recognize(self, frames: Sequence[CapturedFrame]) -> list[MosaicPart]:
+        """``frames`` を他の参加者の画像とまとめて OCR し、画像ごとの結果を返す。
+
+        Raises:
+            Exception: OCR 送信口の例外（同じバッチの全員に同じ例外を送出する）。
+        """
+        if not frames:
+            return []
+        indices: list[int] = []
+        with self._cond:
+            batch = self._open
+            is_leader = batch is None or batch.closed or not batch.layout.fits(frames[0].width, frames[0].height)
+            if is_leader:
+                if batch is not None:
+                    # 入りきらないバッチは締め切って送らせる
+                    batch.closed = True
+                    self._cond.notify_all()
+                batch = self._open = _Batch(MosaicLayout(self.max_size[0], self.max_size[1], self.padding), time.monotonic() + self.max_delay)
+            assert batch is not None
+            for frame in frames:
+                # 1回の呼び出しの画像のうち入りきらなかった分は、このバッチの結果を待ってから別に送る
+                if indices and not batch.layout.fits(frame.width, frame.height):
+                    break
+                batch.layout.add(frame.width, frame.height)
+                batch.frames.append(frame)
+                indices.append(len(batch.frames) - 1)
+            batch.callers += 1
+            if len(indices) < len(frames) or batch.callers >= max(1, self._participants):
+                batch.closed = True
+                self._cond.notify_all()
+            mine = batch
+        if is_leader:
+            self._send_when_ready(mine)
+        mine.done.wait()
+        if mine.error is not None:
+            raise mine.error
+        parts = [mine.parts[i] for i in indices]
+        if len(parts) < len(frames):
+            parts.extend(self.recognize(frames[len(parts) :]))
+        return parts
+
+    def _send_when_ready(self, batch: _Batch) -> None:
+        with self._cond:
+            while not batch.closed:
+                remaining = batch.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch.closed = True
+            if self._open is batch:
+                self._open = None
+        try:
+            batch.parts, orphans = analyze_mosaic(self.client, batch.frames, batch.layout, self.options)
+            with self._cond:
+                self.stats.requests += 1
+                self.stats.images += len(batch.frames)
+                self.stats.orphans += orphans
+            self.logger.debug("モザイク OCR: %d 枚を %dx%d にまとめて送信（余白上の語 %d 件）", len(batch.frames), batch.layout.width, batch.layout.height, orphans)
+        except BaseException as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -2,15 +2,29 @@
 
 from __future__ import annotations
 
-from collections.abc import Sequence
-from dataclasses import dataclass
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
-
-import requests
+from typing import TYPE_CHECKING, Any, Protocol
 
+from metrics import REGISTRY, STAGE_METRIC
 from utils import normalize_text_for_matching
 
+# requests の読み込みは重い（urllib3 / certifi を含め 0.1 秒程度）ため、起動を速くするよう
+# 実際に通信する関数・クライアントの生成時まで遅らせる
+if TYPE_CHECKING:
+    import requests
+
 
 @dataclass(frozen=True)
 class OcrParagraph:
@@ -18,6 +32,32 @@ class OcrParagraph:
 
     text: str
     box: tuple[int, int, int, int]  # x1, y1, x2, y2（画像内座標）
+    score: float | None = None  # 認識スコア（rec_score）。不明なら None
+
+
+def _load_orjson() -> Callable[[bytes], Any] | None:
+    """orjson（任意依存。標準の json より速い）があればその ``loads`` を返す。"""
+    if importlib.util.find_spec("orjson") is None:
+        return None
+    import orjson  # type: ignore
+
+    return orjson.loads
+
+
+_ORJSON_LOADS = _load_orjson()
+
+
+def decode_json(resp: requests.Response) -> Any:
+    """応答本文を JSON として読む（orjson があれば使う）。
+
+    不正な JSON の場合は ``resp.json()`` と同じ例外（``requests.JSONDecodeError``）を送出する。
+    """
+    if _ORJSON_LOADS is None:
+        return resp.json()
+    try:
+        return _ORJSON_LOADS(resp.content)
+    except ValueError:
+        return resp.json()
 
 
 def _normalize_base(endpoint: str) -> str:
@@ -38,12 +78,36 @@ def call_ocr_api(base_endpoint: str, image_path: Path, timeout: float = 30.0) ->
     Returns:
         JSON辞書。
     """
+    return call_ocr_api_bytes(base_endpoint, image_path.read_bytes(), filename=image_path.name, timeout=timeout)
+
+
+def call_ocr_api_bytes(
+    base_endpoint: str,
+    image: bytes | memoryview,
+    filename: str = "capture.png",
+    content_type: str = "image/png",
+    timeout: float = 30.0,
+) -> dict:
+    """メモリ上のエンコード済み画像で OCR API を呼び出し、JSONを辞書で返す。
+
+    ディスクを経由せず、バッファをそのまま multipart の本文に載せる。
+
+    Args:
+        base_endpoint: 例 ``http://deep01.local:3200``。
+        image: エンコード済み画像のバイト列。
+        filename: multipart に付与するファイル名。
+        content_type: 画像の MIME タイプ。
+        timeout: タイムアウト秒。
+
+    Returns:
+        JSON辞書。
+    """
+    import requests
+
     url = f"{_normalize_base(base_endpoint)}/analyze?format=json"
-    with image_path.open("rb") as f:
-        files = {"file": (image_path.name, f, "image/png")}
-        resp = requests.post(url, files=files, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
+    resp = requests.post(url, files={"file": (filename, image, content_type)}, timeout=timeout)
+    resp.raise_for_status()
+    return decode_json(resp)
 
 
 def check_ocr_health(base_endpoint: str, timeout: float = 10.0) -> bool:
@@ -51,6 +115,8 @@ def check_ocr_health(base_endpoint: str, timeout: float = 10.0) -> bool:
 
     ネットワーク例外やJSON不正、ステータス不一致はいずれも False を返す。
     """
+    import requests
+
     url = f"{_normalize_base(base_endpoint)}/health"
     try:
         resp = requests.get(url, timeout=timeout)
@@ -61,6 +127,285 @@ def check_ocr_health(base_endpoint: str, timeout: float = 10.0) -> bool:
     return isinstance(data, dict) and data.get("status") == "ok"
 
 
+class OcrUnavailableError(RuntimeError):
+    """サーキットブレーカーが開いており OCR サーバーへ送信しなかったことを表す。"""
+
+
+# リトライしても結果が変わらないため即座に失敗とする HTTP ステータス
+_NON_RETRYABLE_STATUS = frozenset({400, 401, 403, 404, 405, 413, 415, 422})
+
+
+def is_non_retryable(error: BaseException) -> bool:
+    """リトライや別エンドポイントへの再送をしても結果が変わらない失敗（クライアントエラー）か。"""
+    import requests
+
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code in _NON_RETRYABLE_STATUS
+
+
+@dataclass
+class LatencyStats:
+    """OCR リクエストのレイテンシ統計（秒）。直近 ``window`` 件からパーセンタイルを算出する。"""
+
+    window: int = 256
+    count: int = 0
+    failures: int = 0
+    retries: int = 0
+    total: float = 0.0
+    last: float | None = None
+    samples: deque[float] = field(default_factory=deque)
+
+    def record(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.last = elapsed
+        self.samples.append(elapsed)
+        while len(self.samples) > self.window:
+            self.samples.popleft()
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q: float) -> float | None:
+        """直近サンプルの ``q`` パーセンタイル（0..100）。サンプルが無ければ None。"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class OcrService(Protocol):
+    """自動操作ループが使う OCR 送信口（:class:`OcrClient` / ``OcrRouter``）。"""
+
+    stats: LatencyStats
+
+    @property
+    def is_available(self) -> bool: ...
+
+    def wait_until_available(self, timeout: float) -> bool: ...
+
+    def analyze(self, image: bytes | memoryview, filename: str = "capture.png", content_type: str = "image/png") -> dict: ...
+
+    def health(self, timeout: float | None = None) -> bool: ...
+
+    def close(self) -> None: ...
+
+
+def _server_time(headers: Mapping[str, str]) -> float | None:
+    """``Server-Timing``（``dur`` はミリ秒）または ``X-Process-Time``（秒）からサーバー処理時間を得る。"""
+    timing = headers.get("Server-Timing")
+    if timing:
+        total = 0.0
+        found = False
+        for metric in timing.split(","):
+            for param in metric.split(";")[1:]:
+                key, _, value = param.strip().partition("=")
+                if key == "dur":
+                    try:
+                        total += float(value) / 1000
+                        found = True
+                    except ValueError:
+                        pass
+        if found:
+            return total
+    process = headers.get("X-Process-Time")
+    if process:
+        try:
+            return float(process)
+        except ValueError:
+            return None
+    return None
+
+
+class OcrClient:
+    """接続プール・リトライ・サーキットブレーカー付きの OCR API クライアント。
+
+    - ``requests.Session`` を使い回し、keep-alive 接続をプールする
+    - 接続/読み取りタイムアウトを個別に指定できる
+    - 失敗時はジッター付き指数バックオフでリトライする
+    - 連続失敗が ``failure_threshold`` に達するとブレーカーを開き、以後の送信は
+      :class:`OcrUnavailableError` で即座に失敗させる。開いている間はバックグラウンドで
+      ``/health`` を定期的に確認し、復旧したら自動で閉じる。連続失敗に数えるのは通信エラーと
+      5xx だけで、画像が受け付けられなかったクライアントエラー（400 / 413 など）は数えない
+    - 成功したリクエストのレイテンシを :attr:`stats` に記録する
+
+    Args:
+        base_endpoint: OCR API のベースURL。
+        connect_timeout: 接続タイムアウト秒。
+        read_timeout: 読み取りタイムアウト秒。
+        max_retries: 1リクエストあたりの最大リトライ回数。
+        backoff_base: バックオフの初期待ち秒。
+        backoff_max: バックオフの最大待ち秒。
+        failure_threshold: ブレーカーを開く連続失敗回数。
+        probe_interval: ブレーカーが開いている間の ``/health`` 確認間隔（秒）。
+        pool_size: 接続プールの最大接続数。
+        logger: ロガー。
+    """
+
+    def __init__(
+        self,
+        base_endpoint: str,
+        *,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        failure_threshold: int = 3,
+        probe_interval: float = 2.0,
+        pool_size: int = 4,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.base_endpoint = _normalize_base(base_endpoint)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = LatencyStats()
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._available = threading.Event()
+        self._available.set()
+        self._closed = threading.Event()
+        self._probe_thread: threading.Thread | None = None
+
+    # --- 公開API -------------------------------------------------------
+
+    @property
+    def is_available(self) -> bool:
+        """ブレーカーが閉じている（送信可能）か。"""
+        return self._available.is_set()
+
+    def wait_until_available(self, timeout: float) -> bool:
+        """ブレーカーが閉じるまで最大 ``timeout`` 秒待つ。閉じていれば即座に True。"""
+        return self._available.wait(timeout)
+
+    def analyze(self, image: bytes | memoryview, filename: str = "capture.png", content_type: str = "image/png") -> dict:
+        """エンコード済み画像を ``/analyze?format=json`` へ送り、JSONを辞書で返す。
+
+        Raises:
+            OcrUnavailableError: ブレーカーが開いている場合。
+            requests.RequestException: リトライを使い切っても失敗した場合。
+        """
+        url = f"{self.base_endpoint}/analyze?format=json"
+        return self._request_with_retry(lambda: self._session.post(url, files={"file": (filename, image, content_type)}, timeout=self.timeout))
+
+    def analyze_path(self, image_path: Path) -> dict:
+        """画像ファイルを読み込んで :meth:`analyze` する。"""
+        return self.analyze(image_path.read_bytes(), filename=image_path.name)
+
+    def health(self, timeout: float | None = None) -> bool:
+        """``/health`` が ``{"status": "ok"}`` を返すか判定する（例外は False）。"""
+        url = f"{self.base_endpoint}/health"
+        try:
+            resp = self._session.get(url, timeout=timeout if timeout is not None else self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception:
+            return False
+        return isinstance(data, dict) and data.get("status") == "ok"
+
+    def close(self) -> None:
+        """プローブスレッドを止め、接続プールを閉じる。"""
+        self._closed.set()
+        if self._probe_thread is not None:
+            self._probe_thread.join(self.probe_interval + 1.0)
+        self._session.close()
+
+    # --- 内部処理 -------------------------------------------------------
+
+    def _request_with_retry(self, send: Callable[[], requests.Response]) -> dict:
+        import requests
+
+        if not self._available.is_set():
+            raise OcrUnavailableError(f"OCR サーバー停止中のため送信を見送りました: {self.base_endpoint}")
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                resp = send()
+                resp.raise_for_status()
+                data = decode_json(resp)
+            except requests.RequestException as e:
+                if is_non_retryable(e):
+                    # サーバーは応答している: 失敗には数えるが、ブレーカーは開かない
+                    self._record_failure(breaker=False)
+                    raise
+                if attempt >= self.max_retries:
+                    self._record_failure()
+                    raise
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                with self._lock:
+                    self.stats.retries += 1
+                self.logger.warning("OCR リクエスト失敗、%.2f 秒後にリトライ (%d/%d): %s", delay, attempt, self.max_retries, e)
+                time.sleep(delay)
+                continue
+
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._consecutive_failures = 0
+                self.stats.record(elapsed)
+            self._record_timing(resp, elapsed)
+            return data
+
+    def _record_timing(self, resp: requests.Response, elapsed: float) -> None:
+        """レスポンス1件の所要時間を段ごとに記録する。
+
+        - ``ocr_ttfb``: 送信開始からレスポンスヘッダー受信まで（アップロード + サーバー処理）
+        - ``ocr_download``: ヘッダー受信後、本文の受信と JSON 解析まで
+        - ``ocr_server``: サーバーが ``Server-Timing`` / ``X-Process-Time`` を返す場合のみ、その処理時間
+        """
+        ttfb = resp.elapsed.total_seconds()
+        REGISTRY.observe(STAGE_METRIC, ttfb, stage="ocr_ttfb", endpoint=self.base_endpoint)
+        REGISTRY.observe(STAGE_METRIC, max(0.0, elapsed - ttfb), stage="ocr_download", endpoint=self.base_endpoint)
+        server = _server_time(resp.headers)
+        if server is not None:
+            REGISTRY.observe(STAGE_METRIC, server, stage="ocr_server", endpoint=self.base_endpoint)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """ジッター付き指数バックオフ（上限の半分〜上限の一様乱数）。"""
+        cap = min(self.backoff_max, self.backoff_base * (2**attempt))
+        return random.uniform(cap / 2, cap)
+
+    def _record_failure(self, breaker: bool = True) -> None:
+        with self._lock:
+            self.stats.failures += 1
+            if not breaker:
+                return
+            self._consecutive_failures += 1
+            trip = self._consecutive_failures >= self.failure_threshold and self._available.is_set()
+            if trip:
+                self._available.clear()
+        if trip:
+            self.logger.error("OCR サーバーへの連続失敗 %d 回: ブレーカーを開き /health を監視します", self.failure_threshold)
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="ocr-health-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while not self._closed.wait(self.probe_interval):
+            if self.health():
+                with self._lock:
+                    self._consecutive_failures = 0
+                self._available.set()
+                self.logger.info("OCR サーバーの復旧を確認しました: %s", self.base_endpoint)
+                return
+
+
 def _as_box(points_or_box: Any) -> tuple[int, int, int, int] | None:
     """``points`` もしくは ``box`` を汎用的に [x1,y1,x2,y2] へ変換する。
 
@@ -111,7 +456,8 @@ def extract_paragraphs(data: dict) -> list[OcrParagraph]:
             box = _as_box(box_raw)
             if not text or not box:
                 continue
-            out.append(OcrParagraph(text=text, box=box))
+            rec_score = w.get("rec_score")
+            out.append(OcrParagraph(text=text, box=box, score=float(rec_score) if isinstance(rec_score, (int, float)) else None))
 
     return out
 
@@ -131,3 +477,162 @@ def find_matching_paragraph(step_text: str, paragraphs: Sequence[OcrParagraph])
         if target in candidate:
             return p
     return None
+
+
+@dataclass
+class CacheStats:
+    """OCR 結果キャッシュの集計値。"""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    dropped: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class OcrResultCache:
+    """画像内容のハッシュをキーにした ``extract_paragraphs`` 結果のキャッシュ。
+
+    メモリ上の LRU（``max_entries`` 件まで）と、再起動後も残るディスク上の
+    JSON ストア（``cache_dir``）の2段構成。メモリで外れた場合はディスクを参照し、
+    見つかればメモリへ昇格させる。
+
+    ディスクへの書き込みはバックグラウンドスレッドで行い、:meth:`put` はキューに積むだけで
+    待たない。キューが満杯の場合はその結果の保存を諦める（OCR 段を止めないことを優先）。
+
+    Args:
+        max_entries: メモリ LRU の最大件数。0 以下でメモリ層を無効化。
+        cache_dir: ディスク層の保存先。None でディスク層を無効化。
+        logger: ロガー。
+        max_pending: ディスクへの書き込み待ちキューの上限。
+    """
+
+    def __init__(self, max_entries: int, cache_dir: Path | None = None, logger: logging.Logger | None = None, max_pending: int = 64) -> None:
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, Sequence[OcrParagraph]] = OrderedDict()
+        self._pending: queue.Queue[tuple[str, Sequence[OcrParagraph]] | None] = queue.Queue(maxsize=max_pending)
+        self._writer: threading.Thread | None = None
+        if cache_dir is not None:
+            self._writer = threading.Thread(target=self._write_loop, name="ocr-cache-writer", daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def key_for(image: bytes | memoryview, size: tuple[int, int] | None = None, variant: str = "") -> str:
+        """画像バイト列（エンコード済み、または生画素 + サイズ）からキャッシュキーを作る。
+
+        Args:
+            image: 画像バイト列。
+            size: 生画素の場合はその (幅, 高さ)。
+            variant: 同じ画素でも結果（語・座標）が変わりうる条件（送信画像の設定・切り出し範囲など）。
+        """
+        h = hashlib.blake2b(digest_size=20)
+        if size is not None:
+            h.update(f"{size[0]}x{size[1]}:".encode())
+        if variant:
+            h.update(f"{variant}:".encode())
+        h.update(image)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Sequence[OcrParagraph] | None:
+        """キャッシュを引く。見つからなければ None。"""
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return hit
+
+        loaded = self._load_from_disk(key)
+        with self._lock:
+            if loaded is None:
+                self.stats.misses += 1
+                return None
+            self.stats.disk_hits += 1
+            self._put_memory(key, loaded)
+        return loaded
+
+    def put(self, key: str, paragraphs: Sequence[OcrParagraph]) -> None:
+        """結果をメモリ層へ保存し、ディスク層への書き込みを依頼する（書き込みは待たない）。"""
+        with self._lock:
+            self.stats.stores += 1
+            self._put_memory(key, paragraphs)
+        if self._writer is None:
+            return
+        try:
+            self._pending.put_nowait((key, paragraphs))
+        except queue.Full:
+            with self._lock:
+                self.stats.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """書き込み待ちの結果をディスクへ書き出してスレッドを終了する。"""
+        if self._writer is None:
+            return
+        self._pending.put(None)
+        self._writer.join(timeout)
+        self._writer = None
+
+    def _put_memory(self, key: str, paragraphs: Sequence[OcrParagraph]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = paragraphs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _disk_path(self, key: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_from_disk(self, key: str) -> list[OcrParagraph] | None:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            out: list[OcrParagraph] = []
+            for r in raw:
+                x1, y1, x2, y2 = (int(v) for v in r["box"][:4])
+                out.append(OcrParagraph(text=str(r["text"]), box=(x1, y1, x2, y2), score=r.get("score")))
+            return out
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning("OCR キャッシュの読み込みに失敗: %s (%s)", path, e)
+            return None
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            self._store_to_disk(*item)
+
+    def _store_to_disk(self, key: str, paragraphs: Sequence[OcrParagraph]) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        payload = json.dumps([{"text": p.text, "box": list(p.box), "score": p.score} for p in paragraphs], ensure_ascii=False)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            self.logger.warning("OCR キャッシュの保存に失敗: %s (%s)", path, e)
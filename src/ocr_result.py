@@ -0,0 +1,333 @@
+"""列指向の OCR 結果と、語の矩形の空間索引。
+
+:func:`ocr.extract_paragraphs` は語ごとに :class:`ocr.OcrParagraph` を作り、
+``rec_score`` 以外のスコアや段落構造（``paragraphs`` / ``figures[].paragraphs`` の
+``role`` など）を捨てていた。:class:`OcrResult` は語の属性を列ごとの配列で持ち、
+サーバーが返す段落（:class:`OcrBlocks`）も保持する。
+
+- 既存の呼び出し側向けに ``Sequence[OcrParagraph]`` として振る舞う（要素は初回参照時に作る）
+- :meth:`OcrResult.words_in` / :meth:`OcrResult.nearest` で「領域内の語」「点に最も近い語」を引ける
+  （:class:`SpatialIndex` は一様グリッドで、初回の問い合わせ時に作る）
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections.abc import Iterator, Sequence
+from typing import Any, overload
+
+from ocr import OcrParagraph, _as_box
+
+Box = tuple[int, int, int, int]
+
+# スコアが無い語の値（配列に None を入れられないため）
+_NAN = float("nan")
+
+
+def _score(v: Any) -> float:
+    return float(v) if isinstance(v, (int, float)) else _NAN
+
+
+def _fast_box(raw: Any) -> Box | None:
+    """``points``（4頂点）の外接矩形を速く求める。それ以外の形は :func:`ocr._as_box` に任せる。"""
+    if type(raw) is list and len(raw) == 4 and type(raw[0]) is list:
+        try:
+            (ax, ay, *_), (bx, by, *_), (cx, cy, *_), (dx, dy, *_) = raw
+            return int(min(ax, bx, cx, dx)), int(min(ay, by, cy, dy)), int(max(ax, bx, cx, dx)), int(max(ay, by, cy, dy))
+        except (TypeError, ValueError):
+            pass
+    return _as_box(raw)
+
+
+class OcrBlocks:
+    """サーバーが返した段落（``paragraphs`` と ``figures[].paragraphs``）の列。
+
+    Attributes:
+        texts: 段落の文字列。
+        x1, y1, x2, y2: 段落の矩形。
+        roles: 段落の役割（``page_header`` / ``section_headings`` など。無ければ None）。
+        orders: 読み順。
+        figures: 属する figure の番号（ページ直下の段落は -1）。
+        pages: ページ番号。
+    """
+
+    __slots__ = ("figures", "orders", "pages", "roles", "texts", "x1", "x2", "y1", "y2")
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.x1 = array("i")
+        self.y1 = array("i")
+        self.x2 = array("i")
+        self.y2 = array("i")
+        self.roles: list[str | None] = []
+        self.orders = array("i")
+        self.figures = array("i")
+        self.pages = array("i")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def box(self, i: int) -> Box:
+        return self.x1[i], self.y1[i], self.x2[i], self.y2[i]
+
+    def append(self, raw: dict, page: int, figure: int) -> None:
+        box = _as_box(raw.get("box") or raw.get("points"))
+        if box is None:
+            return
+        self.texts.append(str(raw.get("contents") or raw.get("content") or ""))
+        self.x1.append(box[0])
+        self.y1.append(box[1])
+        self.x2.append(box[2])
+        self.y2.append(box[3])
+        role = raw.get("role")
+        self.roles.append(str(role) if role else None)
+        order = raw.get("order")
+        self.orders.append(int(order) if isinstance(order, int) else -1)
+        self.figures.append(figure)
+        self.pages.append(page)
+
+
+class SpatialIndex:
+    """矩形の一様グリッド索引。
+
+    各矩形を重なるセルすべてに登録する。選択肢の語は画面内にまばらに並ぶため、
+    セルを語の高さ程度（既定 64 ピクセル）にすると1回の問い合わせで見るセルは数個で済む。
+
+    Args:
+        boxes: 矩形の列（添字がそのまま ID になる）。
+        cell: セルの一辺（ピクセル）。
+    """
+
+    def __init__(self, boxes: Sequence[Box], cell: int = 64) -> None:
+        self.cell = max(1, cell)
+        self.boxes = list(boxes)
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        c = self.cell
+        for i, (x1, y1, x2, y2) in enumerate(self.boxes):
+            for cy in range(y1 // c, max(y1, y2 - 1) // c + 1):
+                for cx in range(x1 // c, max(x1, x2 - 1) // c + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+        # 登録済みセルの範囲（nearest の探索の上限に使う）
+        xs = [cx for cx, _ in self._cells]
+        ys = [cy for _, cy in self._cells]
+        self._bounds = (min(xs), min(ys), max(xs), max(ys)) if self._cells else (0, 0, 0, 0)
+
+    def _candidates(self, box: Box) -> set[int]:
+        c = self.cell
+        out: set[int] = set()
+        for cy in range(box[1] // c, max(box[1], box[3] - 1) // c + 1):
+            for cx in range(box[0] // c, max(box[0], box[2] - 1) // c + 1):
+                out.update(self._cells.get((cx, cy), ()))
+        return out
+
+    def within(self, box: Box) -> list[int]:
+        """``box`` に完全に含まれる矩形の ID（昇順）。"""
+        x1, y1, x2, y2 = box
+        boxes = self.boxes
+        return sorted(i for i in self._candidates(box) if boxes[i][0] >= x1 and boxes[i][1] >= y1 and boxes[i][2] <= x2 and boxes[i][3] <= y2)
+
+    def intersecting(self, box: Box) -> list[int]:
+        """``box`` と重なる矩形の ID（昇順）。"""
+        x1, y1, x2, y2 = box
+        boxes = self.boxes
+        return sorted(i for i in self._candidates(box) if boxes[i][0] < x2 and boxes[i][2] > x1 and boxes[i][1] < y2 and boxes[i][3] > y1)
+
+    def nearest(self, x: float, y: float) -> int | None:
+        """点 ``(x, y)`` に最も近い矩形の ID（矩形の内側なら距離 0）。空なら None。
+
+        点を含むセルから同心の輪を広げ、見つかった最短距離より輪が遠くなったら打ち切る。
+        """
+        if not self.boxes:
+            return None
+        c = self.cell
+        px, py = int(x) // c, int(y) // c
+        bx1, by1, bx2, by2 = self._bounds
+        max_ring = max(px - bx1, bx2 - px, py - by1, by2 - py, 0)
+        best: tuple[float, int] | None = None
+        seen: set[int] = set()
+        for ring in range(max_ring + 1):
+            # 輪 ring のセルまでの最短距離が現在の最良より遠ければ、それ以上は見なくてよい
+            if best is not None and (ring - 1) * c > best[0]:
+                break
+            for cy in range(py - ring, py + ring + 1):
+                for cx in range(px - ring, px + ring + 1):
+                    if max(abs(cx - px), abs(cy - py)) != ring:
+                        continue
+                    for i in self._cells.get((cx, cy), ()):
+                        if i in seen:
+                            continue
+                        seen.add(i)
+                        b = self.boxes[i]
+                        key = (math.hypot(max(b[0] - x, 0, x - b[2]), max(b[1] - y, 0, y - b[3])), i)
+                        if best is None or key < best:
+                            best = key
+        return best[1] if best is not None else None
+
+
+class OcrResult(Sequence[OcrParagraph]):
+    """列指向の OCR 結果（語ごとの属性を並列の配列で持つ）。
+
+    ``Sequence[OcrParagraph]`` として扱えるので、``list[OcrParagraph]`` を受け取る既存の処理に
+    そのまま渡せる。
+
+    Attributes:
+        texts: 語の文字列。
+        x1, y1, x2, y2: 語の矩形（画像内座標）。
+        rec_scores: 認識スコア（無ければ NaN）。
+        det_scores: 検出スコア（無ければ NaN）。
+        directions: 文字の向き（``horizontal`` / ``vertical``。無ければ None）。
+        pages: ページ番号。
+        blocks: 段落。
+    """
+
+    __slots__ = ("_block_of", "_index", "_paragraphs", "blocks", "det_scores", "directions", "pages", "rec_scores", "texts", "x1", "x2", "y1", "y2")
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.x1 = array("i")
+        self.y1 = array("i")
+        self.x2 = array("i")
+        self.y2 = array("i")
+        self.rec_scores = array("d")
+        self.det_scores = array("d")
+        self.directions: list[str | None] = []
+        self.pages = array("i")
+        self.blocks = OcrBlocks()
+        self._paragraphs: list[OcrParagraph] | None = None
+        self._index: SpatialIndex | None = None
+        self._block_of: array[int] | None = None
+
+    # --- Sequence[OcrParagraph] 互換 -----------------------------------
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @overload
+    def __getitem__(self, i: int) -> OcrParagraph: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[OcrParagraph]: ...
+
+    def __getitem__(self, i: int | slice) -> OcrParagraph | list[OcrParagraph]:
+        return self.as_paragraphs()[i]
+
+    def __iter__(self) -> Iterator[OcrParagraph]:
+        return iter(self.as_paragraphs())
+
+    def as_paragraphs(self) -> list[OcrParagraph]:
+        """従来の :class:`OcrParagraph` のリスト（初回のみ作成）。"""
+        if self._paragraphs is None:
+            # s != s は NaN（スコア無し）の判定
+            self._paragraphs = [OcrParagraph(text=t, box=(a, b, c, d), score=None if s != s else s) for t, a, b, c, d, s in zip(self.texts, self.x1, self.y1, self.x2, self.y2, self.rec_scores)]
+        return self._paragraphs
+
+    # --- 語の属性 -------------------------------------------------------
+
+    def box(self, i: int) -> Box:
+        return self.x1[i], self.y1[i], self.x2[i], self.y2[i]
+
+    def rec_score(self, i: int) -> float | None:
+        s = self.rec_scores[i]
+        return None if math.isnan(s) else s
+
+    def det_score(self, i: int) -> float | None:
+        s = self.det_scores[i]
+        return None if math.isnan(s) else s
+
+    def block_of(self, i: int) -> int:
+        """語 ``i`` の中心を含む最小の段落の番号（無ければ -1）。"""
+        if self._block_of is None:
+            blocks = self.blocks
+            index = SpatialIndex([blocks.box(j) for j in range(len(blocks))])
+            out = array("i")
+            for w in range(len(self)):
+                cx, cy = (self.x1[w] + self.x2[w]) // 2, (self.y1[w] + self.y2[w]) // 2
+                containing = index.intersecting((cx, cy, cx + 1, cy + 1))
+                out.append(min(containing, key=lambda j: (blocks.x2[j] - blocks.x1[j]) * (blocks.y2[j] - blocks.y1[j])) if containing else -1)
+            self._block_of = out
+        return self._block_of[i]
+
+    def role(self, i: int) -> str | None:
+        """語 ``i`` が属する段落の役割（``page_header`` など）。"""
+        b = self.block_of(i)
+        return self.blocks.roles[b] if b >= 0 else None
+
+    # --- 空間検索 -------------------------------------------------------
+
+    @property
+    def index(self) -> SpatialIndex:
+        """語の矩形の空間索引（初回のみ作成）。"""
+        if self._index is None:
+            self._index = SpatialIndex(list(zip(self.x1, self.y1, self.x2, self.y2)))
+        return self._index
+
+    def words_in(self, box: Box, *, partial: bool = False) -> list[int]:
+        """``box`` に含まれる（``partial`` なら重なる）語の番号。"""
+        return self.index.intersecting(box) if partial else self.index.within(box)
+
+    def nearest(self, x: float, y: float) -> int | None:
+        """点 ``(x, y)`` に最も近い語の番号。語が無ければ None。"""
+        return self.index.nearest(x, y)
+
+    # --- 座標変換 -------------------------------------------------------
+
+    def _with_boxes(self, x1: array[int], y1: array[int], x2: array[int], y2: array[int]) -> OcrResult:
+        out = OcrResult()
+        out.texts = self.texts
+        out.x1, out.y1, out.x2, out.y2 = x1, y1, x2, y2
+        out.rec_scores = self.rec_scores
+        out.det_scores = self.det_scores
+        out.directions = self.directions
+        out.pages = self.pages
+        out.blocks = self.blocks
+        return out
+
+    def offset(self, dx: int, dy: int) -> OcrResult:
+        """語の座標を平行移動した結果（段落の座標は変えない）。"""
+        if dx == 0 and dy == 0:
+            return self
+        return self._with_boxes(array("i", [v + dx for v in self.x1]), array("i", [v + dy for v in self.y1]), array("i", [v + dx for v in self.x2]), array("i", [v + dy for v in self.y2]))
+
+    def scaled(self, scale_x: float, scale_y: float) -> OcrResult:
+        """縮小画像内の語の座標を元の座標へ戻した結果（座標を ``scale`` で割る）。"""
+        return self._with_boxes(
+            array("i", [round(v / scale_x) for v in self.x1]),
+            array("i", [round(v / scale_y) for v in self.y1]),
+            array("i", [round(v / scale_x) for v in self.x2]),
+            array("i", [round(v / scale_y) for v in self.y2]),
+        )
+
+
+def parse_ocr_result(data: dict) -> OcrResult:
+    """API レスポンスから語と段落を列指向で取り出す。
+
+    語の選び方（``content`` / ``contents``、``box`` / ``points``、文字列か矩形が無い語は除く）は
+    :func:`ocr.extract_paragraphs` と同じ。
+    """
+    result = OcrResult()
+    texts, x1s, y1s, x2s, y2s = result.texts, result.x1, result.y1, result.x2, result.y2
+    recs, dets, dirs, pages = result.rec_scores, result.det_scores, result.directions, result.pages
+    for page_no, page in enumerate(data.get("content") or []):
+        for w in page.get("words") or []:
+            text = w.get("content") or w.get("contents")
+            if not text:
+                continue
+            box = _fast_box(w.get("box") or w.get("points"))
+            if box is None:
+                continue
+            texts.append(str(text))
+            x1s.append(box[0])
+            y1s.append(box[1])
+            x2s.append(box[2])
+            y2s.append(box[3])
+            recs.append(_score(w.get("rec_score")))
+            dets.append(_score(w.get("det_score")))
+            dirs.append(w.get("direction"))
+            pages.append(page_no)
+        for p in page.get("paragraphs") or []:
+            result.blocks.append(p, page_no, -1)
+        for fig_no, fig in enumerate(page.get("figures") or []):
+            for p in fig.get("paragraphs") or []:
+                result.blocks.append(p, page_no, fig_no)
+    return result
@@ -0,0 +1,247 @@
+"""複数 OCR エンドポイントへの振り分け。
+
+エンドポイントごとに :class:`ocr.OcrClient`（接続プール・ブレーカー付き）を持ち、
+正常なエンドポイントのうち観測レイテンシの EWMA が最小のものへ送る。
+バックグラウンドで定期的に ``/health`` を確認し、落ちたものは候補から外す。
+
+ヘッジ送信を有効にすると、1台目が自身の p95 レイテンシを過ぎても応答しない場合に
+同じ画像を2台目にも送り、先に返ってきた結果を使う。
+
+クライアントエラー（400 / 413 など、画像そのものが受け付けられない失敗）は、
+別のエンドポイントへ送り直しても結果が変わらないためフェイルオーバーしない。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from ocr import LatencyStats, OcrClient, OcrUnavailableError, is_non_retryable
+
+# ヘッジ送信の待ち時間に p95 を使うのに必要な最小サンプル数
+_MIN_HEDGE_SAMPLES = 5
+
+
+class _HedgeFailedError(RuntimeError):
+    """ヘッジ送信で2台とも失敗したことを表す（フェイルオーバーで両方を飛ばす）。"""
+
+
+@dataclass
+class EndpointState:
+    """エンドポイントごとの状態。"""
+
+    endpoint: str
+    client: OcrClient
+    healthy: bool = True
+    ewma: float | None = None
+    requests: int = 0
+    failures: int = 0
+    hedge_wins: int = 0
+
+
+class OcrRouter:
+    """レイテンシ EWMA 最小の正常エンドポイントへ振り分ける OCR 送信口。
+
+    :class:`ocr.OcrClient` と同じインターフェース（``analyze`` / ``health`` /
+    ``wait_until_available`` / ``stats`` / ``close``）を持つ。
+
+    Args:
+        clients: エンドポイントごとのクライアント。
+        health_interval: バックグラウンドのヘルスチェック間隔（秒）。0 以下で無効。
+        hedge: ヘッジ送信を行うか。
+        ewma_alpha: レイテンシ EWMA の平滑化係数。
+        logger: ロガー。
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[OcrClient],
+        *,
+        health_interval: float = 10.0,
+        hedge: bool = False,
+        ewma_alpha: float = 0.3,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        if not clients:
+            raise ValueError("OCR エンドポイントが1つもありません")
+        self.endpoints = [EndpointState(endpoint=c.base_endpoint, client=c) for c in clients]
+        self.health_interval = health_interval
+        self.hedge = hedge
+        self.ewma_alpha = ewma_alpha
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = LatencyStats()
+        self.hedged = 0
+
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(2, len(clients) * 2), thread_name_prefix="ocr-router")
+        self._health_thread: threading.Thread | None = None
+        if health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ocr-router-health", daemon=True)
+            self._health_thread.start()
+
+    # --- OcrService ------------------------------------------------------
+
+    @property
+    def is_available(self) -> bool:
+        return bool(self._ranked())
+
+    def wait_until_available(self, timeout: float) -> bool:
+        """いずれかのエンドポイントが使えるようになるまで最大 ``timeout`` 秒待つ。"""
+        deadline = time.monotonic() + timeout
+        while not self.is_available:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closed.wait(min(0.2, remaining)):
+                return self.is_available
+        return True
+
+    def analyze(self, image: bytes | memoryview, filename: str = "capture.png", content_type: str = "image/png") -> dict:
+        """最適なエンドポイントへ送信し、失敗したら次の候補へフェイルオーバーする。
+
+        Raises:
+            OcrUnavailableError: 使えるエンドポイントが無い場合。
+            requests.HTTPError: クライアントエラーの場合（他の候補へは送らない）。
+            Exception: すべての候補で失敗した場合は最後の例外。
+        """
+        candidates = self._ranked()
+        if not candidates:
+            raise OcrUnavailableError("使用可能な OCR エンドポイントがありません")
+
+        started = time.perf_counter()
+        last_error: Exception | None = None
+        i = 0
+        while i < len(candidates):
+            primary = candidates[i]
+            secondary = candidates[i + 1] if self.hedge and i + 1 < len(candidates) else None
+            try:
+                data = self._send_hedged(primary, secondary, image, filename, content_type)
+            except Exception as e:
+                last_error = e
+                self.logger.warning("OCR エンドポイント失敗: %s (%s)", primary.endpoint, e)
+                if is_non_retryable(e):
+                    break
+                i += 2 if isinstance(e, _HedgeFailedError) else 1
+                continue
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stats.record(elapsed)
+            return data
+
+        with self._lock:
+            self.stats.failures += 1
+        assert last_error is not None
+        raise last_error
+
+    def health(self, timeout: float | None = None) -> bool:
+        """全エンドポイントを並行にヘルスチェックし、1つでも正常なら True。"""
+        self._check_all(timeout)
+        return any(ep.healthy for ep in self.endpoints)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=2.0)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for ep in self.endpoints:
+            ep.client.close()
+        for ep in self.endpoints:
+            self.logger.info(
+                "OCR エンドポイント %s: 送信 %d 件, 失敗 %d 件, EWMA %s, ヘッジ勝ち %d 件",
+                ep.endpoint,
+                ep.requests,
+                ep.failures,
+                f"{ep.ewma:.3f} 秒" if ep.ewma is not None else "-",
+                ep.hedge_wins,
+            )
+
+    # --- 内部処理 -------------------------------------------------------
+
+    def _ranked(self) -> list[EndpointState]:
+        """使用可能なエンドポイントを EWMA の小さい順に返す（未計測は優先して試す）。"""
+        with self._lock:
+            usable = [ep for ep in self.endpoints if ep.healthy and ep.client.is_available]
+            return sorted(usable, key=lambda ep: ep.ewma if ep.ewma is not None else 0.0)
+
+    def _send(self, ep: EndpointState, image: bytes | memoryview, filename: str, content_type: str) -> dict:
+        started = time.perf_counter()
+        try:
+            data = ep.client.analyze(image, filename=filename, content_type=content_type)
+        except Exception:
+            with self._lock:
+                ep.requests += 1
+                ep.failures += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            ep.requests += 1
+            ep.ewma = elapsed if ep.ewma is None else self.ewma_alpha * elapsed + (1 - self.ewma_alpha) * ep.ewma
+        return data
+
+    def _hedge_delay(self, ep: EndpointState) -> float | None:
+        with self._lock:
+            if len(ep.client.stats.samples) < _MIN_HEDGE_SAMPLES:
+                return None
+            return ep.client.stats.percentile(95)
+
+    def _send_hedged(
+        self,
+        primary: EndpointState,
+        secondary: EndpointState | None,
+        image: bytes | memoryview,
+        filename: str,
+        content_type: str,
+    ) -> dict:
+        delay = self._hedge_delay(primary) if secondary is not None else None
+        if secondary is None or delay is None:
+            return self._send(primary, image, filename, content_type)
+
+        first = self._executor.submit(self._send, primary, image, filename, content_type)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.hedged += 1
+        self.logger.debug("OCR ヘッジ送信: %s が %.3f 秒以内に応答しないため %s にも送信", primary.endpoint, delay, secondary.endpoint)
+        second = self._executor.submit(self._send, secondary, image, filename, content_type)
+        owners: dict[Future[dict], EndpointState] = {first: primary, second: secondary}
+        pending: set[Future[dict]] = {first, second}
+        errors: list[BaseException] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                err = f.exception()
+                if err is None:
+                    if owners[f] is secondary:
+                        with self._lock:
+                            secondary.hedge_wins += 1
+                    return f.result()
+                if is_non_retryable(err):
+                    raise err
+                errors.append(err)
+        raise _HedgeFailedError(f"ヘッジ送信の両方が失敗: {errors[-1]}") from errors[-1]
+
+    def _check_all(self, timeout: float | None) -> None:
+        futures = {ep.endpoint: self._executor.submit(ep.client.health, timeout) for ep in self.endpoints}
+        for ep in self.endpoints:
+            try:
+                ok = futures[ep.endpoint].result()
+            except Exception:
+                ok = False
+            with self._lock:
+                changed = ep.healthy != ok
+                ep.healthy = ok
+            if changed:
+                self.logger.info("OCR エンドポイント %s: %s", ep.endpoint, "正常" if ok else "異常")
+
+    def _health_loop(self) -> None:
+        while not self._closed.wait(self.health_interval):
+            try:
+                self._check_all(None)
+            except RuntimeError:
+                # close() 後に executor が停止している
+                return
@@ -0,0 +1,214 @@
+"""キャプチャ / OCR / 判定の3段パイプライン。
+
+フレーム N の OCR 待ちの間にフレーム N+1 のキャプチャとエンコードを進める。
+段間のキューは上限付きで、溢れた場合は古いフレームを捨てて最新を残す。
+
+クリックで画面が変わると、それ以前にキャプチャしたフレームは判断材料として
+古くなる。これを「エポック」で管理し、判定側が :meth:`FramePipeline.advance_epoch`
+を呼ぶと、以前のエポックのフレーム・OCR 結果はすべて破棄される。
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+class LatestQueue[J]:
+    """上限付きキュー。満杯時は最古の要素を捨てて新しい要素を入れる。"""
+
+    def __init__(self, maxsize: int = 1) -> None:
+        self._queue: queue.Queue[J] = queue.Queue(maxsize=max(1, maxsize))
+        self.dropped = 0
+
+    def put(self, item: J) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float | None = None) -> J | None:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self) -> int:
+        """滞留中の要素をすべて捨て、捨てた件数を返す。"""
+        n = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+                n += 1
+            except queue.Empty:
+                return n
+
+
+@dataclass
+class PipelineResult[J, R]:
+    """OCR 段まで終えた1フレーム分の結果。"""
+
+    epoch: int
+    job: J
+    result: R
+
+
+class FramePipeline[J, R]:
+    """キャプチャ段・OCR 段をそれぞれ専用スレッドで動かすパイプライン。
+
+    判定段は呼び出し側スレッドで :meth:`get` して行う。
+
+    Args:
+        capture: ``capture(epoch)`` でフレームを取得・前処理する関数（キャプチャ段スレッドで実行）。
+        recognize: ``recognize(job)`` で OCR する関数（OCR 段スレッドで実行）。
+            失敗時は None を返すと判定段へは渡さない。
+        delay_after: ``delay_after(job)`` で次のキャプチャまでの待ち秒を返す関数。
+            前回キャプチャ開始からの間隔として扱うため、OCR 時間とは重なる。
+        logger: ロガー。
+        queue_size: 段間キューの上限。
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[int], J],
+        recognize: Callable[[J], R | None],
+        delay_after: Callable[[J], float],
+        logger: logging.Logger,
+        queue_size: int = 1,
+    ) -> None:
+        self._capture = capture
+        self._recognize = recognize
+        self._delay_after = delay_after
+        self.logger = logger
+        self._jobs: LatestQueue[tuple[int, J]] = LatestQueue(queue_size)
+        self._results: LatestQueue[PipelineResult[J, R]] = LatestQueue(queue_size)
+        self._cond = threading.Condition()
+        self._epoch = 0
+        self._next_capture_at = 0.0
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self.stale_dropped = 0
+        self._threads = [
+            threading.Thread(target=self._guard(self._capture_loop), name="pipeline-capture", daemon=True),
+            threading.Thread(target=self._guard(self._recognize_loop), name="pipeline-ocr", daemon=True),
+        ]
+
+    def __enter__(self) -> FramePipeline[J, R]:
+        for t in self._threads:
+            t.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @property
+    def epoch(self) -> int:
+        with self._cond:
+            return self._epoch
+
+    @property
+    def dropped(self) -> int:
+        """キュー溢れ・エポック切れで捨てたフレーム数の合計。"""
+        return self._jobs.dropped + self._results.dropped + self.stale_dropped
+
+    def advance_epoch(self, not_before: float) -> None:
+        """画面が変わる操作（クリック）をしたことを通知する。
+
+        以前のエポックのフレームを破棄し、次のキャプチャを ``not_before``
+        （``time.monotonic()`` 基準）以降に行わせる。
+        """
+        with self._cond:
+            self._epoch += 1
+            self._next_capture_at = not_before
+            self.stale_dropped += self._jobs.clear() + self._results.clear()
+            self._cond.notify_all()
+
+    def get(self, timeout: float | None = None) -> PipelineResult[J, R] | None:
+        """現在のエポックの結果を1件取り出す。タイムアウト時は None。
+
+        Raises:
+            BaseException: いずれかの段で発生した例外（判定段へ伝播させる）。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._raise_if_failed()
+            remaining = 0.2 if deadline is None else min(0.2, deadline - time.monotonic())
+            if remaining <= 0:
+                return None
+            item = self._results.get(timeout=remaining)
+            if item is None:
+                continue
+            if item.epoch != self.epoch:
+                self.stale_dropped += 1
+                continue
+            return item
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            if t.is_alive():
+                t.join(timeout=5.0)
+
+    # --- 各段 -----------------------------------------------------------
+
+    def _guard(self, loop: Callable[[], None]) -> Callable[[], None]:
+        def run() -> None:
+            try:
+                loop()
+            except BaseException as e:
+                self._error = e
+                self._stop.set()
+
+        return run
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _capture_loop(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._stop.is_set():
+                    wait = self._next_capture_at - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                epoch = self._epoch
+            if self._stop.is_set():
+                return
+
+            started = time.monotonic()
+            job = self._capture(epoch)
+            with self._cond:
+                if epoch != self._epoch:
+                    # キャプチャ中にクリックされた: このフレームは古い
+                    self.stale_dropped += 1
+                    continue
+                self._next_capture_at = max(self._next_capture_at, started + self._delay_after(job))
+            self._jobs.put((epoch, job))
+
+    def _recognize_loop(self) -> None:
+        while not self._stop.is_set():
+            item = self._jobs.get(timeout=0.2)
+            if item is None:
+                continue
+            epoch, job = item
+            if epoch != self.epoch:
+                self.stale_dropped += 1
+                continue
+            result = self._recognize(job)
+            if result is None:
+                continue
+            self._results.put(PipelineResult(epoch=epoch, job=job, result=result))
@@ -0,0 +1,123 @@
+"""プレイブック（既知の画面の記録）の閲覧・整理。
+
+使い方::
+
+    uv run python src/playbook.py info --config kanogi.yml
+    uv run python src/playbook.py list cache/playbooks/0123456789abcdef.json --step 耐える
+    uv run python src/playbook.py prune --config kanogi.yml --failures 1 --unused-days 30 --dedupe 4 --dry-run
+"""
+
+from __future__ import annotations
+
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+from config import load_config
+from screen_playbook import Playbook, PlaybookEntry, hamming, playbook_path
+from utils import normalize_text_for_matching
+
+
+def _open(path: Path | None, config_path: Path | None) -> Playbook:
+    """ファイルのパス、または設定ファイル（の ``title``）からプレイブックを開く。"""
+    if path is None:
+        if config_path is None:
+            raise click.UsageError("プレイブックのパスか --config を指定してください")
+        base_dir = Path(__file__).resolve().parent.parent
+        path = playbook_path(base_dir, load_config(config_path).title)
+    if not path.exists():
+        raise click.ClickException(f"プレイブックがありません: {path}")
+    return Playbook(path)
+
+
+def _describe(e: PlaybookEntry) -> str:
+    """1記録の1行表示。"""
+    used = datetime.fromtimestamp(e.last_used).strftime("%Y-%m-%d %H:%M")
+    return f"#{e.id:<5d} {e.step:<20s} box={list(e.box)} 再生 {e.replays:4d} 確認 {e.verified:3d} 失敗 {e.failures:2d}  最終 {used}  '{e.text}'"
+
+
+_path_argument = click.argument("path", required=False, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+_config_option = click.option("--config", "config_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None, help="設定YAMLファイル（title からプレイブックの場所を決める）")
+
+
+@click.group()
+def cli() -> None:
+    """プレイブック（cache/playbooks/*.json）の閲覧・整理。"""
+
+
+@cli.command()
+@_path_argument
+@_config_option
+def info(path: Path | None, config_path: Path | None) -> None:
+    """各 step の記録数・再生回数・確認の失敗数を表示する。"""
+    book = _open(path, config_path)
+    entries = list(book)
+    click.echo(f"{book.path}: {len(entries)} 件")
+    counts = Counter(e.step for e in entries)
+    for step, n in sorted(counts.items(), key=lambda kv: kv[0]):
+        same = [e for e in entries if e.step == step]
+        click.echo(f"  {step:<20s} {n:3d} 件  再生 {sum(e.replays for e in same):5d}  確認 {sum(e.verified for e in same):4d}  失敗 {sum(e.failures for e in same):3d}")
+
+
+@cli.command(name="list")
+@_path_argument
+@_config_option
+@click.option("--step", default=None, help="表示する step")
+def list_(path: Path | None, config_path: Path | None, step: str | None) -> None:
+    """記録を一覧表示する。"""
+    key = normalize_text_for_matching(step) if step is not None else None
+    for e in _open(path, config_path):
+        if key is None or e.step == key:
+            click.echo(_describe(e))
+
+
+@cli.command()
+@_path_argument
+@_config_option
+@click.option("--id", "ids", type=int, multiple=True, help="捨てる記録の番号（複数指定可）")
+@click.option("--step", default=None, help="この step の記録をすべて捨てる")
+@click.option("--failures", type=int, default=None, help="確認の失敗がこの回数以上の記録を捨てる")
+@click.option("--unused-days", type=float, default=None, help="この日数以上使われていない記録を捨てる")
+@click.option("--dedupe", type=int, default=None, help="同じ step でフィンガープリントの距離がこの値以下の記録は、最もよく使われた1件だけ残す")
+@click.option("--dry-run", is_flag=True, help="捨てる記録を表示するだけで保存しない")
+def prune(
+    path: Path | None,
+    config_path: Path | None,
+    ids: tuple[int, ...],
+    step: str | None,
+    failures: int | None,
+    unused_days: float | None,
+    dedupe: int | None,
+    dry_run: bool,
+) -> None:
+    """条件に合う記録を捨てる。"""
+    book = _open(path, config_path)
+    entries = list(book)
+    drop: dict[int, PlaybookEntry] = {e.id: e for e in entries if e.id in ids}
+    key = normalize_text_for_matching(step) if step is not None else None
+    now = time.time()
+    for e in entries:
+        if (key is not None and e.step == key) or (failures is not None and e.failures >= failures) or (unused_days is not None and now - e.last_used >= unused_days * 86400):
+            drop[e.id] = e
+    if dedupe is not None:
+        kept: list[PlaybookEntry] = []
+        for e in sorted((e for e in entries if e.id not in drop), key=lambda e: (-(e.replays + e.verified), e.id)):
+            if any(k.step == e.step and k.frame_size == e.frame_size and hamming(k.screen, e.screen) <= dedupe and hamming(k.patch, e.patch) <= dedupe for k in kept):
+                drop[e.id] = e
+            else:
+                kept.append(e)
+    for e in sorted(drop.values(), key=lambda e: e.id):
+        click.echo(f"捨てる: {_describe(e)}")
+    if dry_run:
+        click.echo(f"{len(drop)} 件を捨てます（--dry-run のため保存しません）")
+        return
+    book.remove(list(drop))
+    book.save()
+    click.echo(f"{len(drop)} 件を捨てました（残り {len(book)} 件）")
+
+
+if __name__ == "__main__":
+    cli()
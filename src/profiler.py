@@ -0,0 +1,93 @@
+"""標準ライブラリだけで動くサンプリングプロファイラ。
+
+バックグラウンドスレッドが一定間隔で全スレッドのスタック（``sys._current_frames()``）を
+採取し、同じスタックの出現回数を数える。計測対象のコードには手を入れず、
+オーバーヘッドはサンプリング間隔でほぼ決まる。
+
+結果は flamegraph.pl / speedscope 等で読める collapsed 形式
+（``スレッド名;関数;関数;... 回数``）で保存できる。
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}"
+
+
+def _function_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """全スレッドのスタックを定期的に採取するプロファイラ。
+
+    Args:
+        interval: サンプリング間隔（秒）。
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._self_counts: Counter[str] = Counter()
+        self._total_counts: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def __enter__(self) -> SamplingProfiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+
+    def write_collapsed(self, path: Path) -> None:
+        """結果を collapsed 形式で保存する。"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, n: int = 20) -> list[tuple[str, int, int]]:
+        """自己時間の多い関数を ``(関数, 自己サンプル数, 累積サンプル数)`` で返す。"""
+        return [(func, count, self._total_counts[func]) for func, count in self._self_counts.most_common(n)]
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self._sample(names.get(ident, str(ident)), frame)
+            self.samples += 1
+
+    def _sample(self, thread_name: str, frame: FrameType) -> None:
+        stack: list[FrameType] = []
+        f: FrameType | None = frame
+        while f is not None:
+            stack.append(f)
+            f = f.f_back
+        stack.reverse()
+        # 待機中のスレッド（イベント待ち・sleep 等）も含めて数える（どこで待っているかも分かる）
+        self._stacks[";".join([thread_name, *(_frame_label(x) for x in stack)])] += 1
+        self._self_counts[_function_label(frame)] += 1
+        for func in {_function_label(x) for x in stack}:
+            self._total_counts[func] += 1
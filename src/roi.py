@@ -0,0 +1,168 @@
+"""OCR 対象領域（ROI）の管理。
+
+キャプチャ画像全体ではなく、選択肢が現れる領域だけを切り出して OCR に送ることで、
+送信サイズと OCR 時間を減らす。
+
+- 設定の ``capture_regions`` で固定の領域を指定できる
+- 学習モード（``roi_learn``）では、一致してクリックした語の位置を記録し、
+  ``roi_warmup`` 回分たまったら以後はそれらを包む領域だけを OCR する
+- 想定外の位置に選択肢が出た場合に備え、キャプチャ ``roi_full_every`` 回に1回は全体を OCR する
+  （画面が静止して前回の結果を再利用し続けている間も数える）
+- 切り出した範囲の OCR で一致する step が無かった場合は、次のフレームは全体を OCR する
+
+座標はすべてキャプチャ画像内（ウィンドウ左上基準）の ``(x1, y1, x2, y2)``。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from collections.abc import Iterable, Sequence
+
+from ocr import OcrParagraph
+from ocr_result import OcrResult
+
+Box = tuple[int, int, int, int]
+
+
+def union_box(boxes: Iterable[Box]) -> Box | None:
+    """``boxes`` をすべて包む最小の矩形を返す（空なら None）。"""
+    x1 = y1 = x2 = y2 = None
+    for b in boxes:
+        x1 = b[0] if x1 is None else min(x1, b[0])
+        y1 = b[1] if y1 is None else min(y1, b[1])
+        x2 = b[2] if x2 is None else max(x2, b[2])
+        y2 = b[3] if y2 is None else max(y2, b[3])
+    if x1 is None or y1 is None or x2 is None or y2 is None:
+        return None
+    return x1, y1, x2, y2
+
+
+def clamp_box(box: Box, width: int, height: int) -> Box | None:
+    """``box`` を画像の範囲内に収める。面積が無くなる場合は None。"""
+    x1, y1 = max(0, box[0]), max(0, box[1])
+    x2, y2 = min(width, box[2]), min(height, box[3])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def merge_boxes(boxes: Iterable[Box]) -> list[Box]:
+    """重なる（接する）矩形どうしを包む矩形にまとめ、互いに重ならない矩形の列にする。"""
+    merged: list[Box] = []
+    for box in boxes:
+        while True:
+            for i, other in enumerate(merged):
+                if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                    box = (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+                    del merged[i]
+                    break
+            else:
+                merged.append(box)
+                break
+    return sorted(merged, key=lambda b: (b[1], b[0]))
+
+
+def offset_paragraphs(paragraphs: Sequence[OcrParagraph], dx: int, dy: int) -> Sequence[OcrParagraph]:
+    """切り出し画像内の OCR 結果の座標を、元画像の座標へ戻す（:class:`OcrResult` はその型のまま）。"""
+    if isinstance(paragraphs, OcrResult):
+        return paragraphs.offset(dx, dy)
+    if dx == 0 and dy == 0:
+        return list(paragraphs)
+    return [OcrParagraph(text=p.text, box=(p.box[0] + dx, p.box[1] + dy, p.box[2] + dx, p.box[3] + dy), score=p.score) for p in paragraphs]
+
+
+class RoiTracker:
+    """フレームごとに OCR する領域を決める（スレッドセーフ）。
+
+    Args:
+        regions: 固定の OCR 領域。
+        learn: 一致した語の位置から領域を学習するか。
+        warmup: 学習した領域を使い始めるまでに必要な一致回数。
+        margin: 学習した語の矩形を広げるピクセル数。
+        full_every: 領域を使う場合でも、キャプチャのこの回数に1回は全体を OCR する（0 で全体 OCR しない）。
+        history: 学習に使う直近の一致位置の件数（古い位置は忘れて領域を追従させる）。
+    """
+
+    def __init__(self, regions: Sequence[Box] = (), *, learn: bool = False, warmup: int = 3, margin: int = 16, full_every: int = 10, history: int = 32) -> None:
+        self.regions = list(regions)
+        self.learn = learn
+        self.warmup = max(1, warmup)
+        self.margin = max(0, margin)
+        self.full_every = max(0, full_every)
+        self._lock = threading.Lock()
+        self._learned: deque[Box] = deque(maxlen=max(self.warmup, history))
+        self._since_full = 0
+        self._full_requested = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.regions) or self.learn
+
+    @property
+    def learned(self) -> list[Box]:
+        with self._lock:
+            return list(self._learned)
+
+    def record_hit(self, box: Box) -> None:
+        """一致してクリックした語の位置（キャプチャ画像内座標）を記録する。"""
+        if not self.learn:
+            return
+        m = self.margin
+        with self._lock:
+            self._learned.append((box[0] - m, box[1] - m, box[2] + m, box[3] + m))
+
+    def tick(self) -> bool:
+        """キャプチャ1回ごとに呼び、全体 OCR の周期を数える。
+
+        Returns:
+            次に OCR するフレームは全体にすべきか（切り出した範囲の前回の結果を
+            再利用せずに OCR させる）。領域を使っていなければ常に False。
+        """
+        with self._lock:
+            if not self._boxes():
+                return False
+            self._since_full += 1
+            return self._full_due()
+
+    def request_full(self) -> None:
+        """次に OCR するフレームは全体を OCR させる（切り出した範囲で一致しなかった場合など）。"""
+        with self._lock:
+            self._full_requested = True
+
+    def plan(self, width: int, height: int) -> Box | None:
+        """次に OCR するフレームの切り出し範囲を返す。None なら全体を OCR する。
+
+        全体 OCR の周期（:meth:`tick`）が来ているか要求されていれば None を返し、周期を数え直す。
+        """
+        with self._lock:
+            box = union_box(self._boxes())
+            if box is None:
+                return None
+            if self._full_due():
+                self._since_full = 0
+                self._full_requested = False
+                return None
+
+        box = clamp_box(box, width, height)
+        if box is None or box == (0, 0, width, height):
+            return None
+        return box
+
+    def parts(self, width: int, height: int) -> list[Box]:
+        """:meth:`plan` の範囲を構成する個々の領域（重なるものはまとめる）。
+
+        離れた複数の領域を別々に切り出してモザイク OCR に渡す場合に使う（全体の周期は数えない）。
+        """
+        with self._lock:
+            boxes = self._boxes()
+        return merge_boxes(b for b in (clamp_box(box, width, height) for box in boxes) if b is not None)
+
+    def _boxes(self) -> list[Box]:
+        boxes = list(self.regions)
+        if self.learn and len(self._learned) >= self.warmup:
+            boxes.extend(self._learned)
+        return boxes
+
+    def _full_due(self) -> bool:
+        return self._full_requested or (self.full_every > 0 and self._since_full >= self.full_every)
@@ -0,0 +1,140 @@
+"""キャプチャ間隔の適応スケジューラ。
+
+固定の ``interval`` 待ちの代わりに、画面の状態に応じて次のキャプチャまでの
+待ち時間を決める。
+
+- クリック直後や画面が動いている間は ``min_interval`` で細かくポーリングし、
+  画面が ``settle_frames`` 回連続で静止したら「落ち着いた」とみなす
+  （落ち着くまでの途中フレームは OCR しない）
+- 静止画面が続く間は待ち時間を ``backoff`` 倍ずつ伸ばし、``max_interval`` で頭打ち
+- OCR 送信は ``max_ocr_rate``（回/秒）を超えないように間隔を空ける
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+
+class RateLimiter:
+    """送信間隔を ``1 / rate`` 秒以上空けるレート制限（スレッドセーフ）。
+
+    複数セッションで1つのインスタンスを共有すると、全体での上限になる。
+
+    Args:
+        rate: 上限（回/秒）。0 以下で無制限。
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.spacing = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at: float | None = None
+
+    def acquire(self) -> float:
+        """送信枠を1つ確保する。必要なら待ってから返し、待った秒数を返す。"""
+        if self.spacing <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = now if self._next_at is None else max(now, self._next_at)
+            self._next_at = slot + self.spacing
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class TickScheduler:
+    """次のキャプチャまでの待ち時間を決めるスケジューラ。
+
+    Args:
+        max_interval: 待ち時間の上限（秒）。設定の ``interval``。
+        min_interval: 待ち時間の下限（秒）。クリック直後・画面変化中のポーリング間隔。
+        backoff: 静止画面が続いたときの待ち時間の伸び率。
+        settle_frames: 何回連続で静止したら画面が落ち着いたとみなすか。
+        settle_timeout: 画面が動き続けても、この秒数が経てば落ち着いたとみなす。
+        max_ocr_rate: OCR 送信の上限（回/秒）。0 以下で無制限。
+        shared_limiter: 任意。他のセッションと共有する全体の OCR レート制限。
+        logger: ロガー。
+    """
+
+    def __init__(
+        self,
+        max_interval: float,
+        *,
+        min_interval: float = 0.3,
+        backoff: float = 2.0,
+        settle_frames: int = 2,
+        settle_timeout: float | None = None,
+        max_ocr_rate: float = 2.0,
+        shared_limiter: RateLimiter | None = None,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.max_interval = max(0.0, max_interval)
+        self.min_interval = max(0.0, min(min_interval, self.max_interval))
+        self.backoff = max(1.0, backoff)
+        self.settle_frames = max(1, settle_frames)
+        self.settle_timeout = settle_timeout if settle_timeout is not None else max(2.0, self.max_interval)
+        self.limiters = [RateLimiter(max_ocr_rate)] + ([shared_limiter] if shared_limiter is not None else [])
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._current = self.min_interval
+        self._stable = 0
+        # 起動直後も画面が落ち着くのを待ってから OCR する
+        self._settling_since: float | None = time.monotonic()
+
+    @property
+    def settling(self) -> bool:
+        """画面が落ち着くのを待っている途中か（途中フレームは OCR しない）。"""
+        with self._lock:
+            return self._settling_since is not None
+
+    def on_click(self) -> None:
+        """クリックしたことを通知する。以後、画面が落ち着くまで細かくポーリングする。"""
+        with self._lock:
+            self._enter_settling()
+
+    def next_delay(self, changed: bool) -> float:
+        """キャプチャ1回ごとに呼び、次のキャプチャまでの待ち秒を返す。
+
+        Args:
+            changed: 今回のフレームが前回から変化したか。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._settling_since is not None:
+                self._stable = 0 if changed else self._stable + 1
+                if self._stable >= self.settle_frames:
+                    reason = "静止を確認"
+                    self._settling_since = None
+                elif now - self._settling_since >= self.settle_timeout:
+                    reason = "静止待ちタイムアウト"
+                    self._settling_since = None
+                else:
+                    reason = "静止待ち"
+                delay = self.min_interval
+            elif changed:
+                # 画面がクリック以外で変わった（テキスト送り等）: 落ち着くまで細かく見る
+                reason = "画面変化"
+                self._enter_settling()
+                delay = self.min_interval
+            else:
+                reason = "静止中"
+                self._current = min(self.max_interval, max(self.min_interval, self._current * self.backoff))
+                delay = self._current
+
+        self.logger.debug("次回キャプチャまで %.2f 秒 (%s)", delay, reason)
+        return delay
+
+    def throttle_ocr(self) -> None:
+        """OCR 送信レート上限（自セッション・全体）を守るため、必要なら送信前に待つ。"""
+        waited = sum(limiter.acquire() for limiter in self.limiters)
+        if waited > 0:
+            self.logger.debug("OCR レート制限のため %.2f 秒待機", waited)
+
+    def _enter_settling(self) -> None:
+        self._settling_since = time.monotonic()
+        self._stable = 0
+        self._current = self.min_interval
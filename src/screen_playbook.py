@@ -0,0 +1,398 @@
+"""既知の画面を OCR なしで再生するプレイブック。
+
+同じルート（同じ ``steps``）を何度も周回する場合、選択肢の画面は毎回ほぼ同じ見た目になる。
+クリックに成功するたびに、その画面の知覚ハッシュ（フィンガープリント）を step の文字列・
+クリック位置と一緒に記録しておき、以後の周回では現在の step について記録済みの画面と
+ハミング距離がしきい値以内のフレームが来たら、OCR せずに記録した位置をクリックする。
+
+- フィンガープリントは画面全体の dHash（縮小輝度グリッドの隣り合うセルの大小、256 bit）と、
+  クリックした語の周辺の dHash（64 bit）の組。背景が同じで選択肢の文字だけが違う画面を
+  取り違えないよう、両方が近い場合だけ一致とみなす
+- 近傍探索は step ごとの BK 木（ハミング距離の三角不等式で枝を刈る）で行う
+- 一致した画面も ``verify_rate`` の割合で OCR し、記録した位置に step の語が無ければ
+  その記録の失敗として数え、失敗が続く記録は捨てる
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+from capture import CapturedFrame, crop_frame
+from change_detect import luminance_grid
+from roi import Box
+from utils import DeferredSaver, normalize_text_for_matching
+
+PLAYBOOK_VERSION = 1
+# 画面全体・クリック位置周辺の dHash の1辺のビット数（256 bit / 64 bit）
+SCREEN_BITS = 16
+PATCH_BITS = 8
+# クリック位置周辺のフィンガープリントに含める余白（ピクセル）
+_PATCH_MARGIN = 8
+
+
+def dhash(frame: CapturedFrame, bits: int) -> int:
+    """フレームの dHash（``bits * bits`` bit）。
+
+    ``(bits + 1)`` 四方の輝度グリッドで、各行の隣り合うセルの左が右より明るければ 1 とする。
+    """
+    side = bits + 1
+    grid = luminance_grid(frame, side)
+    value = 0
+    for row in range(bits):
+        base = row * side
+        for col in range(bits):
+            value = (value << 1) | (grid[base + col] > grid[base + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """2つのフィンガープリントのハミング距離。"""
+    return (a ^ b).bit_count()
+
+
+def patch_box(box: Box, width: int, height: int) -> Box:
+    """クリック位置周辺のフィンガープリントを取る矩形（語の矩形に余白を足し、フレーム内に収めたもの）。"""
+    m = _PATCH_MARGIN
+    return max(0, box[0] - m), max(0, box[1] - m), min(width, box[2] + m), min(height, box[3] + m)
+
+
+@dataclass(frozen=True)
+class PlaybookEntry:
+    """記録した1画面。
+
+    Attributes:
+        id: 記録の番号（プレイブック内で一意）。
+        step: 正規化した step の文字列。
+        text: クリックした語の文字列（表示用）。
+        box: クリックした語の矩形（キャプチャ画像内座標）。
+        frame_size: 記録したフレームの大きさ（大きさが異なるフレームには使わない）。
+        screen: 画面全体のフィンガープリント。
+        patch: クリックした語の周辺のフィンガープリント。
+        created: 記録時刻（UNIX 時刻）。
+        last_used: 最後に再生・確認した時刻（UNIX 時刻）。
+        replays: OCR なしでクリックした回数。
+        verified: OCR で確認して正しかった回数。
+        failures: OCR で確認して記録した位置に語が無かった回数。
+    """
+
+    id: int
+    step: str
+    text: str
+    box: Box
+    frame_size: tuple[int, int]
+    screen: int
+    patch: int
+    created: float
+    last_used: float
+    replays: int = 0
+    verified: int = 0
+    failures: int = 0
+
+    def to_json(self) -> dict:
+        raw = asdict(self)
+        raw["box"] = list(self.box)
+        raw["frame_size"] = list(self.frame_size)
+        raw["screen"] = f"{self.screen:0{SCREEN_BITS * SCREEN_BITS // 4}x}"
+        raw["patch"] = f"{self.patch:0{PATCH_BITS * PATCH_BITS // 4}x}"
+        return raw
+
+    @classmethod
+    def from_json(cls, raw: dict) -> PlaybookEntry:
+        return cls(
+            id=int(raw["id"]),
+            step=str(raw["step"]),
+            text=str(raw.get("text", raw["step"])),
+            box=tuple(int(v) for v in raw["box"]),  # type: ignore[arg-type]
+            frame_size=(int(raw["frame_size"][0]), int(raw["frame_size"][1])),
+            screen=int(raw["screen"], 16),
+            patch=int(raw["patch"], 16),
+            created=float(raw.get("created", 0.0)),
+            last_used=float(raw.get("last_used", 0.0)),
+            replays=int(raw.get("replays", 0)),
+            verified=int(raw.get("verified", 0)),
+            failures=int(raw.get("failures", 0)),
+        )
+
+
+class BKTree:
+    """ハミング距離による BK 木（距離 ``radius`` 以内の値の探索）。
+
+    各節点の子は親からの距離ごとに分け、探索では三角不等式により
+    ``|d - k| <= radius`` を満たす距離 ``k`` の子だけをたどる。
+    """
+
+    def __init__(self) -> None:
+        self._root: tuple[int, int, dict] | None = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: int) -> None:
+        """フィンガープリント ``key`` に ``value``（記録の番号）を登録する。"""
+        self._size += 1
+        if self._root is None:
+            self._root = (key, value, {})
+            return
+        node = self._root
+        while True:
+            d = hamming(key, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (key, value, {})
+                return
+            node = child
+
+    def search(self, key: int, radius: int) -> list[tuple[int, int]]:
+        """``key`` から距離 ``radius`` 以内の (距離, 値) を距離の近い順に返す。"""
+        if self._root is None:
+            return []
+        found: list[tuple[int, int]] = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            d = hamming(key, node_key)
+            if d <= radius:
+                found.append((d, value))
+            stack.extend(child for k, child in children.items() if d - radius <= k <= d + radius)
+        found.sort()
+        return found
+
+
+@dataclass(frozen=True)
+class PlaybookHit:
+    """記録済みの画面との一致。
+
+    Attributes:
+        step: 一致した step（``lookup`` に渡した文字列のまま）。
+        entry: 一致した記録。
+        distance: 画面全体のフィンガープリントのハミング距離。
+        patch_distance: クリック位置周辺のフィンガープリントのハミング距離。
+    """
+
+    step: str
+    entry: PlaybookEntry
+    distance: int
+    patch_distance: int
+
+
+@dataclass
+class PlaybookStats:
+    """プレイブックの集計値。"""
+
+    lookups: int = 0
+    hits: int = 0
+    recorded: int = 0
+    verified: int = 0
+    failures: int = 0
+    dropped: int = 0
+
+
+class Playbook:
+    """画面のフィンガープリントとクリック位置の記録・照合（スレッドセーフ）。
+
+    Args:
+        path: 任意。記録を保存する JSON ファイル（再起動後・周回時にも使う）。
+        threshold: 画面全体のフィンガープリント（256 bit）で一致とみなすハミング距離の上限。
+            クリック位置周辺（64 bit）にはその 1/4 を使う。
+        max_per_step: step ごとの記録の上限（最後に使った時刻の古いものから捨てる）。
+        max_failures: OCR による確認の失敗がこの回数に達した記録を捨てる。
+        logger: ロガー。
+
+    記録・再生・確認による変更は、バックグラウンドスレッドがまとめて ``path`` へ書き出す
+    （クリックのたびにファイル全体を書き直すのを待たない）。終了時は :meth:`close` で残りを書き出す。
+    :meth:`save` はその場で書き出す（記録の整理ツール用）。
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        *,
+        threshold: int = 10,
+        max_per_step: int = 16,
+        max_failures: int = 2,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.path = path
+        self.threshold = max(0, threshold)
+        self.patch_threshold = -(-self.threshold // 4)
+        self.max_per_step = max(1, max_per_step)
+        self.max_failures = max(1, max_failures)
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = PlaybookStats()
+        self._lock = threading.Lock()
+        self._entries: dict[int, PlaybookEntry] = {}
+        self._trees: dict[str, BKTree] = {}
+        self._next_id = 1
+        self._saver = DeferredSaver(self.save, "playbook-writer") if path is not None else None
+        if path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __iter__(self) -> Iterator[PlaybookEntry]:
+        with self._lock:
+            return iter(sorted(self._entries.values(), key=lambda e: e.id))
+
+    def lookup(self, steps: Sequence[str], frame: CapturedFrame) -> PlaybookHit | None:
+        """現在の ``steps`` について記録済みの画面のうち、``frame`` に最も近いものを返す。"""
+        keys = {normalize_text_for_matching(s): s for s in steps}
+        with self._lock:
+            trees = [(step, self._trees[k]) for k, step in keys.items() if k in self._trees]
+        if not trees:
+            return None
+        screen = dhash(frame, SCREEN_BITS)
+        best: PlaybookHit | None = None
+        with self._lock:
+            self.stats.lookups += 1
+            candidates = [(d, step, self._entries[i]) for step, tree in trees for d, i in tree.search(screen, self.threshold) if i in self._entries]
+        for d, step, entry in sorted(candidates, key=lambda c: c[0]):
+            if entry.frame_size != frame.size or (best is not None and d > best.distance):
+                continue
+            patch_d = hamming(entry.patch, dhash(crop_frame(frame, patch_box(entry.box, frame.width, frame.height)), PATCH_BITS))
+            if patch_d <= self.patch_threshold and (best is None or patch_d < best.patch_distance):
+                best = PlaybookHit(step, entry, d, patch_d)
+        if best is not None:
+            with self._lock:
+                self.stats.hits += 1
+        return best
+
+    def record(self, step: str, text: str, frame: CapturedFrame, box: Box) -> PlaybookEntry | None:
+        """OCR で一致してクリックした画面を記録する。ほぼ同じ画面が記録済みなら記録しない（None）。"""
+        screen = dhash(frame, SCREEN_BITS)
+        patch = dhash(crop_frame(frame, patch_box(box, frame.width, frame.height)), PATCH_BITS)
+        key = normalize_text_for_matching(step)
+        now = time.time()
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                for _, i in tree.search(screen, self.threshold // 2):
+                    e = self._entries.get(i)
+                    if e is not None and e.frame_size == frame.size and hamming(e.patch, patch) <= self.patch_threshold // 2:
+                        return None
+            entry = PlaybookEntry(self._next_id, key, text, box, frame.size, screen, patch, now, now)
+            self._next_id += 1
+            self._insert(entry)
+            self.stats.recorded += 1
+            same_step = [e for e in self._entries.values() if e.step == key]
+            if len(same_step) > self.max_per_step:
+                self._remove(min(same_step, key=lambda e: e.last_used).id)
+        self._changed()
+        return entry
+
+    def replayed(self, entry: PlaybookEntry) -> None:
+        """記録を使って OCR なしでクリックしたことを記録する。"""
+        self._update(entry.id, lambda e: replace(e, replays=e.replays + 1, last_used=time.time()))
+
+    def report(self, entry: PlaybookEntry, ok: bool) -> None:
+        """OCR による確認の結果を記録する。失敗が ``max_failures`` 回に達した記録は捨てる。"""
+        if ok:
+            with self._lock:
+                self.stats.verified += 1
+            self._update(entry.id, lambda e: replace(e, verified=e.verified + 1, last_used=time.time()))
+            return
+        with self._lock:
+            self.stats.failures += 1
+            current = self._entries.get(entry.id)
+            if current is None:
+                return
+            current = replace(current, failures=current.failures + 1)
+            self._entries[current.id] = current
+            if current.failures >= self.max_failures:
+                self.logger.warning("プレイブックの記録 #%d（step='%s'）は確認に %d 回失敗したため捨てます", current.id, current.step, current.failures)
+                self._remove(current.id)
+                self.stats.dropped += 1
+        self._changed()
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """指定した番号の記録を捨て、捨てた数を返す（保存は :meth:`save` で行う）。"""
+        with self._lock:
+            n = 0
+            for i in ids:
+                if i in self._entries:
+                    self._remove(i)
+                    n += 1
+            return n
+
+    def close(self) -> None:
+        """書き出し待ちの変更を書き出し、バックグラウンドの書き出しを止める。"""
+        if self._saver is not None:
+            self._saver.close()
+
+    def save(self) -> None:
+        """記録を JSON ファイルへその場で書き出す（一時ファイルに書いてから置き換える）。"""
+        if self.path is None:
+            return
+        with self._lock:
+            payload = {"version": PLAYBOOK_VERSION, "next_id": self._next_id, "entries": [e.to_json() for e in sorted(self._entries.values(), key=lambda e: e.id)]}
+        tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            self.logger.warning("プレイブックの保存に失敗: %s (%s)", self.path, e)
+
+    def _update(self, entry_id: int, fn: Callable[[PlaybookEntry], PlaybookEntry]) -> None:
+        with self._lock:
+            current = self._entries.get(entry_id)
+            if current is None:
+                return
+            self._entries[entry_id] = fn(current)
+        self._changed()
+
+    def _changed(self) -> None:
+        if self._saver is not None:
+            self._saver.mark_dirty()
+
+    def _insert(self, entry: PlaybookEntry) -> None:
+        self._entries[entry.id] = entry
+        self._trees.setdefault(entry.step, BKTree()).add(entry.screen, entry.id)
+
+    def _remove(self, entry_id: int) -> None:
+        # BK 木は削除に向かないため、同じ step の木を作り直す
+        entry = self._entries.pop(entry_id)
+        tree = BKTree()
+        for e in self._entries.values():
+            if e.step == entry.step:
+                tree.add(e.screen, e.id)
+        if len(tree):
+            self._trees[entry.step] = tree
+        else:
+            self._trees.pop(entry.step, None)
+
+    def _load(self) -> None:
+        assert self.path is not None
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning("プレイブックの読み込みに失敗: %s (%s)", self.path, e)
+            return
+        if not isinstance(raw, dict) or raw.get("version") != PLAYBOOK_VERSION:
+            self.logger.warning("プレイブックの形式が異なるため使いません: %s", self.path)
+            return
+        for r in raw.get("entries", []):
+            try:
+                entry = PlaybookEntry.from_json(r)
+            except (KeyError, TypeError, ValueError) as e:
+                self.logger.warning("プレイブックの記録の読み込みに失敗: %s (%s)", self.path, e)
+                continue
+            self._insert(entry)
+        self._next_id = max([int(raw.get("next_id", 1)), *(i + 1 for i in self._entries)])
+
+
+def playbook_path(base_dir: Path, title: str) -> Path:
+    """ウィンドウタイトルごとのプレイブックの保存先（``cache/playbooks/``）。"""
+    return base_dir / "cache" / "playbooks" / f"{hashlib.blake2b(title.encode('utf-8'), digest_size=8).hexdigest()}.json"
@@ -0,0 +1,365 @@
+"""セッションアーカイブ（キャプチャ・OCR 応答・クリック判定を1ファイルに追記する形式）。
+
+``capture/`` に1フレーム1ファイルで保存すると、長時間の実行でファイル数が膨大になる。
+ここでは1回の実行につき1つの追記専用ファイル（``.advarc``）にまとめて保存する。
+
+- データファイル ``<名前>.advarc``: ヘッダーの後にレコード（20 バイトのレコードヘッダー + 本体）を追記する
+- 索引ファイル ``<名前>.advarc.idx``: 1レコード 32 バイト固定長の索引。mmap して
+  ``i`` 番目のレコードの位置を O(1) で引ける（索引が無い・壊れている場合はデータファイルを走査して復元する）
+- 同一内容のフレームは本体を書かず、最初のフレームの位置を指す参照レコードだけを書く
+- データファイルが ``max_bytes`` を超えたら次のファイル（``-001`` ...）に切り替え、
+  ``keep`` 個を超えた古いファイルを削除する
+
+レコードの種類は :data:`KIND_FRAME`（エンコード済み画像）、:data:`KIND_OCR`（OCR 応答の JSON）、
+:data:`KIND_DECISION`（クリック判定の JSON）、:data:`KIND_META`（セッション情報の JSON）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mmap
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from utils import timestamp_for_filename
+
+ARCHIVE_SUFFIX = ".advarc"
+INDEX_SUFFIX = ".idx"
+
+KIND_META = 0
+KIND_FRAME = 1
+KIND_OCR = 2
+KIND_DECISION = 3
+KIND_NAMES = {KIND_META: "meta", KIND_FRAME: "frame", KIND_OCR: "ocr", KIND_DECISION: "decision"}
+
+# 同一内容のフレームへの参照（本体は参照先の位置 8 バイト）
+FLAG_DUPLICATE = 0x01
+
+_DATA_MAGIC = b"ADVARC\x00\x01"
+_INDEX_MAGIC = b"ADVIDX\x00\x01"
+# レコードヘッダー: magic, kind, flags, seq, 時刻（UNIX 秒）, 本体長
+_RECORD = struct.Struct("<2sBBIdI")
+_RECORD_MAGIC = b"AR"
+# 索引エントリ: kind, flags, 予約, seq, 時刻, 本体の位置, 本体長, 本体の CRC32
+_ENTRY = struct.Struct("<BBHIdQII")
+_REF = struct.Struct("<Q")
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    """アーカイブ内のレコード1件。
+
+    Attributes:
+        index: レコード番号（0 始まり）。
+        kind: レコードの種類（``KIND_*``）。
+        seq: フレーム番号（同じフレームの画像・OCR 応答・判定は同じ番号を持つ）。
+        time: 記録時刻（UNIX 秒）。
+        offset: データファイル内の本体の位置（重複フレームは参照先の本体の位置）。
+        length: 本体の長さ。
+        crc: 本体の CRC32。
+        duplicate: 以前のフレームと同一内容か。
+    """
+
+    index: int
+    kind: int
+    seq: int
+    time: float
+    offset: int
+    length: int
+    crc: int
+    duplicate: bool = False
+
+    @property
+    def kind_name(self) -> str:
+        return KIND_NAMES.get(self.kind, str(self.kind))
+
+
+def image_suffix(data: bytes | memoryview) -> str:
+    """画像のバイト列から拡張子を推定する。"""
+    head = bytes(data[:12])
+    if head.startswith(b"\x89PNG"):
+        return ".png"
+    if head.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return ".webp"
+    return ".bin"
+
+
+class SessionArchive:
+    """セッションアーカイブをバックグラウンドスレッドで書き込む。
+
+    ループ側は ``add_*`` でキューに積むだけで、ディスク書き込みを待たない。
+    キューが満杯の場合はそのレコードの保存を諦める（ループを止めないことを優先）。
+
+    Args:
+        cap_dir: 保存先ディレクトリ。
+        logger: ロガー。
+        max_bytes: 1ファイルの上限サイズ。超えたら次のファイルに切り替える（0 以下で無制限）。
+        keep: 保存先に残すアーカイブの最大個数（0 以下で無制限）。
+        meta: 任意。各ファイルの先頭に記録するセッション情報。
+        max_pending: 書き込み待ちキューの上限。
+    """
+
+    def __init__(self, cap_dir: Path, logger: logging.Logger, max_bytes: int = 256 * 1024 * 1024, keep: int = 8, meta: dict | None = None, max_pending: int = 64) -> None:
+        self.cap_dir = cap_dir
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.meta = dict(meta or {})
+        self.dropped = 0
+        self.deduplicated = 0
+        self.paths: list[Path] = []
+        self._stem = timestamp_for_filename()
+        self._part = -1
+        self._data: BinaryIO | None = None
+        self._index: BinaryIO | None = None
+        self._size = 0
+        self._seen: dict[bytes, tuple[int, int, int]] = {}
+        self._queue: queue.Queue[tuple[int, int, float, bytes] | None] = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="session-archive", daemon=True)
+        self._thread.start()
+
+    def add_frame(self, seq: int, image: bytes) -> None:
+        """OCR に送ったエンコード済み画像を記録する（ブロックしない）。"""
+        self._put(KIND_FRAME, seq, image)
+
+    def add_ocr(self, seq: int, response: object) -> None:
+        """OCR 応答（JSON に変換できる値）を記録する。"""
+        self._put(KIND_OCR, seq, json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def add_decision(self, seq: int, decision: dict) -> None:
+        """クリック判定を記録する。"""
+        self._put(KIND_DECISION, seq, json.dumps(decision, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """キューに残ったレコードを書き出してスレッドを終了する。"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _put(self, kind: int, seq: int, payload: bytes) -> None:
+        try:
+            self._queue.put_nowait((kind, seq, time.time(), payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        try:
+            self.cap_dir.mkdir(parents=True, exist_ok=True)
+            self._enforce_retention()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    self._write(*item)
+                    # 溜まっている分を書き終えたらディスクへ反映する（異常終了時の欠損を減らす）
+                    if self._queue.empty():
+                        self._flush()
+                except OSError as e:
+                    self.logger.warning("アーカイブへの書き込みに失敗: %s (%s)", self.paths[-1] if self.paths else self.cap_dir, e)
+        finally:
+            self._close_part()
+
+    def _write(self, kind: int, seq: int, ts: float, payload: bytes) -> None:
+        if self._data is None or (self.max_bytes > 0 and self._size >= self.max_bytes):
+            self._open_next_part()
+        flags = 0
+        if kind == KIND_FRAME:
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            seen = self._seen.get(digest)
+            if seen is not None:
+                # 同一内容のフレームは本体を書かず、最初のフレームを参照する
+                self.deduplicated += 1
+                offset, length, crc = seen
+                self._append(KIND_FRAME, FLAG_DUPLICATE, seq, ts, _REF.pack(offset), (offset, length, crc))
+                return
+            offset, length, crc = self._append(kind, flags, seq, ts, payload)
+            self._seen[digest] = (offset, length, crc)
+            return
+        self._append(kind, flags, seq, ts, payload)
+
+    def _append(self, kind: int, flags: int, seq: int, ts: float, payload: bytes, target: tuple[int, int, int] | None = None) -> tuple[int, int, int]:
+        assert self._data is not None and self._index is not None
+        self._data.write(_RECORD.pack(_RECORD_MAGIC, kind, flags, seq & 0xFFFFFFFF, ts, len(payload)))
+        self._data.write(payload)
+        body_offset = self._size + _RECORD.size
+        self._size = body_offset + len(payload)
+        offset, length, crc = target if target is not None else (body_offset, len(payload), zlib.crc32(payload))
+        self._index.write(_ENTRY.pack(kind, flags, 0, seq & 0xFFFFFFFF, ts, offset, length, crc))
+        return offset, length, crc
+
+    def _open_next_part(self) -> None:
+        self._close_part()
+        self._part += 1
+        path = self.cap_dir / f"{self._stem}-{self._part:03d}{ARCHIVE_SUFFIX}"
+        self._data = path.open("wb")
+        self._index = index_path(path).open("wb")
+        self._data.write(_DATA_MAGIC)
+        self._index.write(_INDEX_MAGIC)
+        self._size = len(_DATA_MAGIC)
+        # 参照は同じファイル内に限る
+        self._seen.clear()
+        self.paths.append(path)
+        if self.meta:
+            self._append(KIND_META, 0, 0, time.time(), json.dumps(dict(self.meta, part=self._part), ensure_ascii=False).encode("utf-8"))
+        self._enforce_retention()
+
+    def _flush(self) -> None:
+        if self._data is not None and self._index is not None:
+            self._data.flush()
+            self._index.flush()
+
+    def _close_part(self) -> None:
+        for f in (self._data, self._index):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError as e:
+                    self.logger.warning("アーカイブのクローズに失敗: %s", e)
+        self._data = self._index = None
+
+    def _enforce_retention(self) -> None:
+        if self.keep <= 0:
+            return
+        # 名前順 = 時刻順
+        archives = sorted(self.cap_dir.glob(f"*{ARCHIVE_SUFFIX}"))
+        for old in archives[: max(0, len(archives) - self.keep)]:
+            if old in self.paths[-1:]:
+                continue
+            try:
+                old.unlink(missing_ok=True)
+                index_path(old).unlink(missing_ok=True)
+            except OSError as e:
+                self.logger.warning("古いアーカイブの削除に失敗: %s (%s)", old, e)
+
+
+def index_path(path: Path) -> Path:
+    """データファイルに対応する索引ファイルのパス。"""
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+class ArchiveReader:
+    """セッションアーカイブを mmap で読み出す。
+
+    索引ファイルがあればそれを使い（``i`` 番目のレコードを O(1) で参照）、無い・壊れている・
+    データより短い（書き込み途中で終了した）場合はデータファイルを走査して索引を作り直す。
+
+    Args:
+        path: ``.advarc`` ファイル。
+
+    Raises:
+        ValueError: アーカイブ形式でない場合。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        size = path.stat().st_size
+        self._data: mmap.mmap | bytes = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if self._data[: len(_DATA_MAGIC)] != _DATA_MAGIC:
+            self.close()
+            raise ValueError(f"セッションアーカイブではありません: {path}")
+        self._index_file: BinaryIO | None = None
+        self._index: mmap.mmap | None = None
+        self._entries: list[ArchiveEntry] | None = None
+        self._open_index()
+
+    def __enter__(self) -> ArchiveReader:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for m in (self._index, self._data):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in (self._index_file, self._file):
+            if f is not None:
+                f.close()
+        self._index = None
+        self._index_file = None
+
+    def __len__(self) -> int:
+        if self._entries is not None:
+            return len(self._entries)
+        assert self._index is not None
+        return (len(self._index) - len(_INDEX_MAGIC)) // _ENTRY.size
+
+    def __iter__(self) -> Iterator[ArchiveEntry]:
+        for i in range(len(self)):
+            yield self.entry(i)
+
+    def entry(self, i: int) -> ArchiveEntry:
+        """``i`` 番目のレコードを返す。"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if self._entries is not None:
+            return self._entries[i]
+        assert self._index is not None
+        kind, flags, _, seq, ts, offset, length, crc = _ENTRY.unpack_from(self._index, len(_INDEX_MAGIC) + i * _ENTRY.size)
+        return ArchiveEntry(i, kind, seq, ts, offset, length, crc, bool(flags & FLAG_DUPLICATE))
+
+    def payload(self, entry: ArchiveEntry | int) -> bytes:
+        """レコードの本体（重複フレームは参照先の画像）を返す。"""
+        if isinstance(entry, int):
+            entry = self.entry(entry)
+        return bytes(self._data[entry.offset : entry.offset + entry.length])
+
+    def json(self, entry: ArchiveEntry | int) -> object:
+        """OCR 応答・判定・セッション情報のレコードを JSON として読む。"""
+        return json.loads(self.payload(entry).decode("utf-8"))
+
+    def verify(self, entry: ArchiveEntry | int) -> bool:
+        """本体の CRC32 が索引と一致するか。"""
+        if isinstance(entry, int):
+            entry = self.entry(entry)
+        return zlib.crc32(self.payload(entry)) == entry.crc
+
+    def _open_index(self) -> None:
+        idx = index_path(self.path)
+        if idx.exists() and idx.stat().st_size >= len(_INDEX_MAGIC):
+            self._index_file = idx.open("rb")
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            count = (len(self._index) - len(_INDEX_MAGIC)) // _ENTRY.size
+            if self._index[: len(_INDEX_MAGIC)] == _INDEX_MAGIC and (count == 0 or self._end_of(self.entry(count - 1)) <= len(self._data)):
+                return
+            self._index.close()
+            self._index_file.close()
+            self._index = None
+            self._index_file = None
+        self._entries = list(self._scan())
+
+    def _end_of(self, entry: ArchiveEntry) -> int:
+        return entry.offset + entry.length
+
+    def _scan(self) -> Iterator[ArchiveEntry]:
+        """データファイルを先頭から走査してレコードを列挙する（末尾の書きかけは無視する）。"""
+        pos = len(_DATA_MAGIC)
+        i = 0
+        data = self._data
+        while pos + _RECORD.size <= len(data):
+            magic, kind, flags, seq, ts, length = _RECORD.unpack_from(data, pos)
+            body = pos + _RECORD.size
+            if magic != _RECORD_MAGIC or body + length > len(data):
+                break
+            if flags & FLAG_DUPLICATE:
+                (offset,) = _REF.unpack_from(data, body)
+                _, _, _, _, _, ref_length = _RECORD.unpack_from(data, offset - _RECORD.size)
+                yield ArchiveEntry(i, kind, seq, ts, offset, ref_length, zlib.crc32(data[offset : offset + ref_length]), True)
+            else:
+                yield ArchiveEntry(i, kind, seq, ts, body, length, zlib.crc32(data[body : body + length]))
+            pos = body + length
+            i += 1
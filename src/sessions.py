@@ -0,0 +1,151 @@
+"""複数セッション（複数ウィンドウ・複数設定）を1プロセスで同時に動かす。
+
+各セッションは専用スレッドで :func:`automation.run_automation` を実行する。
+プロセス内で次のものを共有する。
+
+- OCR 送信口: 同じエンドポイント集合を使うセッション同士で接続プールを共有し、
+  ヘルスチェックもエンドポイント集合ごとに1回だけ行う
+- 全体の OCR レート制限: 全セッション合計の送信レートを抑える
+- モザイク OCR（``ocr_mosaic``）: 同時に OCR 待ちになった各セッションの画像を
+  1枚にまとめ、1回の要求で送る
+- 入力操作のロック: 前面化・キャプチャ・クリックを直列化し、別セッションの
+  フォーカス変更が割り込まないようにする（``automation`` 側で実施）
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from automation import RunStats, create_mosaic_batcher, create_ocr_client, log_mosaic_stats, run_automation
+from capture import warm_up_capture
+from config import AppConfig
+from logger import LogOptions, setup_session_logger
+from mosaic import MosaicBatcher
+from ocr import OcrService
+from scheduler import RateLimiter
+
+
+class OcrHealthError(RuntimeError):
+    """いずれかの OCR エンドポイント集合がヘルスチェックに失敗した。"""
+
+
+@dataclass
+class SessionSpec:
+    """1セッション分の設定。"""
+
+    name: str
+    config: AppConfig
+
+
+@dataclass
+class SessionResult:
+    """1セッション分の実行結果。"""
+
+    name: str
+    stats: RunStats | None = None
+    error: BaseException | None = None
+
+
+def unique_session_names(paths: list[Path]) -> list[str]:
+    """設定ファイル名からセッション名を作る（重複時は連番を付ける）。"""
+    names: list[str] = []
+    for path in paths:
+        base = path.stem
+        name = base
+        n = 2
+        while name in names:
+            name = f"{base}-{n}"
+            n += 1
+        names.append(name)
+    return names
+
+
+def run_sessions(base_dir: Path, specs: list[SessionSpec], logger: logging.Logger, max_ocr_rate: float, *, resume: bool = True, log_options: LogOptions | None = None) -> list[SessionResult]:
+    """複数セッションを同時に実行し、全セッションの終了を待つ。
+
+    Args:
+        base_dir: プロジェクトルート。
+        specs: セッション一覧。
+        logger: 全体用ロガー。
+        max_ocr_rate: 全セッション合計の OCR 送信上限（回/秒）。0 以下で無制限。
+        resume: False なら各セッションのチェックポイントを消して最初の step から始める。
+        log_options: 任意。セッション別ログの形式・ローテーション・非同期書き出しの設定。
+
+    Returns:
+        セッションごとの結果（``specs`` と同じ順）。
+
+    Raises:
+        OcrHealthError: OCR サーバーのヘルスチェックに失敗した場合。
+    """
+    services: dict[tuple[str, ...], OcrService] = {}
+    for spec in specs:
+        key = tuple(spec.config.endpoints)
+        if key not in services:
+            services[key] = create_ocr_client(spec.config, logger)
+    # モザイク OCR はエンドポイント集合ごとに1つのまとめ役を共有し、セッションをまたいでまとめる
+    batchers: dict[tuple[str, ...], MosaicBatcher] = {}
+    for spec in specs:
+        key = tuple(spec.config.endpoints)
+        if spec.config.ocr_mosaic and key not in batchers:
+            batchers[key] = create_mosaic_batcher(spec.config, services[key], logger)
+
+    try:
+        # ヘルスチェックはエンドポイント集合ごとに1回、キャプチャの準備と並行に行う
+        with ThreadPoolExecutor(max_workers=len(services) + 1) as pool:
+            warm = pool.submit(warm_up_capture)
+            health = dict(zip(services, pool.map(lambda svc: svc.health(timeout=10.0), services.values())))
+            try:
+                warm.result()
+            except Exception as e:
+                logger.warning("キャプチャの準備に失敗: %s", e)
+        down = [", ".join(key) for key, ok in health.items() if not ok]
+        if down:
+            raise OcrHealthError(f"OCRサーバーが起動していません: {' / '.join(down)}")
+
+        limiter = RateLimiter(max_ocr_rate)
+        results = [SessionResult(name=spec.name) for spec in specs]
+
+        def run_one(spec: SessionSpec, result: SessionResult) -> None:
+            session_logger, logfile = setup_session_logger(base_dir, spec.name, log_options)
+            logger.info("セッション開始: %s (title='%s', ログ: %s)", spec.name, spec.config.title, logfile)
+            try:
+                result.stats = run_automation(
+                    base_dir,
+                    spec.config,
+                    session_logger,
+                    services[tuple(spec.config.endpoints)],
+                    shared_limiter=limiter,
+                    session_name=spec.name,
+                    resume=resume,
+                    batcher=batchers.get(tuple(spec.config.endpoints)) if spec.config.ocr_mosaic else None,
+                )
+            except BaseException as e:
+                session_logger.exception("実行中にエラーが発生しました: %s", e)
+                result.error = e
+
+        threads = [threading.Thread(target=run_one, args=(spec, result), name=f"session-{spec.name}", daemon=True) for spec, result in zip(specs, results)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for result in results:
+            if result.error is not None:
+                logger.error("セッション失敗: %s (%s)", result.name, result.error)
+            elif result.stats is not None:
+                logger.info(
+                    "セッション完了: %s (キャプチャ %d 枚 / OCR 送信 %d 枚)",
+                    result.name,
+                    result.stats.frames_captured,
+                    result.stats.frames_ocr,
+                )
+        for batcher in batchers.values():
+            log_mosaic_stats(batcher, logger)
+        return results
+    finally:
+        for svc in services.values():
+            svc.close()
@@ -0,0 +1,238 @@
+"""分岐・省略可能な step・選択肢の候補・先読みを表す step グラフ。
+
+設定の ``steps`` は従来どおり文字列の配列で書けるほか、要素に次のマッピングを使える::
+
+    steps:
+      - 始める
+      - any: [耐える, 逃げる]            # どれか1つに一致したら次へ
+      - optional: スキップ                # 出なければ飛ばしてよい（配列も可）
+      - branch:                           # 先頭の step に一致した側へ進み、最後に合流する
+          - [図書館に行ってみる, 本を読む]
+          - [家に帰る]
+      - 終わる
+
+各 step はグラフの節点にコンパイルし、:class:`StepCursor` が「次に一致しうる節点の集合」
+（フロンティア）を持つ。1フレームの OCR 結果はフロンティア（と先読みの範囲）の全 step と
+まとめて照合し、画面が許せば1フレームで複数の step を進める。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from matcher import MatchResult, PreparedWord, StepMatcher
+
+# 終端を表す節点番号（フロンティアに含まれたら全 step 完了）
+END = -1
+
+_SPEC_ERROR = "設定 'steps' の要素は文字列、または any / optional / branch のいずれか1つを持つマッピングで指定してください"
+
+
+@dataclass(frozen=True)
+class StepNode:
+    """step グラフの節点。
+
+    Attributes:
+        index: 節点番号（設定での記述順）。
+        text: クリック対象の文字列。
+        optional: 省略可能な step か（ログ表示用。省略の扱いはグラフの辺で表す）。
+        next: この step をクリックした後に一致しうる節点の集合（:data:`END` を含みうる）。
+    """
+
+    index: int
+    text: str
+    optional: bool
+    next: frozenset[int]
+
+
+@dataclass(frozen=True)
+class StepMatch:
+    """フレーム内で一致した step。
+
+    Attributes:
+        node: 一致した節点。
+        result: 照合結果（一致した語とスコア）。
+        level: 先読みで飛ばした必須 step の数（0 ならフロンティア内）。
+    """
+
+    node: StepNode
+    result: MatchResult
+    level: int
+
+
+class StepGraph:
+    """コンパイル済みの step グラフ。
+
+    Args:
+        nodes: 節点（``index`` 順）。
+        start: 開始時のフロンティア。
+    """
+
+    def __init__(self, nodes: Sequence[StepNode], start: frozenset[int]) -> None:
+        self.nodes = tuple(nodes)
+        self.start = start
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def texts(self) -> list[str]:
+        """全 step の文字列（記述順）。"""
+        return [n.text for n in self.nodes]
+
+    @property
+    def signature(self) -> str:
+        """グラフの構造（step の文字列と辺）のハッシュ。設定が変わったかの判定に使う。"""
+        shape = [sorted(self.start), [[n.text, n.optional, sorted(n.next)] for n in self.nodes]]
+        return hashlib.blake2b(json.dumps(shape, ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def is_linear(self) -> bool:
+        """分岐・省略のない単純な列か。"""
+        last = len(self.nodes) - 1
+        return self.start == frozenset({0 if self.nodes else END}) and all(not n.optional and n.next == frozenset({n.index + 1 if n.index < last else END}) for n in self.nodes)
+
+    @classmethod
+    def linear(cls, steps: Sequence[str]) -> StepGraph:
+        """文字列の配列（従来の ``steps``）を順番どおりのグラフにする。"""
+        return cls.from_config(list(steps))
+
+    @classmethod
+    def from_config(cls, raw: list[Any]) -> StepGraph:
+        """設定の ``steps`` をコンパイルする。
+
+        Raises:
+            ValueError: 要素の形式が不正な場合。
+        """
+        # 後ろから組み立て、最後に記述順（要素の位置を並べたタプル）で番号を振り直す
+        pending: list[tuple[tuple[int, ...], str, bool, frozenset[int]]] = []
+
+        def node(path: tuple[int, ...], text: str, optional: bool, succ: frozenset[int]) -> frozenset[int]:
+            pending.append((path, text, optional, succ))
+            return frozenset({len(pending) - 1})
+
+        def seq(items: list[Any], succ: frozenset[int], path: tuple[int, ...], optional: bool) -> frozenset[int]:
+            entry = succ
+            for i in range(len(items) - 1, -1, -1):
+                entry = item(items[i], entry, (*path, i), optional)
+            return entry
+
+        def item(spec: Any, succ: frozenset[int], path: tuple[int, ...], optional: bool) -> frozenset[int]:
+            if isinstance(spec, (str, int, float)) and not isinstance(spec, bool):
+                text = str(spec)
+                if not text:
+                    raise ValueError("設定 'steps' に空の文字列があります")
+                return node(path, text, optional, succ)
+            if not isinstance(spec, dict) or len(spec) != 1:
+                raise ValueError(f"{_SPEC_ERROR}: {spec!r}")
+            ((key, value),) = spec.items()
+            if key == "any":
+                if not isinstance(value, list) or not value:
+                    raise ValueError("設定 'steps' の any には文字列の配列を指定してください")
+                entry: frozenset[int] = frozenset()
+                for i, alt in enumerate(value):
+                    if isinstance(alt, (dict, list)):
+                        raise ValueError("設定 'steps' の any の要素は文字列で指定してください（複数 step の候補は branch を使ってください）")
+                    entry |= item(alt, succ, (*path, i), optional)
+                return entry
+            if key == "optional":
+                body = value if isinstance(value, list) else [value]
+                if not body:
+                    raise ValueError("設定 'steps' の optional が空です")
+                return seq(body, succ, path, True) | succ
+            if key == "branch":
+                if not isinstance(value, list) or not value:
+                    raise ValueError("設定 'steps' の branch には step の配列の配列を指定してください")
+                entry = frozenset()
+                for i, arm in enumerate(value):
+                    body = arm if isinstance(arm, list) else [arm]
+                    if not body:
+                        raise ValueError("設定 'steps' の branch に空の分岐があります")
+                    entry |= seq(body, succ, (*path, i), optional)
+                return entry
+            raise ValueError(f"{_SPEC_ERROR}: {key!r}")
+
+        start = seq(raw, frozenset({END}), (), False)
+        order = sorted(range(len(pending)), key=lambda i: pending[i][0])
+        renumber = {old: new for new, old in enumerate(order)}
+        renumber[END] = END
+        nodes = [StepNode(new, pending[old][1], pending[old][2], frozenset(renumber[s] for s in pending[old][3])) for new, old in enumerate(order)]
+        return cls(nodes, frozenset(renumber[s] for s in start))
+
+
+class StepCursor:
+    """step グラフ上の現在位置（フロンティア）と、フレームごとの照合。
+
+    Args:
+        graph: step グラフ。
+        lookahead: フロンティアの step が見つからないとき、その先の必須 step を何個まで
+            先読みして照合するか（0 で先読みしない）。
+    """
+
+    def __init__(self, graph: StepGraph, lookahead: int = 0) -> None:
+        self.graph = graph
+        self.lookahead = max(0, lookahead)
+        self.frontier = graph.start
+
+    @property
+    def done(self) -> bool:
+        """終端まで到達したか（末尾の省略可能な step は待たない）。"""
+        return END in self.frontier or not self.frontier
+
+    @property
+    def current_steps(self) -> tuple[str, ...]:
+        """フロンティアの step の文字列（記述順、重複なし）。"""
+        return tuple(dict.fromkeys(self.graph.nodes[i].text for i in sorted(self.frontier) if i != END))
+
+    def levels(self) -> list[list[StepNode]]:
+        """照合対象の節点を、先読みで飛ばす必須 step の数ごとにまとめる。"""
+        nodes = self.graph.nodes
+        seen: set[int] = set()
+        out: list[list[StepNode]] = []
+        level = self.frontier
+        for _ in range(self.lookahead + 1):
+            current = sorted(i for i in level if i != END and i not in seen)
+            if not current:
+                break
+            seen.update(current)
+            out.append([nodes[i] for i in current])
+            level = frozenset(s for i in current for s in nodes[i].next)
+        return out
+
+    def restore(self, frontier: Sequence[int]) -> None:
+        """保存しておいたフロンティアから再開する。
+
+        Raises:
+            ValueError: グラフに無い節点番号を含む場合。
+        """
+        if any(i != END and not 0 <= i < len(self.graph) for i in frontier):
+            raise ValueError(f"step グラフに無い節点です: {list(frontier)}")
+        self.frontier = frozenset(frontier)
+
+    def advance(self, node: StepNode) -> None:
+        """``node`` をクリックしたものとしてフロンティアを進める。"""
+        self.frontier = node.next
+
+    def select(self, matcher: StepMatcher, words: Sequence[PreparedWord]) -> StepMatch | None:
+        """照合対象の全 step と語を1度に照合し、進めるべき step を選ぶ。
+
+        先読みで飛ばす step の少ないものを優先し、同じ段ではスコアの高いもの、
+        同点なら記述順の早いものを選ぶ。
+        """
+        levels = self.levels()
+        if not levels or not words:
+            return None
+        found = matcher.match_many([n.text for nodes in levels for n in nodes], words)
+        for level, nodes in enumerate(levels):
+            best: StepMatch | None = None
+            for n in nodes:
+                hit = found.get(n.text)
+                if hit is not None and (best is None or hit.score > best.result.score):
+                    best = StepMatch(n, hit, level)
+            if best is not None:
+                return best
+        return None
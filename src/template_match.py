@@ -0,0 +1,273 @@
+"""一度 OCR で見つけた選択肢の画像パッチによる高速判定（テンプレートマッチ）。
+
+OCR で step に一致してクリックした語の矩形を、その時のフレームから切り出して保存しておく。
+以後のフレームでは、現在の step の保存済みパッチを元の位置の近傍（``radius`` ピクセル）で
+正規化相互相関（NCC）により照合し、しきい値以上で一致すれば OCR を呼ばずにその位置を使う。
+
+照合はグレースケール・縮小（``scale`` 分の1）した画素に対して行う。選択肢は同じ位置に
+同じ見た目で出ることが多い（周回プレイ・同じ選択肢の繰り返し）ため、探索範囲は元の位置の
+近傍に限り、元の位置から近い順に試して一致した時点で打ち切る。
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from operator import mul
+from pathlib import Path
+
+from capture import CapturedFrame, crop_frame
+from encode import resize_nearest, to_grayscale
+from roi import Box
+from utils import DeferredSaver, normalize_text_for_matching
+
+# パッチの輝度の標準偏差がこれ未満なら（ほぼ単色で照合に使えないため）保存しない
+_MIN_STDDEV = 8.0
+# 位置の事前選別に使う行の間隔と、事前選別で許すしきい値からの下げ幅
+_PREFILTER_ROW_STEP = 4
+_PREFILTER_MARGIN = 0.15
+
+
+@dataclass(frozen=True)
+class Template:
+    """保存した選択肢のパッチ。
+
+    Attributes:
+        step: 正規化した step の文字列。
+        box: 切り出した矩形（キャプチャ画像内座標）。
+        frame_size: 切り出したフレームの大きさ（大きさが異なるフレームには使わない）。
+        width: 縮小後のパッチの幅。
+        height: 縮小後のパッチの高さ。
+        pixels: 縮小後のグレースケール画素。
+    """
+
+    step: str
+    box: Box
+    frame_size: tuple[int, int]
+    width: int
+    height: int
+    pixels: bytes
+
+    @property
+    def n(self) -> int:
+        return self.width * self.height
+
+    @property
+    def sums(self) -> tuple[int, int]:
+        """画素の和と二乗和。"""
+        return sum(self.pixels), sum(map(mul, self.pixels, self.pixels))
+
+
+@dataclass(frozen=True)
+class TemplateHit:
+    """テンプレートマッチの結果。
+
+    Attributes:
+        box: 一致した位置（キャプチャ画像内座標）。
+        score: 正規化相互相関（-1..1）。
+        template: 一致したパッチ。
+    """
+
+    box: Box
+    score: float
+    template: Template
+
+
+@dataclass
+class TemplateStats:
+    """テンプレートマッチの集計値。"""
+
+    hits: int = 0
+    misses: int = 0
+    learned: int = 0
+
+
+def ncc(a: bytes, b: bytes, a_sums: tuple[int, int] | None = None) -> float:
+    """同じ長さの画素列 ``a`` と ``b`` の正規化相互相関（どちらかが単色なら 0）。"""
+    n = len(a)
+    sa, saa = a_sums if a_sums is not None else (sum(a), sum(map(mul, a, a)))
+    sb, sbb = sum(b), sum(map(mul, b, b))
+    var_a = n * saa - sa * sa
+    var_b = n * sbb - sb * sb
+    if var_a <= 0 or var_b <= 0:
+        return 0.0
+    return (n * sum(map(mul, a, b)) - sa * sb) / math.sqrt(var_a * var_b)
+
+
+class TemplateMatcher:
+    """step ごとの選択肢パッチの保存と照合（スレッドセーフ）。
+
+    Args:
+        threshold: 一致とみなす正規化相互相関の下限。
+        radius: 元の位置からの探索範囲（ピクセル）。
+        scale: 照合時の縮小率の逆数（2 なら縦横 1/2）。
+        max_per_step: step ごとに保存するパッチの上限（古いものから捨てる）。
+        store_path: 任意。パッチを保存する JSON ファイル（再起動後・周回時にも使う）。
+            書き出しはバックグラウンドでまとめて行い、:meth:`close` で残りを書き出す。
+        logger: ロガー。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        radius: int = 8,
+        scale: int = 2,
+        max_per_step: int = 4,
+        store_path: Path | None = None,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.threshold = threshold
+        self.radius = max(0, radius)
+        self.scale = max(1, scale)
+        self.max_per_step = max(1, max_per_step)
+        self.store_path = store_path
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = TemplateStats()
+        self._lock = threading.Lock()
+        self._templates: dict[str, deque[tuple[Template, tuple[int, int]]]] = {}
+        self._saver = DeferredSaver(self._save, "template-writer") if store_path is not None else None
+        if store_path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._templates.values())
+
+    def learn(self, step: str, frame: CapturedFrame, box: Box) -> bool:
+        """OCR で一致してクリックした語のパッチを保存する。保存したら True。"""
+        patch = self._patch(frame, box)
+        if patch is None:
+            return False
+        pixels, width, height, box = patch
+        template = Template(normalize_text_for_matching(step), box, frame.size, width, height, pixels)
+        sums = template.sums
+        if math.sqrt(max(0, template.n * sums[1] - sums[0] ** 2)) / template.n < _MIN_STDDEV:
+            return False
+        with self._lock:
+            entries = self._templates.setdefault(template.step, deque(maxlen=self.max_per_step))
+            # 同じ位置にほぼ同じ見た目のパッチがあれば追加しない
+            for t, t_sums in entries:
+                if t.box == template.box and t.frame_size == template.frame_size and ncc(t.pixels, template.pixels, t_sums) >= 0.99:
+                    return False
+            entries.append((template, sums))
+            self.stats.learned += 1
+        if self._saver is not None:
+            self._saver.mark_dirty()
+        return True
+
+    def close(self) -> None:
+        """書き出し待ちのパッチを書き出し、バックグラウンドの書き出しを止める。"""
+        if self._saver is not None:
+            self._saver.close()
+
+    def find(self, step: str, frame: CapturedFrame) -> TemplateHit | None:
+        """``step`` の保存済みパッチをフレーム内で探す。しきい値未満なら None。"""
+        with self._lock:
+            entries = list(self._templates.get(normalize_text_for_matching(step), ()))
+        if not entries:
+            return None
+        for template, sums in reversed(entries):
+            if template.frame_size != frame.size:
+                continue
+            hit = self._search(template, sums, frame)
+            if hit is not None:
+                with self._lock:
+                    self.stats.hits += 1
+                return hit
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def _patch(self, frame: CapturedFrame, box: Box) -> tuple[bytes, int, int, Box] | None:
+        """``box`` を切り出してグレースケール・縮小する（縮小で割り切れるよう矩形を詰める）。"""
+        s = self.scale
+        x1, y1 = max(0, box[0]), max(0, box[1])
+        x2, y2 = min(frame.width, box[2]), min(frame.height, box[3])
+        width, height = (x2 - x1) // s, (y2 - y1) // s
+        if width < 2 or height < 2:
+            return None
+        box = (x1, y1, x1 + width * s, y1 + height * s)
+        gray = to_grayscale(crop_frame(frame, box).rgb)
+        if s > 1:
+            gray = resize_nearest(gray, width * s, height * s, 1, width, height)
+        return gray, width, height, box
+
+    def _search(self, template: Template, sums: tuple[int, int], frame: CapturedFrame) -> TemplateHit | None:
+        s = self.scale
+        r = self.radius // s * s
+        x1, y1, x2, y2 = template.box
+        area = (max(0, x1 - r), max(0, y1 - r), min(frame.width, x2 + r), min(frame.height, y2 + r))
+        region = self._patch(frame, area)
+        if region is None:
+            return None
+        pixels, rw, rh, area = region
+        w, h = template.width, template.height
+        if rw < w or rh < h:
+            return None
+        cx, cy = (x1 - area[0]) // s, (y1 - area[1]) // s
+        # 一部の行だけで先に相関を見て、明らかに一致しない位置を安く除外する
+        rows = range(0, h, _PREFILTER_ROW_STEP)
+        sub = b"".join(template.pixels[j * w : (j + 1) * w] for j in rows)
+        sub_sums = sum(sub), sum(map(mul, sub, sub))
+        prefilter = self.threshold - _PREFILTER_MARGIN
+        # 元の位置から近い順に試す
+        positions = sorted(((dx, dy) for dy in range(rh - h + 1) for dx in range(rw - w + 1)), key=lambda p: abs(p[0] - cx) + abs(p[1] - cy))
+        for dx, dy in positions:
+            if ncc(sub, b"".join(pixels[(dy + j) * rw + dx : (dy + j) * rw + dx + w] for j in rows), sub_sums) < prefilter:
+                continue
+            window = b"".join(pixels[(dy + j) * rw + dx : (dy + j) * rw + dx + w] for j in range(h))
+            score = ncc(template.pixels, window, sums)
+            if score >= self.threshold:
+                ox, oy = area[0] + dx * s - x1, area[1] + dy * s - y1
+                return TemplateHit(box=(x1 + ox, y1 + oy, x2 + ox, y2 + oy), score=score, template=template)
+        return None
+
+    def _load(self) -> None:
+        assert self.store_path is not None
+        try:
+            raw = json.loads(self.store_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning("テンプレートの読み込みに失敗: %s (%s)", self.store_path, e)
+            return
+        for r in raw:
+            try:
+                t = Template(
+                    step=str(r["step"]),
+                    box=tuple(int(v) for v in r["box"]),  # type: ignore[arg-type]
+                    frame_size=(int(r["frame_size"][0]), int(r["frame_size"][1])),
+                    width=int(r["width"]),
+                    height=int(r["height"]),
+                    pixels=base64.b64decode(r["pixels"]),
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                self.logger.warning("テンプレートの読み込みに失敗: %s (%s)", self.store_path, e)
+                continue
+            if len(t.pixels) == t.n:
+                self._templates.setdefault(t.step, deque(maxlen=self.max_per_step)).append((t, t.sums))
+
+    def _save(self) -> None:
+        if self.store_path is None:
+            return
+        with self._lock:
+            payload = [{"step": t.step, "box": list(t.box), "frame_size": list(t.frame_size), "width": t.width, "height": t.height, "pixels": base64.b64encode(t.pixels).decode("ascii")} for entries in self._templates.values() for t, _ in entries]
+        tmp = self.store_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.store_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.store_path)
+        except OSError as e:
+            self.logger.warning("テンプレートの保存に失敗: %s (%s)", self.store_path, e)
+
+
+def template_store_path(base_dir: Path, title: str) -> Path:
+    """ウィンドウタイトルごとのパッチ保存先（``cache/templates/``）。"""
+    return base_dir / "cache" / "templates" / f"{hashlib.blake2b(title.encode('utf-8'), digest_size=8).hexdigest()}.json"
@@ -5,6 +5,8 @@
 
 from __future__ import annotations
 
+import threading
+from collections.abc import Callable
 from datetime import datetime
 
 
@@ -36,6 +38,30 @@ def ensure_suffix(text: str, suffix: str) -> str:
     return text if text.endswith(suffix) else f"{text}{suffix}"
 
 
+def _build_matching_translation() -> dict[int, int]:
+    """:func:`normalize_text_for_matching` 用の変換テーブルを構築する。"""
+    # 全角スペース U+3000 -> 半角スペース U+0020
+    trans: dict[int, int] = {0x3000: 0x20}
+
+    # 全角数字 U+FF10..U+FF19 -> '0'..'9'
+    for i in range(0xFF10, 0xFF19 + 1):
+        trans[i] = ord("0") + (i - 0xFF10)
+
+    # 全角大文字 U+FF21..U+FF3A -> 'A'..'Z'
+    for i in range(0xFF21, 0xFF3A + 1):
+        trans[i] = ord("A") + (i - 0xFF21)
+
+    # 全角小文字 U+FF41..U+FF5A -> 'a'..'z'
+    for i in range(0xFF41, 0xFF5A + 1):
+        trans[i] = ord("a") + (i - 0xFF41)
+
+    return trans
+
+
+# 変換テーブルは不変なので import 時に1度だけ構築する（毎フレーム呼ばれるため）
+_MATCHING_TRANSLATION = _build_matching_translation()
+
+
 def normalize_text_for_matching(text: str) -> str:
     """名寄せのための簡易正規化を行う。
 
@@ -52,20 +78,64 @@ def normalize_text_for_matching(text: str) -> str:
     Returns:
         名寄せ用に正規化した文字列。
     """
-    # 変換テーブルを動的に構築（範囲ごとに半角へ）
-    # 全角スペース U+3000 -> 半角スペース U+0020
-    trans: dict[int, int] = {0x3000: 0x20}
+    return text.translate(_MATCHING_TRANSLATION)
 
-    # 全角数字 U+FF10..U+FF19 -> '0'..'9'
-    for i in range(0xFF10, 0xFF19 + 1):
-        trans[i] = ord('0') + (i - 0xFF10)
 
-    # 全角大文字 U+FF21..U+FF3A -> 'A'..'Z'
-    for i in range(0xFF21, 0xFF3A + 1):
-        trans[i] = ord('A') + (i - 0xFF21)
+class DeferredSaver:
+    """変更の印を付けると、バックグラウンドスレッドが ``save`` を呼んでファイルへ書き出す。
 
-    # 全角小文字 U+FF41..U+FF5A -> 'a'..'z'
-    for i in range(0xFF41, 0xFF5A + 1):
-        trans[i] = ord('a') + (i - 0xFF41)
+    印を付ける側（自動操作ループのスレッド）は書き出しを待たない。``min_interval`` 秒の間に
+    続いた変更は1回の書き出しにまとめる。スレッドは最初に印を付けたときに起動し、
+    :meth:`close` で残りを書き出してから止める。
+
+    Args:
+        save: 書き出す関数（ファイル全体を書き直す。失敗はこの関数の中で処理しておく）。
+        name: スレッド名。
+        min_interval: 書き出しの最小間隔（秒）。
+    """
 
-    return text.translate(trans)
+    def __init__(self, save: Callable[[], None], name: str, min_interval: float = 1.0) -> None:
+        self._save = save
+        self.name = name
+        self.min_interval = max(0.0, min_interval)
+        self.writes = 0
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def mark_dirty(self) -> None:
+        """書き出しを予約する（:meth:`close` の後は、その場で書き出す）。"""
+        with self._cond:
+            if not self._closed:
+                self._dirty = True
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+                return
+        self._save()
+        self.writes += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """予約済みの書き出しを済ませてからスレッドを止める。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if not self._dirty:
+                    return
+                self._dirty = False
+            self._save()
+            self.writes += 1
+            with self._cond:
+                # 続けて変更されても、閉じるまでは min_interval 秒に1回にまとめる
+                self._cond.wait_for(lambda: self._closed, timeout=self.min_interval)
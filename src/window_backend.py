@@ -0,0 +1,286 @@
+"""ウィンドウ操作のバックエンド（実機の Win32 / テスト・ベンチマーク用の疑似実装）。
+
+自動操作ループは毎フレーム対象ウィンドウを解決する。全ウィンドウの列挙（``EnumWindows``
+と全タイトルの取得）は重いため、:class:`WindowResolver` は前回のハンドルを覚えておき、
+「まだ存在して表示されている」「タイトルが一致する」ことを安価に確認できれば列挙を省略する。
+
+- :class:`Win32Backend`: ``windows`` モジュール（ctypes で Win32 API を呼ぶ）を使う実機用
+- :class:`FakeBackend`: プロセス内の疑似ウィンドウ。Linux でも解決・クリック処理を動かせる
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Protocol
+
+# スクリーン座標の矩形 (left, top, right, bottom)
+WindowRect = tuple[int, int, int, int]
+
+
+@dataclass
+class WindowInfo:
+    """ウィンドウ情報。"""
+
+    hwnd: int
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def width(self) -> int:
+        return max(0, self.right - self.left)
+
+    @property
+    def height(self) -> int:
+        return max(0, self.bottom - self.top)
+
+
+class WindowBackend(Protocol):
+    """ウィンドウの検索・前面化・クリックを行うバックエンド。"""
+
+    def find_window(self, partial: str) -> int | None:
+        """タイトルに部分一致する最前面のウィンドウを全列挙で探す。"""
+        ...
+
+    def is_window(self, hwnd: int) -> bool:
+        """ハンドルがまだ有効で表示されているか。"""
+        ...
+
+    def window_title(self, hwnd: int) -> str: ...
+
+    def window_rect(self, hwnd: int) -> WindowRect: ...
+
+    def foreground_window(self) -> int | None: ...
+
+    def is_minimized(self, hwnd: int) -> bool: ...
+
+    def bring_to_foreground(self, hwnd: int) -> None: ...
+
+    def click(self, x: int, y: int) -> None:
+        """スクリーン座標を左クリックする。"""
+        ...
+
+    def press_key(self, vk: int) -> None:
+        """前面のウィンドウへキー（仮想キーコード）を送る。"""
+        ...
+
+
+class Win32Backend:
+    """Win32 API（``windows`` モジュール）を使うバックエンド。"""
+
+    def __init__(self) -> None:
+        # 遅延インポート（macOS / Linux の開発環境でも import 可能にするため）
+        import windows  # type: ignore
+
+        self._w = windows
+
+    def find_window(self, partial: str) -> int | None:
+        return self._w.find_window_by_partial_title(partial)
+
+    def is_window(self, hwnd: int) -> bool:
+        return self._w.is_window(hwnd)
+
+    def window_title(self, hwnd: int) -> str:
+        return self._w.get_window_title(hwnd)
+
+    def window_rect(self, hwnd: int) -> WindowRect:
+        r = self._w.get_window_rect(hwnd)
+        return r.left, r.top, r.right, r.bottom
+
+    def foreground_window(self) -> int | None:
+        return self._w.get_foreground_window()
+
+    def is_minimized(self, hwnd: int) -> bool:
+        return self._w.is_minimized(hwnd)
+
+    def bring_to_foreground(self, hwnd: int) -> None:
+        self._w.bring_to_foreground(hwnd)
+
+    def click(self, x: int, y: int) -> None:
+        self._w.click_screen(x, y)
+
+    def press_key(self, vk: int) -> None:
+        self._w.press_key(vk)
+
+
+@dataclass
+class FakeWindow:
+    """:class:`FakeBackend` の疑似ウィンドウ。"""
+
+    title: str
+    rect: WindowRect
+    visible: bool = True
+    minimized: bool = False
+
+
+@dataclass
+class FakeBackend:
+    """プロセス内の疑似ウィンドウを操作するバックエンド（スレッドセーフ）。
+
+    ``windows`` は Z オーダー順（先頭が最前面）。呼び出し回数を数えるので、
+    キャッシュの効果をテスト・ベンチマークで確認できる。
+
+    Attributes:
+        on_click: 任意。クリックされたスクリーン座標を受け取るコールバック（画面遷移の模擬に使う）。
+        on_key: 任意。押されたキーを受け取るコールバック。
+    """
+
+    windows: dict[int, FakeWindow] = field(default_factory=dict)
+    foreground: int | None = None
+    on_click: Callable[[int, int], None] | None = None
+    on_key: Callable[[int], None] | None = None
+    clicks: list[tuple[int, int]] = field(default_factory=list)
+    keys: list[int] = field(default_factory=list)
+    enumerations: int = 0
+    foreground_calls: int = 0
+    _next_hwnd: int = 0x1000
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_window(self, title: str, rect: WindowRect = (0, 0, 800, 600)) -> int:
+        """最前面に疑似ウィンドウを追加してハンドルを返す。"""
+        with self._lock:
+            self._next_hwnd += 4
+            hwnd = self._next_hwnd
+            self.windows = {hwnd: FakeWindow(title, rect), **self.windows}
+            return hwnd
+
+    def close_window(self, hwnd: int) -> None:
+        with self._lock:
+            self.windows.pop(hwnd, None)
+            if self.foreground == hwnd:
+                self.foreground = None
+
+    def find_window(self, partial: str) -> int | None:
+        with self._lock:
+            self.enumerations += 1
+            for hwnd, w in self.windows.items():
+                if w.visible and partial in w.title:
+                    return hwnd
+            return None
+
+    def is_window(self, hwnd: int) -> bool:
+        with self._lock:
+            w = self.windows.get(hwnd)
+            return w is not None and w.visible
+
+    def window_title(self, hwnd: int) -> str:
+        with self._lock:
+            w = self.windows.get(hwnd)
+            return w.title if w is not None else ""
+
+    def window_rect(self, hwnd: int) -> WindowRect:
+        with self._lock:
+            w = self.windows.get(hwnd)
+            return w.rect if w is not None else (0, 0, 0, 0)
+
+    def foreground_window(self) -> int | None:
+        return self.foreground
+
+    def is_minimized(self, hwnd: int) -> bool:
+        with self._lock:
+            w = self.windows.get(hwnd)
+            return w is not None and w.minimized
+
+    def bring_to_foreground(self, hwnd: int) -> None:
+        with self._lock:
+            self.foreground_calls += 1
+            w = self.windows.get(hwnd)
+            if w is not None:
+                w.minimized = False
+                self.foreground = hwnd
+
+    def click(self, x: int, y: int) -> None:
+        with self._lock:
+            self.clicks.append((x, y))
+        if self.on_click is not None:
+            self.on_click(x, y)
+
+    def press_key(self, vk: int) -> None:
+        with self._lock:
+            self.keys.append(vk)
+        if self.on_key is not None:
+            self.on_key(vk)
+
+
+def default_backend() -> WindowBackend:
+    """実行環境の既定バックエンド（Windows 以外では使えない）。
+
+    Raises:
+        RuntimeError: Windows 以外で呼ばれた場合。
+    """
+    if sys.platform != "win32":
+        raise RuntimeError("ウィンドウ操作は Windows でのみ利用できます（テストには FakeBackend を使ってください）")
+    return Win32Backend()
+
+
+@dataclass
+class ResolverStats:
+    """:class:`WindowResolver` の集計値。"""
+
+    resolves: int = 0
+    cache_hits: int = 0
+    enumerations: int = 0
+    moves: int = 0
+
+
+class WindowResolver:
+    """対象ウィンドウを解決して前面化する（前回のハンドルを再利用する）。
+
+    毎回の解決では、前回のハンドルが有効かつタイトルが一致すれば全列挙を省略する。
+    すでに前面にあるウィンドウは前面化しない。
+
+    Args:
+        backend: ウィンドウ操作のバックエンド。
+        title: 部分一致させるウィンドウタイトル。
+        logger: ロガー。
+    """
+
+    def __init__(self, backend: WindowBackend, title: str, logger: logging.Logger) -> None:
+        self.backend = backend
+        self.title = title
+        self.logger = logger
+        self.stats = ResolverStats()
+        self._hwnd: int | None = None
+        self._rect: WindowRect | None = None
+
+    def invalidate(self) -> None:
+        """キャッシュしたハンドルを捨て、次回は全列挙する。"""
+        self._hwnd = None
+        self._rect = None
+
+    def resolve(self) -> WindowInfo:
+        """ウィンドウを解決し、前面化して位置を返す。
+
+        Raises:
+            RuntimeError: ウィンドウが見つからない場合。
+        """
+        self.stats.resolves += 1
+        backend = self.backend
+        hwnd = self._hwnd
+        if hwnd is not None and backend.is_window(hwnd) and self.title in backend.window_title(hwnd):
+            self.stats.cache_hits += 1
+        else:
+            self.stats.enumerations += 1
+            hwnd = backend.find_window(self.title)
+            if not hwnd:
+                self.invalidate()
+                raise RuntimeError(f"ウィンドウが見つかりません: '{self.title}'")
+            if hwnd != self._hwnd:
+                self.logger.debug("ターゲットウィンドウ hwnd=%#x", hwnd)
+            self._hwnd = hwnd
+            self._rect = None
+
+        if backend.foreground_window() != hwnd or backend.is_minimized(hwnd):
+            backend.bring_to_foreground(hwnd)
+        rect = backend.window_rect(hwnd)
+        if rect != self._rect:
+            if self._rect is not None:
+                self.stats.moves += 1
+            self.logger.debug("ターゲットウィンドウ rect=%s", rect)
+            self._rect = rect
+        return WindowInfo(hwnd, *rect)
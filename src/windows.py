@@ -76,6 +76,26 @@ def find_window_by_partial_title(partial: str) -> int | None:
     return matched
 
 
+def is_window(hwnd: int) -> bool:
+    """ハンドルがまだ有効で、表示されているか（列挙せずに確認する）。"""
+    return bool(user32.IsWindow(hwnd)) and _is_window_visible(hwnd)
+
+
+def get_window_title(hwnd: int) -> str:
+    """ウィンドウのタイトルを取得。"""
+    return _get_window_text(hwnd)
+
+
+def get_foreground_window() -> int | None:
+    """現在の前面ウィンドウのハンドル（無ければ ``None``）。"""
+    return user32.GetForegroundWindow() or None
+
+
+def is_minimized(hwnd: int) -> bool:
+    """ウィンドウが最小化されているか。"""
+    return bool(user32.IsIconic(hwnd))
+
+
 def bring_to_foreground(hwnd: int) -> None:
     """対象ウィンドウをアクティブ化して前面へ。"""
     SW_RESTORE = 9
@@ -99,3 +119,12 @@ def click_screen(x: int, y: int) -> None:
     user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
     time.sleep(0.03)
     user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+
+
+def press_key(vk: int) -> None:
+    """前面のウィンドウへ仮想キーコード ``vk`` のキーを押して離す。"""
+    KEYEVENTF_KEYUP = 0x0002
+
+    user32.keybd_event(vk, 0, 0, 0)
+    time.sleep(0.03)
+    user32.keybd_event(vk, 0, KEYEVENTF_KEYUP, 0)
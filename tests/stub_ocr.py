@@ -0,0 +1,209 @@
+"""テスト用の疑似 OCR サーバー（ローカルの ``http.server``）。
+
+受け取った PNG を実際に復号し、``markers`` に登録した画素値（グレースケールなら輝度、
+RGB なら R チャネル）の領域を、その値に対応する文字列の語として返す。
+送られてきた画像の大きさは :attr:`StubOcrServer.requests` に記録する。
+:class:`FakeGame` と :func:`run_game` で、疑似ウィンドウに映した画面に対して自動操作ループを動かせる。
+
+テストモジュールは最初にこのモジュールを import する（``src/`` を import パスに加える）。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections.abc import Mapping, Sequence
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+if TYPE_CHECKING:
+    from automation import RunStats
+
+
+def decode_png(png: bytes) -> tuple[int, int, int, bytes]:
+    """フィルタなし（各行 0）の 8bit PNG を (幅, 高さ, チャネル数, 画素) に復号する。"""
+    i = 8
+    width = height = channels = 0
+    idat = b""
+    while i < len(png):
+        (n,) = struct.unpack(">I", png[i : i + 4])
+        tag, body = png[i + 4 : i + 8], png[i + 8 : i + 8 + n]
+        i += 12 + n
+        if tag == b"IHDR":
+            width, height, _, color_type = struct.unpack(">2I2B", body[:10])
+            channels = 1 if color_type == 0 else 3
+        elif tag == b"IDAT":
+            idat += body
+    raw = zlib.decompress(idat)
+    stride = width * channels + 1
+    return width, height, channels, b"".join(raw[y * stride + 1 : (y + 1) * stride] for y in range(height))
+
+
+def find_markers(width: int, height: int, channels: int, pixels: bytes, markers: Mapping[int, str]) -> list[dict]:
+    """``markers`` の画素値ごとに、その値の画素を包む矩形を語として返す。"""
+    boxes: dict[int, list[int]] = {}
+    for y in range(height):
+        row = pixels[y * width * channels : (y + 1) * width * channels : channels]
+        for x, v in enumerate(row):
+            if v in markers:
+                b = boxes.get(v)
+                if b is None:
+                    boxes[v] = [x, y, x + 1, y + 1]
+                else:
+                    b[0], b[1], b[2], b[3] = min(b[0], x), min(b[1], y), max(b[2], x + 1), max(b[3], y + 1)
+    return [{"content": markers[v], "box": b} for v, b in boxes.items()]
+
+
+def fill_rect(rgb: bytearray, width: int, box: tuple[int, int, int, int], value: int) -> None:
+    """RGB 画素列の矩形 ``box`` を画素値 ``value`` の灰色で塗る。"""
+    x1, y1, x2, y2 = box
+    for y in range(y1, y2):
+        rgb[(y * width + x1) * 3 : (y * width + x2) * 3] = bytes([value]) * ((x2 - x1) * 3)
+
+
+class StubOcrServer:
+    """``/analyze`` と ``/health`` に応答する疑似 OCR サーバー。
+
+    Args:
+        markers: 画素値 -> 語の文字列。
+        name: 応答の ``server`` に入れる名前（どのサーバーが応答したかの確認用）。
+        delay: ``/analyze`` の応答前に待つ秒数（実行中に変えてよい）。
+        status: ``/analyze`` の HTTP ステータス（200 以外なら本文なしで返す。実行中に変えてよい）。
+    """
+
+    def __init__(self, markers: Mapping[int, str] | None = None, *, name: str = "stub", delay: float = 0.0, status: int = 200) -> None:
+        self.markers = dict(markers or {})
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.requests: list[tuple[int, int]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-ocr-{name}", daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> StubOcrServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def analyze(self, body: bytes) -> dict:
+        """リクエスト本文（multipart）から PNG を取り出して語を返す。"""
+        png = body[body.index(b"\x89PNG") : body.index(b"IEND") + 8]
+        width, height, channels, pixels = decode_png(png)
+        with self._lock:
+            self.requests.append((width, height))
+        return {"server": self.name, "content": [{"words": find_markers(width, height, channels, pixels, self.markers)}]}
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, obj: dict | None) -> None:
+                out = json.dumps(obj).encode() if obj is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if stub.delay > 0:
+                    time.sleep(stub.delay)
+                if stub.status != 200:
+                    self._reply(stub.status, None)
+                    return
+                self._reply(200, stub.analyze(body))
+
+            def do_GET(self) -> None:
+                self._reply(200, {"status": "ok"})
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+class FakeGame:
+    """クリックで画面が進む疑似ゲーム（:class:`capture.SyntheticSource` の描画と FakeBackend のクリック先）。
+
+    Args:
+        screens: 画面ごとの (画素値, 矩形) の列。クリック位置を含む矩形があれば次の画面へ進む。
+        background: 背景の画素値。
+    """
+
+    def __init__(self, screens: Sequence[Sequence[tuple[int, tuple[int, int, int, int]]]], background: int = 40) -> None:
+        self.screens = [list(s) for s in screens]
+        self.background = background
+        self.screen = 0
+        self.clicks: list[tuple[int, int]] = []
+
+    def render(self, seq: int, width: int, height: int) -> bytes:
+        rgb = bytearray([self.background]) * (width * height * 3)
+        for value, box in self.screens[self.screen]:
+            fill_rect(rgb, width, box, value)
+        return bytes(rgb)
+
+    def click(self, x: int, y: int) -> None:
+        self.clicks.append((x, y))
+        for _, box in self.screens[self.screen]:
+            if box[0] <= x < box[2] and box[1] <= y < box[3]:
+                self.screen = min(self.screen + 1, len(self.screens) - 1)
+                return
+
+
+def run_game(game: FakeGame, server: StubOcrServer, steps: Sequence[str], *, size: tuple[int, int] = (200, 160), timeout: float = 10.0, **options: Any) -> RunStats:
+    """``game`` を疑似ウィンドウに映して ``run_automation`` を実行し、集計値を返す。
+
+    Raises:
+        AssertionError: ``timeout`` 秒以内に全 step を終えなかった場合。
+    """
+    from automation import run_automation
+    from capture import CaptureEngine, SyntheticSource
+    from config import AppConfig
+    from window_backend import FakeBackend
+
+    backend = FakeBackend(on_click=game.click)
+    backend.add_window("game", (0, 0, *size))
+    defaults: dict[str, Any] = {
+        "interval": 1,
+        "min_interval": 0.01,
+        "max_ocr_rate": 0,
+        "capture_keep_height": None,
+        "capture_archive": False,
+        "checkpoint": False,
+        "ocr_cache_size": 0,
+    }
+    config = AppConfig(title="game", steps=list(steps), ocr_api_endpoint=server.endpoint, **{**defaults, **options})
+    logger = logging.getLogger("stub_ocr.run_game")
+    logger.setLevel(logging.WARNING)
+    result: list[RunStats] = []
+    with tempfile.TemporaryDirectory() as base_dir:
+        engine = CaptureEngine(SyntheticSource(game.render))
+        thread = threading.Thread(target=lambda: result.append(run_automation(Path(base_dir), config, logger, backend=backend, capture=engine)), daemon=True)
+        thread.start()
+        thread.join(timeout)
+    if thread.is_alive() or not result:
+        raise AssertionError(f"{timeout} 秒以内に全 step を終えませんでした（画面 {game.screen}, クリック {game.clicks}）")
+    return result[0]
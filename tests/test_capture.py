@@ -0,0 +1,36 @@
+"""キャプチャエンジンのリングバッファの上書き判定を確かめる。"""
+
+from __future__ import annotations
+
+import unittest
+
+from stub_ocr import fill_rect  # src/ を import パスに加える
+
+from capture import CaptureEngine, SyntheticSource
+
+
+def _render(seq: int, width: int, height: int) -> bytes:
+    # 画素値をキャプチャ連番にする（どのキャプチャの画素かを見分ける）
+    rgb = bytearray(width * height * 3)
+    fill_rect(rgb, width, (0, 0, width, height), seq)
+    return bytes(rgb)
+
+
+class CopyIfLiveTest(unittest.TestCase):
+    def test_copy_survives_overwrite(self) -> None:
+        engine = CaptureEngine(SyntheticSource(_render), slots=2)
+        frame = engine.grab(0, 0, 4, 2)
+        copy = engine.copy_if_live(frame)
+        assert copy is not None
+        self.assertIsInstance(copy.rgb, bytes)
+        self.assertEqual((copy.seq, copy.size), (frame.seq, frame.size))
+
+        engine.grab(0, 0, 4, 2)
+        engine.grab(0, 0, 4, 2)
+        # 同じスロットが次のキャプチャで上書きされた: 元のフレームはもう使えないが、コピーは残る
+        self.assertIsNone(engine.copy_if_live(frame))
+        self.assertEqual(copy.rgb, bytes([frame.seq]) * (4 * 2 * 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
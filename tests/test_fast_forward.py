@@ -0,0 +1,106 @@
+"""早送りモードの、判定を逃した選択肢画面での OCR への切り替えと送り操作の条件を確かめる。"""
+
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+from typing import ClassVar
+
+from stub_ocr import FakeGame, StubOcrServer, run_game  # src/ を import パスに加える
+
+W, H = 200, 160
+# 送り操作のクリック位置（既定: 下端付近の中央）
+ADVANCE = (W // 2, H * 9 // 10)
+OPTION = (60, 60, 140, 80)
+OPTION_CENTER = (100, 70)
+
+
+class MenuGame(FakeGame):
+    """送り操作では進まない画面を持つ疑似ゲーム。
+
+    ``striped`` の画面には文字の行に見える縞模様を2行描き（選択肢画面らしく見せる）、
+    ``switch_after`` 秒経つと最初の画面から次の画面へ進む。クリックは画面の番号と一緒に記録する。
+    """
+
+    def __init__(self, screens: list, striped: frozenset[int] = frozenset(), switch_after: float | None = None) -> None:
+        super().__init__(screens)
+        self.striped = striped
+        self.switch_at = time.monotonic() + switch_after if switch_after is not None else None
+        self.screen_clicks: list[tuple[int, int, int]] = []
+
+    def render(self, seq: int, width: int, height: int) -> bytes:
+        if self.switch_at is not None and self.screen == 0 and time.monotonic() >= self.switch_at:
+            self.screen = 1
+        rgb = bytearray(super().render(seq, width, height))
+        if self.screen in self.striped:
+            for y1, y2 in ((30, 40), (100, 110)):
+                for y in range(y1, y2):
+                    for x in range(20, 180, 6):
+                        rgb[(y * width + x) * 3 : (y * width + x + 3) * 3] = b"\xff" * 9
+        return bytes(rgb)
+
+    def click(self, x: int, y: int) -> None:
+        self.screen_clicks.append((self.screen, x, y))
+        super().click(x, y)
+
+
+class JudgeAdvanceGame(MenuGame):
+    """最初の画面が、判定段（OCR で一致が無かった後）の送り操作でだけ進む疑似ゲーム。
+
+    パイプラインモードのキャプチャ段による早送りでは進まないため、送りのクリックが
+    確認の OCR の後にだけ効く。
+    """
+
+    def click(self, x: int, y: int) -> None:
+        if self.screen == 0 and threading.current_thread().name == "pipeline-capture":
+            self.screen_clicks.append((self.screen, x, y))
+            self.clicks.append((x, y))
+            return
+        super().click(x, y)
+
+
+class FastForwardTest(unittest.TestCase):
+    options: ClassVar[dict] = {"fast_forward": True, "fast_forward_interval": 0.02}
+
+    def test_single_option_menu_is_ocrd_when_advancing_does_nothing(self) -> None:
+        # 選択肢が1つだけのメニューは選択肢画面と判定されず、送り操作では先へ進まない
+        game = MenuGame([[(101, OPTION)], [(102, OPTION)]])
+        with StubOcrServer({101: "始める", 102: "終わる"}) as server:
+            stats = run_game(game, server, ["始める", "終わる"], size=(W, H), **self.options)
+        self.assertEqual([c for c in game.clicks if c != ADVANCE], [OPTION_CENTER, OPTION_CENTER])
+        self.assertGreaterEqual(stats.fast_forward_checks, 2)
+        self.assertEqual(stats.steps_done, 2)
+
+    def test_periodic_ocr_without_change_detection(self) -> None:
+        game = MenuGame([[(101, OPTION)], [(102, OPTION)]])
+        with StubOcrServer({101: "始める", 102: "終わる"}) as server:
+            stats = run_game(game, server, ["始める", "終わる"], size=(W, H), change_threshold=-1.0, fast_forward_ocr_every=5, **self.options)
+        self.assertEqual(stats.steps_done, 2)
+        self.assertGreaterEqual(stats.fast_forward_checks, 2)
+        # 送り操作 5 回ごとに OCR する
+        self.assertLessEqual(stats.advances, 5 * stats.fast_forward_checks)
+
+    def test_no_advance_on_unmatched_likely_choice(self) -> None:
+        # 選択肢画面らしいが step に一致しない画面では、送りのクリックをせずに画面が変わるのを待つ
+        game = MenuGame([[(101, (60, 50, 140, 60))], [(102, OPTION)]], striped=frozenset({0}), switch_after=1.0)
+        with StubOcrServer({101: "別の道", 102: "終わる"}) as server:
+            run_game(game, server, ["終わる"], size=(W, H), **self.options)
+        self.assertEqual([c for c in game.screen_clicks if c[0] == 0], [])
+        self.assertIn((1, *OPTION_CENTER), game.screen_clicks)
+        self.assertGreaterEqual(len(server.requests), 1)
+
+    def test_pipelined_advance_drops_frames_captured_before_it(self) -> None:
+        # 会話画面の確認の OCR で一致が無く送ると、選択肢画面が出る。その下端に別の選択肢があり、
+        # 送る前にキャプチャした会話画面のフレームでもう一度送ると、それを選んでしまう
+        dialogue = [(100, (0, 120, W, H))]
+        menu = [(102, OPTION), (103, (60, 136, 140, 152))]
+        game = JudgeAdvanceGame([dialogue, menu, []], striped=frozenset({1}))
+        with StubOcrServer({102: "終わる", 103: "別の道"}, delay=0.15) as server:
+            run_game(game, server, ["終わる"], size=(W, H), pipeline=True, fast_forward_max_static=1, **self.options)
+        self.assertNotIn((1, *ADVANCE), game.screen_clicks)
+        self.assertIn((1, *OPTION_CENTER), game.screen_clicks)
+
+
+if __name__ == "__main__":
+    unittest.main()
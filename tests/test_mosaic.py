@@ -0,0 +1,96 @@
+"""モザイク OCR の配置（棚詰め）と、返ってきた語の振り分け・座標の戻しを疑似 OCR サーバーで確かめる。"""
+
+from __future__ import annotations
+
+import logging
+import unittest
+from contextlib import ExitStack
+
+from stub_ocr import StubOcrServer, fill_rect  # src/ を import パスに加える
+
+from capture import CapturedFrame
+from encode import EncodeOptions
+from mosaic import MosaicBatcher, MosaicLayout, Placement, analyze_mosaic
+from ocr import OcrClient
+
+W, H = 40, 30
+PAD = 8
+# 画像ごとの (画素値, 画像内の矩形)。縮小しても座標が割り切れるよう偶数にそろえる
+WORDS = [
+    (101, (4, 4, 20, 12)),
+    (102, (18, 10, 36, 26)),
+    (103, (0, 0, 12, 8)),
+    (104, (28, 20, 40, 30)),
+    (105, (10, 14, 30, 22)),
+]
+MARKERS = {value: f"語{value}" for value, _ in WORDS}
+
+
+def _frame(value: int, box: tuple[int, int, int, int]) -> CapturedFrame:
+    rgb = bytearray([40]) * (W * H * 3)
+    fill_rect(rgb, W, box, value)
+    return CapturedFrame(rgb=bytes(rgb), width=W, height=H)
+
+
+class MosaicTest(unittest.TestCase):
+    def setUp(self) -> None:
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        self.server = stack.enter_context(StubOcrServer(MARKERS))
+        self.logger = logging.getLogger("test_mosaic")
+        self.logger.setLevel(logging.ERROR)
+        self.client = OcrClient(self.server.endpoint, max_retries=0, backoff_base=0.0, logger=self.logger)
+        stack.callback(self.client.close)
+        self.frames = [_frame(value, box) for value, box in WORDS]
+
+    def _layout(self, max_width: int, count: int) -> MosaicLayout:
+        layout = MosaicLayout(max_width, 1000, PAD)
+        for _ in range(count):
+            layout.add(W, H)
+        return layout
+
+    def _assert_words(self, parts: list, words: list) -> None:
+        for part, (value, box) in zip(parts, words, strict=True):
+            self.assertEqual([(p.text, p.box) for p in part.paragraphs], [(MARKERS[value], box)])
+
+    def test_words_are_split_back_to_each_crop(self) -> None:
+        layout = self._layout(1000, 3)
+        self.assertEqual([pl.x for pl in layout.placements], [PAD, PAD * 2 + W, PAD * 3 + W * 2])
+        parts, orphans = analyze_mosaic(self.client, self.frames[:3], layout, EncodeOptions())
+        self.assertEqual(orphans, 0)
+        self._assert_words(parts, WORDS[:3])
+        self.assertEqual(self.server.requests, [(layout.width, layout.height)])
+        self.assertEqual([p.batch_size for p in parts], [3, 3, 3])
+
+    def test_scaled_boxes_are_mapped_back(self) -> None:
+        layout = self._layout(1000, 3)
+        parts, orphans = analyze_mosaic(self.client, self.frames[:3], layout, EncodeOptions(scale=0.5))
+        self.assertEqual(orphans, 0)
+        self.assertEqual(self.server.requests, [(layout.width // 2, layout.height // 2)])
+        self._assert_words(parts, WORDS[:3])
+
+    def test_shelf_wraps_to_next_row(self) -> None:
+        # 2枚で1行が埋まる幅: 3枚目は次の行の先頭に置く
+        layout = self._layout(PAD * 3 + W * 2, 3)
+        self.assertEqual(
+            layout.placements,
+            [Placement(PAD, PAD, W, H), Placement(PAD * 2 + W, PAD, W, H), Placement(PAD, PAD * 2 + H, W, H)],
+        )
+        self.assertEqual((layout.width, layout.height), (PAD * 3 + W * 2, PAD * 3 + H * 2))
+        parts, orphans = analyze_mosaic(self.client, self.frames[:3], layout, EncodeOptions(scale=0.5))
+        self.assertEqual(orphans, 0)
+        self._assert_words(parts, WORDS[:3])
+
+    def test_batcher_sends_overflow_in_another_request(self) -> None:
+        # 2列 x 2行までしか入らない: 5枚目は次の要求で送る
+        size = (PAD * 3 + W * 2, PAD * 3 + H * 2)
+        batcher = MosaicBatcher(self.client, max_delay=0.0, max_size=size, padding=PAD, logger=self.logger)
+        parts = batcher.recognize(self.frames)
+        self._assert_words(parts, WORDS)
+        self.assertEqual(self.server.requests, [size, (PAD * 2 + W, PAD * 2 + H)])
+        self.assertEqual([p.batch_size for p in parts], [4, 4, 4, 4, 1])
+        self.assertEqual((batcher.stats.requests, batcher.stats.images, batcher.stats.saved), (2, 5, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
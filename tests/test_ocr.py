@@ -0,0 +1,66 @@
+"""OCR API の呼び出しと OcrClient のサーキットブレーカーを疑似 OCR サーバーで確かめる。"""
+
+from __future__ import annotations
+
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+import requests
+from stub_ocr import StubOcrServer, fill_rect  # src/ を import パスに加える
+
+from capture import CapturedFrame
+from encode import encode_frame
+from ocr import OcrClient, OcrUnavailableError, call_ocr_api, call_ocr_api_bytes
+
+_IMAGE = encode_frame(CapturedFrame(rgb=bytes(16 * 8 * 3), width=16, height=8)).data
+
+
+class CallOcrApiTest(unittest.TestCase):
+    def test_file_and_bytes_send_the_same_image(self) -> None:
+        rgb = bytearray(32 * 16 * 3)
+        fill_rect(rgb, 32, (4, 2, 20, 10), 101)
+        image = encode_frame(CapturedFrame(rgb=bytes(rgb), width=32, height=16)).data
+        with StubOcrServer({101: "進む"}) as server, tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "capture.png"
+            path.write_bytes(image)
+            from_file = call_ocr_api(server.endpoint + "/", path)
+            from_bytes = call_ocr_api_bytes(server.endpoint, memoryview(image))
+        self.assertEqual(from_file, from_bytes)
+        self.assertEqual(from_bytes["content"][0]["words"], [{"content": "進む", "box": [4, 2, 20, 10]}])
+        self.assertEqual(server.requests, [(32, 16), (32, 16)])
+
+
+class OcrClientBreakerTest(unittest.TestCase):
+    def _client(self, server: StubOcrServer) -> OcrClient:
+        logger = logging.getLogger("test_ocr")
+        logger.setLevel(logging.CRITICAL)
+        client = OcrClient(server.endpoint, max_retries=0, backoff_base=0.0, failure_threshold=3, probe_interval=60.0, logger=logger)
+        self.addCleanup(client.close)
+        return client
+
+    def test_client_errors_do_not_open_breaker(self) -> None:
+        with StubOcrServer(status=413) as server:
+            client = self._client(server)
+            for _ in range(5):
+                with self.assertRaises(requests.HTTPError):
+                    client.analyze(_IMAGE)
+            self.assertTrue(client.is_available)
+            self.assertEqual(client.stats.failures, 5)
+            server.status = 200
+            self.assertIn("content", client.analyze(_IMAGE))
+
+    def test_server_errors_open_breaker(self) -> None:
+        with StubOcrServer(status=503) as server:
+            client = self._client(server)
+            for _ in range(3):
+                with self.assertRaises(requests.HTTPError):
+                    client.analyze(_IMAGE)
+            self.assertFalse(client.is_available)
+            with self.assertRaises(OcrUnavailableError):
+                client.analyze(_IMAGE)
+
+
+if __name__ == "__main__":
+    unittest.main()
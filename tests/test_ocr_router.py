@@ -0,0 +1,89 @@
+"""OcrRouter の振り分け・ヘッジ送信・フェイルオーバーを疑似 OCR サーバーで確かめる。"""
+
+from __future__ import annotations
+
+import logging
+import time
+import unittest
+from contextlib import ExitStack
+
+import requests
+from stub_ocr import StubOcrServer  # src/ を import パスに加える
+
+from capture import CapturedFrame
+from encode import encode_frame
+from ocr import OcrClient
+from ocr_router import OcrRouter
+
+_IMAGE = encode_frame(CapturedFrame(rgb=bytes(16 * 8 * 3), width=16, height=8)).data
+
+
+class OcrRouterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stack = ExitStack()
+        self.addCleanup(self.stack.close)
+
+    def _router(self, *servers: StubOcrServer, hedge: bool = False) -> OcrRouter:
+        for server in servers:
+            self.stack.enter_context(server)
+        logger = logging.getLogger("test_ocr_router")
+        logger.setLevel(logging.ERROR)
+        clients = [OcrClient(s.endpoint, max_retries=0, backoff_base=0.0, logger=logger) for s in servers]
+        router = OcrRouter(clients, health_interval=0, hedge=hedge, logger=logger)
+        self.stack.callback(router.close)
+        return router
+
+    def test_slow_endpoint_is_deprioritized(self) -> None:
+        slow = StubOcrServer(name="slow", delay=0.15)
+        fast = StubOcrServer(name="fast", delay=0.0)
+        router = self._router(slow, fast)
+        served = [router.analyze(_IMAGE)["server"] for _ in range(6)]
+        # 未計測のエンドポイントを一度ずつ試した後は、EWMA の小さい方へ送り続ける
+        self.assertEqual(served[2:], ["fast"] * 4)
+        self.assertEqual(len(slow.requests), 1)
+        slow_state, fast_state = router.endpoints
+        assert slow_state.ewma is not None and fast_state.ewma is not None
+        self.assertGreater(slow_state.ewma, fast_state.ewma)
+
+    def test_hedge_fires_after_delay_and_first_response_wins(self) -> None:
+        primary = StubOcrServer(name="primary", delay=0.02)
+        backup = StubOcrServer(name="backup", delay=0.02)
+        router = self._router(primary, backup, hedge=True)
+        # primary だけを計測済み（p95 を使える）にし、backup は遅いと観測済みにしておく
+        router.endpoints[1].ewma = 10.0
+        for _ in range(5):
+            self.assertEqual(router.analyze(_IMAGE)["server"], "primary")
+        self.assertEqual(router.hedged, 0)
+
+        primary.delay = 0.5
+        started = time.perf_counter()
+        data = router.analyze(_IMAGE)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(data["server"], "backup")
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(router.hedged, 1)
+        self.assertEqual(router.endpoints[1].hedge_wins, 1)
+        self.assertEqual(len(backup.requests), 1)
+
+    def test_failover_on_server_error(self) -> None:
+        broken = StubOcrServer(name="broken", status=503)
+        healthy = StubOcrServer(name="healthy")
+        router = self._router(broken, healthy)
+        self.assertEqual(router.analyze(_IMAGE)["server"], "healthy")
+        self.assertEqual(router.endpoints[0].failures, 1)
+        self.assertEqual(router.endpoints[1].requests, 1)
+
+    def test_no_failover_on_client_error(self) -> None:
+        rejecting = StubOcrServer(name="rejecting", status=413)
+        healthy = StubOcrServer(name="healthy")
+        router = self._router(rejecting, healthy)
+        with self.assertRaises(requests.HTTPError):
+            router.analyze(_IMAGE)
+        self.assertEqual(router.endpoints[0].failures, 1)
+        self.assertEqual(router.endpoints[1].requests, 0)
+        self.assertEqual(healthy.requests, [])
+        self.assertEqual(router.stats.failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""ROI（切り出して OCR する領域）の全体 OCR への切り替えを確かめる。"""
+
+from __future__ import annotations
+
+import unittest
+
+from stub_ocr import FakeGame, StubOcrServer, run_game  # src/ を import パスに加える
+
+from roi import RoiTracker
+
+W, H = 200, 160
+
+
+class RoiTrackerTest(unittest.TestCase):
+    def test_full_every_counts_captures(self) -> None:
+        roi = RoiTracker([(10, 10, 50, 50)], full_every=3)
+        self.assertFalse(roi.tick())
+        self.assertEqual(roi.plan(W, H), (10, 10, 50, 50))
+        # OCR せずに前回の結果を再利用したフレームも周期に数える
+        self.assertFalse(roi.tick())
+        self.assertTrue(roi.tick())
+        self.assertTrue(roi.tick())
+        self.assertIsNone(roi.plan(W, H))
+        self.assertFalse(roi.tick())
+        self.assertEqual(roi.plan(W, H), (10, 10, 50, 50))
+
+    def test_request_full(self) -> None:
+        roi = RoiTracker([(10, 10, 50, 50)], full_every=0)
+        self.assertFalse(roi.tick())
+        roi.request_full()
+        self.assertTrue(roi.tick())
+        self.assertIsNone(roi.plan(W, H))
+        self.assertFalse(roi.tick())
+        self.assertEqual(roi.plan(W, H), (10, 10, 50, 50))
+
+    def test_inactive_until_warmup(self) -> None:
+        roi = RoiTracker(learn=True, warmup=2, margin=0, full_every=1)
+        self.assertFalse(roi.tick())
+        self.assertIsNone(roi.plan(W, H))
+        roi.record_hit((10, 10, 20, 20))
+        roi.record_hit((30, 30, 40, 40))
+        self.assertEqual(roi.plan(W, H), (10, 10, 40, 40))
+
+
+class RoiFallbackTest(unittest.TestCase):
+    def test_miss_on_static_screen_falls_back_to_full_ocr(self) -> None:
+        # 1画面目のクリック位置から学習した領域の外に、2画面目の選択肢が出る（画面はそのまま静止）
+        game = FakeGame([[(101, (20, 20, 80, 40))], [(102, (120, 110, 180, 130))], [(103, (20, 20, 80, 40))]])
+        with StubOcrServer({101: "始める", 102: "逃げる", 103: "終わる"}) as server:
+            run_game(game, server, ["始める", "逃げる", "終わる"], size=(W, H), roi_learn=True, roi_warmup=1, roi_full_every=0)
+        self.assertEqual(game.clicks, [(50, 30), (150, 120), (50, 30)])
+        # 2画面目は学習した領域だけを送って見つからず、次のフレームで全体を送って見つける
+        learned = (80 - 20 + 32, 40 - 20 + 32)  # roi_margin 16 で広げた1画面目の語
+        self.assertEqual(server.requests[0], (W, H))
+        i = server.requests.index(learned, 1)
+        self.assertEqual(server.requests[i + 1], (W, H))
+
+
+if __name__ == "__main__":
+    unittest.main()
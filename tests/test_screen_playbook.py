@@ -0,0 +1,57 @@
+"""プレイブックの記録のバックグラウンドでの書き出しを確かめる。"""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from stub_ocr import fill_rect  # src/ を import パスに加える
+
+from capture import CapturedFrame
+from screen_playbook import Playbook
+
+W, H = 64, 48
+BOX = (16, 16, 40, 28)
+
+
+def _frame() -> CapturedFrame:
+    rgb = bytearray([40]) * (W * H * 3)
+    fill_rect(rgb, W, (0, 0, W // 2, H), 200)
+    fill_rect(rgb, W, BOX, 90)
+    return CapturedFrame(rgb=bytes(rgb), width=W, height=H)
+
+
+class PlaybookPersistTest(unittest.TestCase):
+    def test_changes_are_written_in_background_and_flushed_on_close(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "playbook.json"
+            book = Playbook(path)
+            entry = book.record("進む", "進む", _frame(), BOX)
+            assert entry is not None
+            for _ in range(10):
+                book.replayed(entry)
+            book.close()
+            assert book._saver is not None
+            # 続けて変更しても、書き出しはまとめて行う
+            self.assertLessEqual(book._saver.writes, 2)
+
+            reloaded = Playbook(path)
+            (saved,) = list(reloaded)
+            self.assertEqual((saved.id, saved.replays), (entry.id, 10))
+            hit = reloaded.lookup(["進む"], _frame())
+            assert hit is not None
+            self.assertEqual(hit.entry.box, BOX)
+
+    def test_save_after_close_is_written_immediately(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "playbook.json"
+            book = Playbook(path)
+            book.close()
+            self.assertFalse(path.exists())
+            book.record("進む", "進む", _frame(), BOX)
+            self.assertEqual(len(Playbook(path)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""テンプレートマッチの照合対象（先読みする step）とパッチの書き出しを確かめる。"""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from stub_ocr import FakeGame, StubOcrServer, run_game  # src/ を import パスに加える
+
+from capture import CapturedFrame
+from template_match import TemplateMatcher
+
+BOX = (60, 60, 140, 84)
+
+
+class StripedGame(FakeGame):
+    """選択肢の矩形に縦縞を描く疑似ゲーム（一様な矩形はパッチとして保存されないため）。"""
+
+    def render(self, seq: int, width: int, height: int) -> bytes:
+        rgb = bytearray(super().render(seq, width, height))
+        for _, (x1, y1, x2, y2) in self.screens[self.screen]:
+            for y in range(y1, y2):
+                for x in range(x1 + 4, x2 - 4, 8):
+                    rgb[(y * width + x) * 3 : (y * width + x + 4) * 3] = b"\xfa" * 12
+        return bytes(rgb)
+
+
+class TemplateLookaheadTest(unittest.TestCase):
+    def test_lookahead_step_is_matched_without_ocr(self) -> None:
+        # 「進む」の次の「待つ」が出ずに、その先の「進む」がまた出る: 先読みした「進む」のパッチで OCR せずにクリックする
+        game = StripedGame([[(101, BOX)], [(101, BOX)], []])
+        with StubOcrServer({101: "進む"}) as server:
+            stats = run_game(game, server, ["進む", "待つ", "進む"], template_match=True, template_persist=False, step_lookahead=1)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(game.clicks, [(100, 72), (100, 72)])
+        self.assertEqual(stats.steps_done, 2)
+
+
+class TemplatePersistTest(unittest.TestCase):
+    def test_learned_patches_are_flushed_on_close(self) -> None:
+        game = StripedGame([[(101, BOX)]])
+        frame = CapturedFrame(rgb=game.render(0, 200, 160), width=200, height=160)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "templates.json"
+            matcher = TemplateMatcher(store_path=path)
+            self.assertTrue(matcher.learn("進む", frame, BOX))
+            self.assertTrue(matcher.learn("戻る", frame, (40, 60, 120, 84)))
+            matcher.close()
+
+            reloaded = TemplateMatcher(store_path=path)
+            self.assertEqual(len(reloaded), 2)
+            hit = reloaded.find("進む", frame)
+            assert hit is not None
+            self.assertEqual(hit.box, BOX)
+
+
+if __name__ == "__main__":
+    unittest.main()